@@ -0,0 +1,196 @@
+import hashlib
+import json
+import shutil
+import gzip
+import sys
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    # brotli è opzionale: senza di esso vengono generate soltanto le varianti gzip
+    brotli = None
+
+
+class AssetBuilder:
+    """La classe AssetBuilder prepara i file statici della pagina principale. Legge html/index.html, unisce i fogli di
+    stile in un unico bundle css e gli script in due bundle js (quelli caricati subito e quelli con defer, per non
+    cambiare l'ordine di esecuzione), dà a ogni bundle un nome con l'impronta del contenuto, ne genera le varianti
+    compresse .gz (e .br se brotli è installato) e scrive dist/index.html con i riferimenti ai bundle. Il server locale
+    serve i bundle come immutabili e, se il browser le accetta, ne invia direttamente le varianti compresse.
+    Per ultimo viene scritto dist/manifest.json, con data di modifica e dimensione di ogni file letto: con
+    is_up_to_date si può verificare che la build corrisponda ancora ai sorgenti, senza rileggerli."""
+
+    DEFAULT_SOURCE_PATH = os.path.join("html", "index.html")
+    DEFAULT_DIST_DIRECTORY = "dist"
+    MANIFEST_NAME = "manifest.json"
+    LOCAL_SERVER_URL = "http://localhost:8080"
+
+    # quill.min.js contiene già tutto quill.core.js
+    EXCLUDED_ASSETS = {"js/quill.core.js"}
+
+    LINK_REGEX = re.compile(r'^\s*<link href="{}/([^"]+\.css)" rel="stylesheet">\s*$')
+    SCRIPT_REGEX = re.compile(r'^\s*<script type="text/javascript" src="{}/([^"]+\.js)"( defer)?></script>\s*$')
+    COMMENT_REGEX = re.compile(r'^\s*<!--.*-->\s*$')
+    SOURCE_MAP_REGEX = re.compile(r'^\s*(//# sourceMappingURL=.*|/\*# sourceMappingURL=.*\*/)\s*$', re.MULTILINE)
+
+    FINGERPRINT_SIZE = 10
+
+    def __init__(self, source_path=DEFAULT_SOURCE_PATH, dist_directory=DEFAULT_DIST_DIRECTORY,
+                 server_url=LOCAL_SERVER_URL):
+        """L'init di questa classe salva i percorsi su cui lavorare, relativi alla cartella bin
+
+        :param source_path: Percorso della pagina da cui leggere i file statici
+        :type source_path: str
+        :param dist_directory: Cartella in cui scrivere i bundle e la nuova pagina
+        :type dist_directory: str
+        :param server_url: Indirizzo del server locale usato nella pagina
+        :type server_url: str"""
+
+        self._source_path = source_path
+        self._dist_directory = dist_directory
+        self._server_url = server_url
+        self._link_regex = re.compile(self.LINK_REGEX.pattern.format(re.escape(server_url)))
+        self._script_regex = re.compile(self.SCRIPT_REGEX.pattern.format(re.escape(server_url)))
+
+    def build(self):
+        """Funzione che genera i bundle e la nuova pagina, sostituendo quelli di una build precedente
+
+        :returns: Dizionario bundle -> (nome del file, file uniti, dimensione, dimensione gzip)
+        :rtype: dict"""
+
+        # La firma di ogni file viene presa prima di leggerlo: se cambia durante la build, la build risulta vecchia
+        sources = {self._source_path: self._file_stamp(self._source_path)}
+        with open(self._source_path, "r", encoding="utf-8") as file_object:
+            lines = file_object.read().split("\n")
+
+        # Raccolgo i file di ogni gruppo nell'ordine in cui compaiono nella pagina
+        groups = {"app.css": [], "vendor.js": [], "app.js": []}
+        for line in lines:
+            group, asset = self._match_asset(line)
+            if group is not None and asset not in self.EXCLUDED_ASSETS:
+                groups[group].append(asset)
+                sources[asset] = self._file_stamp(asset)
+
+        if os.path.isdir(self._dist_directory):
+            shutil.rmtree(self._dist_directory)
+        os.makedirs(self._dist_directory)
+
+        bundles = {}
+        for group, assets in groups.items():
+            if assets:
+                bundles[group] = self._write_bundle(group, assets)
+
+        self._write_page(lines, bundles)
+        with open(os.path.join(self._dist_directory, self.MANIFEST_NAME), "w", encoding="utf-8") as file_object:
+            json.dump({"sources": sources}, file_object)
+        return bundles
+
+    @staticmethod
+    def is_up_to_date(dist_directory=DEFAULT_DIST_DIRECTORY):
+        """Funzione che indica se la build in dist_directory è completa e nessuno dei file da cui è stata generata è
+        cambiato da allora. Costa una chiamata a os.stat per file, senza rileggerne il contenuto
+
+        :param dist_directory: Cartella della build
+        :type dist_directory: str
+
+        :returns: True se la pagina generata può essere usata al posto di quella con i singoli file
+        :rtype: bool"""
+
+        try:
+            with open(os.path.join(dist_directory, AssetBuilder.MANIFEST_NAME), "r", encoding="utf-8") as file_object:
+                sources = json.load(file_object)["sources"]
+            return all(AssetBuilder._file_stamp(path) == stamp for path, stamp in sources.items())
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    @staticmethod
+    def _file_stamp(path):
+        file_stat = os.stat(path)
+        return [file_stat.st_mtime_ns, file_stat.st_size]
+
+    def _match_asset(self, line):
+        """Funzione che riconosce un tag di un file statico del server locale
+
+        :returns: Coppia (gruppo, percorso del file) oppure (None, None)
+        :rtype: tuple"""
+
+        link_match = self._link_regex.match(line)
+        if link_match is not None:
+            return "app.css", link_match.group(1)
+
+        script_match = self._script_regex.match(line)
+        if script_match is not None:
+            return "app.js" if script_match.group(2) else "vendor.js", script_match.group(1)
+        return None, None
+
+    def _write_bundle(self, group, assets):
+        separator = "\n" if group.endswith(".css") else ";\n"
+        parts = []
+        for asset in assets:
+            with open(asset, "r", encoding="utf-8") as file_object:
+                # I riferimenti alle source map non sono più validi una volta uniti i file
+                parts.append(self.SOURCE_MAP_REGEX.sub("", file_object.read()).strip())
+        content = (separator.join(parts) + "\n").encode("utf-8")
+
+        name, extension = group.rsplit(".", 1)
+        fingerprint = hashlib.sha256(content).hexdigest()[:self.FINGERPRINT_SIZE]
+        filename = "{}.{}.{}".format(name, fingerprint, extension)
+        path = os.path.join(self._dist_directory, filename)
+
+        with open(path, "wb") as file_object:
+            file_object.write(content)
+        # mtime=0 rende la variante gzip identica tra una build e l'altra
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        with open(path + ".gz", "wb") as file_object:
+            file_object.write(compressed)
+        if brotli is not None:
+            with open(path + ".br", "wb") as file_object:
+                file_object.write(brotli.compress(content, quality=11))
+
+        return filename, assets, len(content), len(compressed)
+
+    def _write_page(self, lines, bundles):
+        """Funzione che scrive dist/index.html, sostituendo il primo tag di ogni gruppo con il suo bundle e togliendo
+        gli altri tag, insieme al commento che li precede"""
+
+        written_groups = set()
+        page = []
+        for line in lines:
+            group, asset = self._match_asset(line)
+            if group is None:
+                page.append(line)
+                continue
+
+            if page and self.COMMENT_REGEX.match(page[-1]):
+                page.pop()
+            if group in written_groups or group not in bundles:
+                continue
+
+            written_groups.add(group)
+            indent = line[:len(line) - len(line.lstrip())]
+            url = "{}/{}/{}".format(self._server_url, self._dist_directory, bundles[group][0])
+            if group.endswith(".css"):
+                page.append('{}<link href="{}" rel="stylesheet">'.format(indent, url))
+            else:
+                page.append('{}<script type="text/javascript" src="{}"{}></script>'.format(
+                    indent, url, " defer" if group == "app.js" else ""))
+
+        with open(os.path.join(self._dist_directory, "index.html"), "w", encoding="utf-8") as file_object:
+            file_object.write("\n".join(page))
+
+
+def main():
+    """Uso: python AssetBuilder.py, dalla cartella bin. Genera la cartella dist usata da CourseApplication"""
+
+    bundles = AssetBuilder().build()
+    for group, (filename, assets, size, compressed_size) in bundles.items():
+        print("{:<24} {:>2} file {:>9} byte {:>8} gzip".format(filename, len(assets), size, compressed_size))
+    if brotli is None:
+        print("brotli non installato: varianti .br non generate")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+from QuizLock import QuizLock
+import threading
+import json
+import os
+
+
+class AttemptStore:
+    """La classe AttemptStore salva i tentativi di un quiz in un file "append-only", separato dal file che contiene
+    le domande. Ogni tentativo occupa una riga JSON e in memoria viene mantenuto un indice utente -> posizioni delle
+    sue righe, così che leggere i tentativi di un utente non richieda di leggere quelli di tutti gli altri.
+    Le istanze vanno ottenute con AttemptStore.open, che ne condivide una sola per quiz all'interno del processo."""
+
+    DEFAULT_ATTEMPTS_FILENAME = "attempts.jsonl"
+    # Campo interno che marca i tentativi importati dal file del quiz delle versioni precedenti
+    LEGACY_KEY = "legacy"
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, quiz_dir):
+        """L'init di questa classe crea un indice vuoto, che viene costruito alla prima lettura
+
+        :param quiz_dir: Cartella dell'elemento quiz
+        :type quiz_dir: str"""
+
+        self._quiz_dir = quiz_dir
+        self._path = os.path.join(quiz_dir, AttemptStore.DEFAULT_ATTEMPTS_FILENAME)
+        self._lock = threading.RLock()
+        self._reset_index()
+
+    @classmethod
+    def open(cls, quiz_dir):
+        """Funzione che restituisce l'istanza condivisa dell'archivio dei tentativi di un quiz
+
+        :param quiz_dir: Cartella dell'elemento quiz
+        :type quiz_dir: str
+
+        :returns: L'archivio dei tentativi
+        :rtype: AttemptStore"""
+
+        key = os.path.abspath(quiz_dir)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(quiz_dir)
+            return cls._instances[key]
+
+    def get_path(self):
+        return self._path
+
+    def append(self, user_id, attempt):
+        """Funzione che aggiunge un tentativo in fondo all'archivio. La scrittura avviene tenendo il lock del quiz,
+        così che tentativi inviati nello stesso momento, anche da altri processi, non si sovrappongano
+
+        :param user_id: Id dell'utente che ha svolto il tentativo
+        :type user_id: str
+        :param attempt: Il tentativo, con data, voto, risposte e punteggi
+        :type attempt: dict"""
+
+        record = dict(attempt)
+        record["user"] = user_id
+        line = (json.dumps(record) + "\n").encode("utf-8")
+
+        with QuizLock.acquire(self._quiz_dir), self._lock:
+            self._refresh_index()
+            with open(self._path, "ab") as file_object:
+                offset = file_object.tell()
+                file_object.write(line)
+
+            self._offsets.setdefault(user_id, []).append(offset)
+            self._attempts_count += 1
+            self._indexed_size = offset + len(line)
+            # Tengo il lock del quiz, quindi nessun altro può aver modificato il file dopo la mia scrittura
+            self._indexed_identity = self._get_identity(os.stat(self._path))
+
+    def get_user_attempts(self, user_id):
+        """Funzione che restituisce i tentativi di un utente, leggendo soltanto le sue righe
+
+        :param user_id: Id dell'utente
+        :type user_id: str
+
+        :returns: Lista dei tentativi dell'utente oppure None se non ne ha svolto nessuno
+        :rtype: list"""
+
+        with self._lock:
+            self._refresh_index()
+            if not self._offsets.get(user_id):
+                return None
+
+            with open(self._path, "rb") as file_object:
+                # Il file potrebbe essere stato sostituito da un altro processo dopo l'aggiornamento dell'indice
+                if self._get_identity(os.fstat(file_object.fileno()))[:2] != self._indexed_identity[:2]:
+                    self._refresh_index()
+                    return self.get_user_attempts(user_id)
+
+                attempts = []
+                for offset in self._offsets[user_id]:
+                    file_object.seek(offset)
+                    attempt = json.loads(file_object.readline().decode("utf-8"))
+                    del attempt["user"]
+                    attempt.pop(AttemptStore.LEGACY_KEY, None)
+                    attempts.append(attempt)
+        return attempts
+
+    def iter_attempts(self):
+        """Funzione che scorre tutti i tentativi dell'archivio, nell'ordine in cui sono stati aggiunti
+
+        :returns: Iteratore di coppie (id utente, tentativo)
+        :rtype: iterator"""
+
+        if not os.path.isfile(self._path):
+            return
+
+        with open(self._path, "rb") as file_object:
+            for line in file_object:
+                try:
+                    attempt = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    # Una riga troncata può essere solo l'ultima, scritta durante un crash
+                    break
+                attempt.pop(AttemptStore.LEGACY_KEY, None)
+                yield attempt.pop("user"), attempt
+
+    def rewrite(self, attempts):
+        """Funzione che sostituisce l'intero archivio con i tentativi forniti, ad esempio dopo averli ricorretti.
+        Il nuovo archivio viene scritto su un file temporaneo e poi sostituito a quello vecchio tenendo il lock del
+        quiz: chi deve leggere e riscrivere i tentativi senza perderne nessuno deve tenere il lock per tutto il tempo
+
+        :param attempts: Coppie (id utente, tentativo) nell'ordine in cui vanno salvate
+        :type attempts: iterable"""
+
+        with QuizLock.acquire(self._quiz_dir), self._lock:
+            self._replace_records(self._make_record(user_id, attempt) for user_id, attempt in attempts)
+
+    def import_legacy_attempts(self, legacy_attempts):
+        """Funzione che sposta nell'archivio i tentativi salvati nel file del quiz dalle versioni precedenti,
+        mettendoli prima di quelli già presenti. Il nuovo archivio viene scritto con un'unica sostituzione e i
+        tentativi importati vengono marcati: se l'archivio inizia già con un tentativo marcato l'importazione è
+        già avvenuta (ad esempio prima di un crash, senza che il file del quiz venisse riscritto) e non viene ripetuta
+
+        :param legacy_attempts: Coppie (id utente, tentativo) salvate nel file del quiz
+        :type legacy_attempts: list
+
+        :returns: True se i tentativi sono stati importati, False se lo erano già
+        :rtype: bool"""
+
+        with QuizLock.acquire(self._quiz_dir), self._lock:
+            if self._starts_with_legacy_attempt():
+                return False
+
+            records = []
+            for user_id, attempt in legacy_attempts:
+                record = self._make_record(user_id, attempt)
+                record[AttemptStore.LEGACY_KEY] = True
+                records.append(record)
+            records.extend(self._make_record(user_id, attempt) for user_id, attempt in self.iter_attempts())
+            self._replace_records(records)
+            return True
+
+    def get_quiz_dir(self):
+        return self._quiz_dir
+
+    def get_log_stamp(self):
+        """Funzione che restituisce la firma del file dei tentativi, che cambia a ogni aggiunta e a ogni
+        sostituzione del file. Non legge il file, quindi costa una sola chiamata a os.stat
+
+        :returns: Lista [inode, dimensione, data di modifica] oppure None se non è ancora stato salvato nessun tentativo
+        :rtype: list"""
+
+        try:
+            file_stat = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        return [file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns]
+
+    def get_attempts_count(self):
+        with self._lock:
+            self._refresh_index()
+            return self._attempts_count
+
+    @staticmethod
+    def _make_record(user_id, attempt):
+        record = dict(attempt)
+        record["user"] = user_id
+        return record
+
+    def _replace_records(self, records):
+        """Funzione che sostituisce l'archivio con i record forniti, scrivendoli su un file temporaneo, e ricostruisce
+        l'indice. Va invocata tenendo il lock del quiz"""
+
+        temp_path = self._path + ".tmp"
+        with open(temp_path, "wb") as file_object:
+            for record in records:
+                file_object.write((json.dumps(record) + "\n").encode("utf-8"))
+        os.replace(temp_path, self._path)
+
+        self._reset_index()
+        self._refresh_index()
+
+    def _reset_index(self):
+        self._offsets = {}
+        self._attempts_count = 0
+        self._indexed_size = 0
+        # Identità del file indicizzato (dispositivo, inode, data di modifica), usata per accorgersi che il file è
+        # stato sostituito, anche da un altro processo
+        self._indexed_identity = None
+
+    @staticmethod
+    def _get_identity(file_stat):
+        return file_stat.st_dev, file_stat.st_ino, file_stat.st_mtime_ns
+
+    def _starts_with_legacy_attempt(self):
+        if not os.path.isfile(self._path):
+            return False
+
+        with open(self._path, "rb") as file_object:
+            first_line = file_object.readline()
+        try:
+            return bool(json.loads(first_line.decode("utf-8")).get(AttemptStore.LEGACY_KEY))
+        except ValueError:
+            return False
+
+    def _refresh_index(self):
+        """Funzione che aggiunge all'indice le righe scritte dopo l'ultima lettura, anche da altri processi. Se il
+        file è stato sostituito (ad esempio da BulkGrader.py in un altro processo) l'indice viene ricostruito
+        dall'inizio: succede quando cambia l'inode, quando il file si accorcia o quando cambia la data di modifica
+        senza che il file sia cresciuto"""
+
+        if not os.path.isfile(self._path):
+            self._reset_index()
+            return
+
+        with open(self._path, "rb") as file_object:
+            file_stat = os.fstat(file_object.fileno())
+            identity = self._get_identity(file_stat)
+            if self._indexed_identity is not None and (
+                    identity[:2] != self._indexed_identity[:2] or file_stat.st_size < self._indexed_size or
+                    (file_stat.st_size == self._indexed_size and identity != self._indexed_identity)):
+                self._reset_index()
+
+            file_object.seek(self._indexed_size)
+            offset = self._indexed_size
+            for line in file_object:
+                if not line.endswith(b"\n"):
+                    # Riga ancora in scrittura: verrà indicizzata alla prossima lettura
+                    break
+                try:
+                    user_id = json.loads(line.decode("utf-8"))["user"]
+                except ValueError:
+                    break
+                self._offsets.setdefault(user_id, []).append(offset)
+                self._attempts_count += 1
+                offset += len(line)
+            self._indexed_size = offset
+            self._indexed_identity = identity
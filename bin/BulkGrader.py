@@ -0,0 +1,190 @@
+from CourseFileSystem import CourseFileSystem
+from QuizManager import QuizManager
+from QuizLock import QuizLock
+from QuizStats import QuizStats
+from Error import Error
+import numpy as np
+import time
+import sys
+
+
+class BulkGrader:
+    """La classe BulkGrader ricorregge in blocco tutti i tentativi salvati di un quiz o di un intero corso, ad
+    esempio dopo che un docente ha cambiato le risposte corrette. Le risposte di tutti i tentativi vengono raccolte
+    in array NumPy, una domanda alla volta (per le checkbox una matrice tentativi x opzioni con il numero di volte in
+    cui ogni opzione è stata scelta), così che i punteggi si calcolino con poche operazioni vettoriali; i voti
+    aggiornati vengono poi riscritti nell'archivio dei tentativi in un solo passaggio, e le statistiche aggregate
+    del quiz vengono ricalcolate."""
+
+    def __init__(self, course_fs=None):
+        """L'init di questa classe salva il CourseFileSystem da cui leggere quiz e tentativi
+
+        :param course_fs: Il CourseFileSystem da usare, se non fornito ne viene creato uno nuovo
+        :type course_fs: CourseFileSystem"""
+
+        self.course_fs = course_fs if course_fs is not None else CourseFileSystem()
+
+    def regrade_quiz(self, element_id, topic_id, course_id):
+        """Funzione che ricorregge tutti i tentativi di un quiz con la sua chiave di correzione attuale. I tentativi
+        vengono letti, corretti e riscritti tenendo il lock del quiz, così che nessun nuovo invio vada perso
+
+        :param element_id: Id del quiz
+        :type element_id: str
+        :param topic_id: Id del topic che contiene l'elemento
+        :type topic_id: str
+        :param course_id: Id del corso che contiene il topic che a sua volta contiene l'elemento
+        :type course_id: str
+
+        :returns: Dizionario con il numero di tentativi ricorretti e di voti cambiati oppure errore
+        :rtype: dict o Error"""
+
+        quiz_json = self.course_fs.get_quiz_json(element_id, topic_id, course_id)
+        if isinstance(quiz_json, Error):
+            return quiz_json
+
+        attempt_store = self.course_fs.get_attempt_store(element_id, topic_id, course_id)
+        with QuizLock.acquire(attempt_store.get_quiz_dir()):
+            # Rileggo le domande tenendo il lock, nel caso in cui siano state modificate nel frattempo
+            quiz_json = self.course_fs.get_quiz_json(element_id, topic_id, course_id)
+            users, attempts = [], []
+            for user_id, attempt in attempt_store.iter_attempts():
+                users.append(user_id)
+                attempts.append(attempt)
+
+            if not attempts:
+                return {"attempts": 0, "changed": 0}
+
+            marks, scores = self.grade_attempts(QuizManager.compile_answer_key(quiz_json), attempts)
+
+            changed = 0
+            for attempt, mark, attempt_scores in zip(attempts, marks.tolist(), scores):
+                if attempt["mark"] != mark or attempt["scores"] != attempt_scores:
+                    changed += 1
+                attempt["mark"] = mark
+                attempt["scores"] = attempt_scores
+
+            attempt_store.rewrite(zip(users, attempts))
+            QuizStats.open(attempt_store.get_quiz_dir()).rebuild(zip(users, attempts), attempt_store.get_log_stamp())
+
+        return {"attempts": len(attempts), "changed": changed}
+
+    def regrade_course(self, course_id):
+        """Funzione che ricorregge i tentativi di tutti i quiz non cancellati di un corso
+
+        :param course_id: Id del corso
+        :type course_id: str
+
+        :returns: Dizionario con il numero di quiz, di tentativi ricorretti e di voti cambiati
+        :rtype: dict"""
+
+        totals = {"quizzes": 0, "attempts": 0, "changed": 0}
+        for topic in self.course_fs.descriptor.get_topics_summary(course_id):
+            for element in self.course_fs.descriptor.get_elements_summary(topic["id"], course_id):
+                if element["type"] != "quiz":
+                    continue
+
+                result = self.regrade_quiz(element["id"], topic["id"], course_id)
+                if isinstance(result, Error):
+                    continue
+                totals["quizzes"] += 1
+                totals["attempts"] += result["attempts"]
+                totals["changed"] += result["changed"]
+        return totals
+
+    @staticmethod
+    def grade_attempts(answer_key, attempts):
+        """Funzione che corregge un insieme di tentativi con le stesse regole di QuizManager.evaluate_answers. Le
+        risposte a domande che non esistono più nella chiave di correzione vengono ignorate
+
+        :param answer_key: Chiave di correzione restituita da QuizManager.compile_answer_key
+        :type answer_key: dict
+        :param attempts: Tentativi da correggere, ognuno con le sue "answers"
+        :type attempts: list
+
+        :returns: Coppia (array dei voti, lista dei punteggi per domanda di ogni tentativo)
+        :rtype: tuple"""
+
+        attempts_count = len(attempts)
+        scores_sum = np.zeros(attempts_count)
+        answered_count = np.zeros(attempts_count, dtype=np.int64)
+        scores = [{} for _ in range(attempts_count)]
+
+        for question_id, (question_type, correct, wrong, correct_count) in answer_key.items():
+            rows = [row for row, attempt in enumerate(attempts) if question_id in attempt["answers"]]
+            if not rows:
+                continue
+            values = [attempts[row]["answers"][question_id] for row in rows]
+
+            if question_type == "checkbox":
+                question_scores = BulkGrader._grade_checkbox(values, correct, wrong, correct_count)
+            elif question_type == "radio":
+                question_scores = np.fromiter((value == correct for value in values), dtype=np.int64,
+                                              count=len(values))
+            else:
+                question_scores = np.fromiter(
+                    (QuizManager.normalize_open_answer(value) in correct for value in values), dtype=np.int64,
+                    count=len(values))
+
+            rows = np.array(rows)
+            scores_sum[rows] += question_scores
+            answered_count[rows] += 1
+            for row, score in zip(rows.tolist(), question_scores.tolist()):
+                scores[row][question_id] = score
+
+        marks = np.divide(scores_sum, answered_count, out=np.zeros(attempts_count), where=answered_count > 0) * 10
+        return marks, scores
+
+    @staticmethod
+    def _grade_checkbox(values, correct, wrong, correct_count):
+        """Funzione che corregge le risposte a una domanda checkbox: ogni opzione scelta vale +1 se corretta, -1 se
+        errata e 0 altrimenti, e il punteggio è la somma divisa per il numero di risposte corrette. Come in
+        QuizManager.evaluate_answers, una domanda senza opzioni corrette vale 1 se non viene scelta nessuna opzione
+        errata"""
+
+        options = {option: index for index, option in enumerate(sorted(correct | wrong, key=str))}
+        weights = np.zeros(len(options) + 1)
+        for option, index in options.items():
+            weights[index] = (option in correct) - (option in wrong)
+
+        # L'ultima colonna raccoglie le opzioni che non sono né corrette né errate
+        choice_rows, choice_columns = [], []
+        for row, value in enumerate(values):
+            for option in value:
+                choice_rows.append(row)
+                choice_columns.append(options.get(option, len(options)))
+        choices = np.zeros((len(values), len(options) + 1))
+        np.add.at(choices, (np.array(choice_rows, dtype=np.intp), np.array(choice_columns, dtype=np.intp)), 1)
+
+        points = choices @ weights
+        if not correct_count:
+            return np.where(points >= 0, 1.0, 0.0)
+        return np.where(points >= 0, points / correct_count, 0)
+
+
+def main():
+    """Uso: python BulkGrader.py <id corso> [<id topic> <id quiz>], dalla cartella che contiene la cartella data"""
+
+    if len(sys.argv) not in (2, 4):
+        print(main.__doc__)
+        return 1
+
+    bulk_grader = BulkGrader()
+    start = time.perf_counter()
+    if len(sys.argv) == 4:
+        result = bulk_grader.regrade_quiz(sys.argv[3], sys.argv[2], sys.argv[1])
+    else:
+        result = bulk_grader.regrade_course(sys.argv[1])
+    elapsed = time.perf_counter() - start
+    bulk_grader.course_fs.descriptor.close()
+
+    if isinstance(result, Error):
+        print(result)
+        return 1
+
+    print("{} tentativi ricorretti, {} voti cambiati in {:.2f} s ({:.0f} tentativi/s)".format(
+        result["attempts"], result["changed"], elapsed, result["attempts"] / elapsed if elapsed else 0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,25 +2,29 @@ from PermissionManager import PermissionManager
 from CourseFileSystem import CourseFileSystem
 from UserManager import UserManager
 from QuizManager import QuizManager
-from bs4 import BeautifulSoup
+from AssetBuilder import AssetBuilder
+from SearchIndex import SearchIndex
+from LocalServer import LocalRequestHandler, LocalHTTPServer
 from Error import Error
 
 import os
 import re
 import webview
 import threading
-import http.server
-import socketserver
-import urllib.request
 import sys
 
 
 class CourseApplication:
 
+    LOCAL_SERVER_PORT = 8080
+    # Il server locale accetta soltanto connessioni da questo computer
+    LOCAL_SERVER_ADDRESS = "127.0.0.1"
+    LOCAL_SERVER_URL = "http://localhost:{}".format(LOCAL_SERVER_PORT)
+
     def __init__(self, usermanager, user_id):
         api = Api(usermanager, user_id)
 
-        t = threading.Thread(target=self.load_html)
+        t = threading.Thread(target=self.load_page)
         t1 = threading.Thread(target=self.start_local_html_server, args=[t])
         t1.start()
 
@@ -28,15 +32,21 @@ class CourseApplication:
         webview.create_window("Lezioni alla Pari", debug=True, js_api=api)
 
     @staticmethod
-    def load_html():
-        with open(os.path.join("html", "index.html"), "r") as html:
-            webview.load_html(html.read())
+    def load_page():
+        # La pagina generata da AssetBuilder usa i bundle, ma soltanto se nessun sorgente è cambiato dopo la build:
+        # altrimenti si usa quella con i singoli file, così che le modifiche siano subito visibili
+        page_path = os.path.join(AssetBuilder.DEFAULT_DIST_DIRECTORY, "index.html")
+        if not AssetBuilder.is_up_to_date():
+            page_path = AssetBuilder.DEFAULT_SOURCE_PATH
+        # La pagina viene servita dal server locale, così che le lezioni abbiano la sua stessa origine e non serva
+        # permettere richieste da altre origini
+        webview.load_url("{}/{}".format(CourseApplication.LOCAL_SERVER_URL, page_path.replace(os.sep, "/")))
 
     @staticmethod
     def start_local_html_server(t):
-        port = 8080
-        handler = http.server.SimpleHTTPRequestHandler
-        with socketserver.ThreadingTCPServer(("", port), handler) as httpd:
+        port = CourseApplication.LOCAL_SERVER_PORT
+        handler = LocalRequestHandler
+        with LocalHTTPServer((CourseApplication.LOCAL_SERVER_ADDRESS, port), handler) as httpd:
             t.start()
             httpd.serve_forever()
 
@@ -47,6 +57,11 @@ class Api:
         self.user_mgr = usermanager
         self.permission_mgr = PermissionManager()
         self.course_fs = CourseFileSystem()
+        self.search_index = SearchIndex(self.course_fs)
+        # L'indice salvato viene caricato in background, insieme all'indicizzazione delle lezioni cambiate nel
+        # frattempo e di quelle modificate da ora in poi, così da non rallentare l'apertura della finestra
+        self.course_fs.add_change_listener(self.search_index.notify_change)
+        self.search_index.start()
         self._logged_user = user_id
 
     def add_course(self, args_dict):
@@ -95,6 +110,18 @@ class Api:
     def list_elements(self, args_dict):
         return {"message": self.course_fs.get_elements_list(args_dict["topic_id"], args_dict["course_id"])}
 
+    def list_courses_with_attributes(self, arg):
+        permissions = self.permission_mgr.get_user_permissions(self._logged_user)
+        return {"message": {
+            mode: self.course_fs.get_courses_with_attributes(course_ids) for mode, course_ids in permissions.items()
+        }}
+
+    def list_topics_with_attributes(self, args_dict):
+        return {"message": self.course_fs.get_topics_with_attributes(args_dict["course_id"])}
+
+    def list_elements_with_attributes(self, args_dict):
+        return {"message": self.course_fs.get_elements_with_attributes(args_dict["topic_id"], args_dict["course_id"])}
+
     def get_course_attributes(self, args_dict):
         return {"message": self.course_fs.get_course_attributes(args_dict["course_id"])}
 
@@ -109,38 +136,51 @@ class Api:
         return {"message": self.course_fs.get_quiz_json(args_dict["element_id"], args_dict["topic_id"], args_dict["course_id"])["questions"]}
 
     def submit_quiz(self, args_dict):
-        quiz_mgr = QuizManager(self.course_fs.get_quiz_json(
-            args_dict["element_id"], args_dict["topic_id"], args_dict["course_id"]))
+        element_key = (args_dict["element_id"], args_dict["topic_id"], args_dict["course_id"])
+        # La versione va letta prima delle domande, così che non possa mai essere più recente di esse
+        quiz_version = self.course_fs.get_quiz_version(*element_key)
+        # Il quiz viene letto una sola volta: archivio dei tentativi e statistiche non lo rileggono più
+        quiz_json = self.course_fs.get_quiz_json(*element_key)
+        quiz_mgr = QuizManager(quiz_json, self.course_fs.get_attempt_store(*element_key), quiz_version,
+                               self.course_fs.get_quiz_stats(*element_key))
         scores = quiz_mgr.evaluate_answers(
             self._logged_user, args_dict["answers"])
         quiz_mgr.add_attempt(self._logged_user, args_dict["answers"], scores)
-        self.course_fs.edit_quiz(
-            args_dict["element_id"], args_dict["topic_id"], args_dict["course_id"], quiz_mgr.get_quiz_dict())
 
     def get_user_attempts(self, args_dict):
-        quiz_mgr = QuizManager(self.course_fs.get_quiz_json(
-            args_dict["element_id"], args_dict["topic_id"], args_dict["course_id"]))
+        element_key = (args_dict["element_id"], args_dict["topic_id"], args_dict["course_id"])
+        quiz_mgr = QuizManager(self.course_fs.get_quiz_json(*element_key),
+                               self.course_fs.get_attempt_store(*element_key))
         return quiz_mgr.get_user_attempts(self._logged_user)
 
-    def load_lesson_html(self, args_dict):
-        element_html = self.course_fs.get_lesson_html(
-            args_dict["element_id"], args_dict["topic_id"], args_dict["course_id"])
+    def get_quiz_stats(self, args_dict):
+        quiz_stats = self.course_fs.get_quiz_stats(args_dict["element_id"], args_dict["topic_id"],
+                                                   args_dict["course_id"])
+        return {"message": quiz_stats.get_stats()}
+
+    def search(self, args_dict):
+        permissions = self.permission_mgr.get_user_permissions(self._logged_user)
+        results = self.search_index.search(args_dict["query"], set(permissions["r"]) | set(permissions["rw"]))
+        messages = []
+        for result in results:
+            # Leggo i nomi dell'elemento, del topic e del corso senza copiare gli interi corsi
+            for element in self.course_fs.descriptor.get_available_elements(
+                    result["course_id"], result["topic_id"], result["element_id"]):
+                element.pop("edit date")
+                element["score"] = result["score"]
+                messages.append(element)
+        return {"message": messages}
+
+    def get_lesson_url(self, args_dict):
         element_name = self.course_fs.get_element_attributes(
             args_dict["element_id"], args_dict["topic_id"], args_dict["course_id"])["name"]
         webview.set_title(element_name)
 
-        lesson_model = self._load_html_lesson_model()
-        html_page = lesson_model.format(
-            # title=element_title,
-            content=element_html
-        )
-
-        return {"message": re.sub('\s+', ' ', html_page)}
-
-    @staticmethod
-    def _load_html_lesson_model():
-        with urllib.request.urlopen("http://localhost:8080/html/lesson_model.html") as html_file:
-            return html_file.read().decode("utf-8")
+        # La lezione viene scaricata direttamente dal server locale, senza passare dal bridge
+        return {"message": "{}{}{}/{}/{}".format(
+            CourseApplication.LOCAL_SERVER_URL, LocalRequestHandler.LESSONS_PREFIX,
+            args_dict["course_id"], args_dict["topic_id"], args_dict["element_id"]
+        )}
 
     def set_title(self, args_dict):
         webview.set_title(args_dict['title'])
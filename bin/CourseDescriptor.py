@@ -1,6 +1,11 @@
+from WriteBehindFlusher import WriteBehindFlusher
+from DescriptorJournal import DescriptorJournal
+from IdAllocator import IdAllocator
 from datetime import datetime
-from shutil import copyfile
 from Error import Error
+import contextlib
+import threading
+import copy
 import json
 import time
 import os
@@ -18,14 +23,80 @@ class CourseDescriptor():
     AVAILABLE_ELEMENT_TYPES = ["lesson", "quiz"]
     # DEFAULT DIRECTORY FOR DESCRIPTOR FILE
     DEFAULT_DESCRIPTOR_PATH = os.path.join("data", "descriptor.json")
+    # OGNI CORSO HA IL PROPRIO DESCRITTORE NELLA SUA CARTELLA
+    DEFAULT_COURSES_FOLDER = os.path.join("data", "Courses")
+    COURSE_DESCRIPTOR_NAME = "descriptor.json"
     DEFAULT_BACKUP_FOLDER = os.path.join("data", "backup_descriptor")
     DEFAULT_INDENT_LEVEL = 4
-
-    def __init__(self):
+    # POLITICA DI SCRITTURA DI DEFAULT DEL FILE DESCRITTORE
+    DEFAULT_FLUSH_INTERVAL_MS = 1000
+    DEFAULT_FLUSH_MUTATIONS = 100
+    # MODALITÀ DI SALVATAGGIO DEL FILE DESCRITTORE
+    STORAGE_SNAPSHOT = "snapshot"
+    STORAGE_JOURNAL = "journal"
+
+    def __init__(self, flush_interval_ms=DEFAULT_FLUSH_INTERVAL_MS, flush_mutations=DEFAULT_FLUSH_MUTATIONS,
+                 storage=STORAGE_SNAPSHOT, id_block_size=IdAllocator.DEFAULT_BLOCK_SIZE):
         """L'init di questa classe controlla che il file descrittore esista e, in caso contrario,
-        ne crea uno nuovo"""
+        ne crea uno nuovo. Il file viene poi letto una sola volta e tenuto in memoria: le letture vengono servite
+        dalla memoria mentre le modifiche vengono scritte su disco in differita dal WriteBehindFlusher.
+
+        In modalità "journal" ogni modifica viene anche aggiunta subito al DescriptorJournal, e il flusher si
+        occupa soltanto di compattare il registro in una nuova istantanea del file descrittore.
+
+        Su disco il descrittore è diviso in un indice (data/descriptor.json, con i contatori e gli attributi dei
+        corsi) e in un descrittore per ogni corso (data/Courses/<id del corso>/descriptor.json, con i suoi topic ed
+        elementi): ogni scrittura riscrive soltanto i file dei corsi modificati. Un file descrittore nel vecchio
+        formato, con tutti i corsi, viene diviso al primo avvio dopo averne fatto un backup.
+
+        Gli id di corsi, topic ed elementi vengono riservati a blocchi dagli IdAllocator: i contatori salvati nel
+        file descrittore indicano il primo id non ancora riservato
+
+        :param flush_interval_ms: Millisecondi massimi prima che una modifica venga scritta (None per disattivare)
+        :type flush_interval_ms: int
+        :param flush_mutations: Numero di modifiche dopo il quale il file viene scritto (None per disattivare)
+        :type flush_mutations: int
+        :param storage: Modalità di salvataggio, STORAGE_SNAPSHOT oppure STORAGE_JOURNAL
+        :type storage: str
+        :param id_block_size: Numero di id riservati con una sola scrittura
+        :type id_block_size: int"""
+
+        if storage not in (CourseDescriptor.STORAGE_SNAPSHOT, CourseDescriptor.STORAGE_JOURNAL):
+            raise ValueError("Modalità di salvataggio non valida: {}".format(storage))
 
         self.create_descriptor_file()
+        self._split_descriptor_file()
+
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._descriptor_data = self._read_descriptor_data()
+        # File da riscrivere alla prossima scrittura: l'indice e i descrittori dei corsi modificati
+        self._index_dirty = False
+        self._dirty_courses = set()
+
+        self._journal = None
+        replayed_records = 0
+        if storage == CourseDescriptor.STORAGE_JOURNAL:
+            # Ricostruisco il descrittore applicando all'istantanea le modifiche registrate
+            self._journal = DescriptorJournal()
+            replayed_records = self._journal.replay(self._descriptor_data)
+
+        self._flusher = WriteBehindFlusher(
+            self._flush_descriptor_data, flush_interval_ms, flush_mutations)
+
+        # Se il registro non era vuoto lo compatto alla prossima occasione
+        if replayed_records:
+            self._index_dirty = True
+            self._dirty_courses.update(self._descriptor_data["courses"])
+            self._flusher.notify_mutation()
+
+        self._id_allocators = {}
+        for counter_key, prefix in (("courses counter", "c-"), ("topics counter", "t-"), ("elements counter", "e-")):
+            self._id_allocators[counter_key] = IdAllocator(
+                prefix,
+                lambda block_size, counter_key=counter_key: self._reserve_ids(counter_key, block_size),
+                id_block_size
+            )
 
     def create_descriptor_file(self, overwrite=False, backup=True):
         """Funzione che crea un nuovo file descrittore, sostituendone uno già esistente in base
@@ -41,21 +112,57 @@ class CourseDescriptor():
         # Verifico che non esista già un file descrittore oppure che "overwrite" valga True
         if not os.path.isfile(CourseDescriptor.DEFAULT_DESCRIPTOR_PATH) or overwrite:
 
-            if backup:
-                self._create_backup_folder()
-                self._create_backup_file()
-
-            # Creo e inserisco la struttura basilare nel nuovo file descrittore
-            with open(CourseDescriptor.DEFAULT_DESCRIPTOR_PATH, "w") as file_object:
-                file_object.write(
-                    json.dumps(
-                        CourseDescriptor.DEFAULT_DESCRIPTOR_JSON, indent=4)
-                )
+            # Durante l'init il descrittore non è ancora in memoria: basta creare il file
+            if not hasattr(self, "_descriptor_data"):
+                self._reset_descriptor_file(backup)
+                return True
+
+            # Blocco gli IdAllocator, poi le scritture e infine il descrittore, nello stesso ordine di get_new_id e
+            # di _flush_descriptor_data, così che nessun id venga distribuito dai vecchi contatori e nessuna
+            # scrittura già in corso sovrascriva i file appena creati
+            with contextlib.ExitStack() as held_locks:
+                for allocator in self._id_allocators.values():
+                    held_locks.enter_context(allocator.hold())
+                    # Gli id riservati si riferiscono ai vecchi contatori
+                    allocator.release()
+                held_locks.enter_context(self._write_lock)
+                held_locks.enter_context(self._lock)
+
+                # Scrivo le modifiche ancora in memoria, così che anche su disco nulla vada perso, e salvo nel backup
+                # il descrittore in memoria
+                self._write_dirty_files()
+                self._reset_descriptor_file(backup, self._descriptor_data)
+
+                self._descriptor_data = self._read_descriptor_data()
+                self._index_dirty = False
+                self._dirty_courses = set()
+                if self._journal is not None:
+                    self._journal.clear()
 
             return True
 
         return False
 
+    @staticmethod
+    def _reset_descriptor_file(backup, descriptor_data=None):
+        """Funzione che sostituisce il file descrittore con uno vuoto, facendo prima il backup del descrittore
+
+        :param backup: Parametro che decide se creare il backup
+        :type backup: bool
+        :param descriptor_data: Descrittore da salvare nel backup, se None viene letto quello su disco
+        :type descriptor_data: dict"""
+
+        if backup:
+            CourseDescriptor._create_backup_folder()
+            CourseDescriptor._create_backup_file(descriptor_data)
+
+        # Creo e inserisco la struttura basilare nel nuovo file descrittore
+        with open(CourseDescriptor.DEFAULT_DESCRIPTOR_PATH, "w") as file_object:
+            file_object.write(
+                json.dumps(
+                    CourseDescriptor.DEFAULT_DESCRIPTOR_JSON, indent=4)
+            )
+
     def filter_deleted(self, unfiltered_dict):
         filtered_result = {}
         for key, value in unfiltered_dict.items():
@@ -63,22 +170,38 @@ class CourseDescriptor():
                 filtered_result[key] = value
         return filtered_result
 
+    def flush(self):
+        """Funzione che scrive subito sul file descrittore tutte le modifiche ancora in memoria
+
+        :returns: True se è stata effettuata una scrittura altrimenti False
+        :rtype: bool"""
+
+        return self._flusher.flush()
+
+    def close(self):
+        """Funzione che restituisce gli id riservati e non usati, scrive le ultime modifiche e ferma il thread di
+        scrittura del file descrittore"""
+
+        # Il lock di un IdAllocator va sempre preso prima di quello del descrittore (get_new_id lo tiene mentre
+        # _reserve_ids prende il lock del descrittore), quindi rilascio gli id prima di prendere il lock
+        for counter_key, allocator in self._id_allocators.items():
+            unused_range = allocator.release()
+            with self._lock:
+                # Riporto indietro il contatore solo se nessuno ha riservato altri id nel frattempo
+                if unused_range and self._descriptor_data[counter_key] == unused_range[1]:
+                    self._set_value([counter_key], unused_range[0])
+
+        self._flusher.close()
+        if self._journal is not None:
+            self._journal.close()
+
     def get_new_course_id(self):
         """Funzione che genera un id univoco per un corso
 
         :returns: Id del corso
         :rtype: str"""
 
-        descriptor_data = self._read_descriptor_data()
-
-        # Prelevo l'ultimo id e aumento il suo valore per la prossima entry
-        course_id = "c-" + str(descriptor_data["courses counter"])
-        descriptor_data["courses counter"] += 1
-
-        # Aggiorno il file descrittore
-        self._write_descriptor_data(descriptor_data)
-
-        return course_id
+        return self._id_allocators["courses counter"].get_new_id()
 
     def get_new_topic_id(self):
         """Funzione che genera un id univoco per un topic
@@ -86,16 +209,7 @@ class CourseDescriptor():
         :returns: Id del topic
         :rtype: str"""
 
-        descriptor_data = self._read_descriptor_data()
-
-        # Prelevo l'ultimo id e aumento il suo valore per la prossima entry
-        topic_id = "t-" + str(descriptor_data["topics counter"])
-        descriptor_data["topics counter"] += 1
-
-        # Aggiorno il file descrittore
-        self._write_descriptor_data(descriptor_data)
-
-        return topic_id
+        return self._id_allocators["topics counter"].get_new_id()
 
     def get_new_element_id(self):
         """Funzione che genera un id univoco per un elemento
@@ -103,16 +217,7 @@ class CourseDescriptor():
         :returns: Id dell'elemento
         :rtype: str"""
 
-        descriptor_data = self._read_descriptor_data()
-
-        # Prelevo l'ultimo id e aumento il suo valore per la prossima entry
-        element_id = "e-" + str(descriptor_data["elements counter"])
-        descriptor_data["elements counter"] += 1
-
-        # Aggiorno il file descrittore
-        self._write_descriptor_data(descriptor_data)
-
-        return element_id
+        return self._id_allocators["elements counter"].get_new_id()
 
     def get_courses_list(self):
         """Funzione che restituisce la lista dei corsi disponibili nel file descrittore
@@ -120,10 +225,8 @@ class CourseDescriptor():
         :returns: Lista dei corsi
         :rtype: list"""
 
-        # Recupero il contenuto del file descrittore
-        descriptor_data = self._read_descriptor_data()
-
-        filtered_data = self.filter_deleted(descriptor_data["courses"])
+        with self._lock:
+            filtered_data = self.filter_deleted(self._descriptor_data["courses"])
 
         return list(filtered_data.keys())
 
@@ -136,11 +239,9 @@ class CourseDescriptor():
         :returns: Lista dei topic presenti nel corso
         :rtype: list"""
 
-        # Recupero il contenuto del file descrittore
-        descriptor_data = self._read_descriptor_data()
-
-        filtered_data = self.filter_deleted(
-            descriptor_data["courses"][course_id]["topics"])
+        with self._lock:
+            filtered_data = self.filter_deleted(
+                self._descriptor_data["courses"][course_id]["topics"])
 
         return list(filtered_data.keys())
 
@@ -156,17 +257,120 @@ class CourseDescriptor():
         :returns: Lista degli elementi presenti nel topic del corso
         :rtype: list"""
 
-        # Recupero il contenuto del file descrittore
-        descriptor_data = self._read_descriptor_data()
-
-        filtered_data = self.filter_deleted(
-            descriptor_data["courses"][course_id]["topics"][topic_id]["elements"]
-        )
+        with self._lock:
+            filtered_data = self.filter_deleted(
+                self._descriptor_data["courses"][course_id]["topics"][topic_id]["elements"]
+            )
 
         return list(filtered_data.keys())
 
+    def get_courses_summary(self, course_ids):
+        """Funzione che restituisce in un colpo solo id e nome di più corsi, letti dalla stessa versione del
+        descrittore. I corsi inesistenti o cancellati vengono ignorati
+
+        :param course_ids: Lista degli id dei corsi
+        :type course_ids: list
+
+        :returns: Lista di dizionari con "id" e "name" di ogni corso
+        :rtype: list"""
+
+        with self._lock:
+            courses = self._descriptor_data["courses"]
+            return [
+                {"id": course_id, "name": courses[course_id]["name"]}
+                for course_id in course_ids
+                if course_id in courses and not courses[course_id]["delete date"]
+            ]
+
+    def get_topics_summary(self, course_id):
+        """Funzione che restituisce in un colpo solo id e nome dei topic disponibili di un corso
+
+        :param course_id: Id del corso di cui si vogliono conoscere i topic
+        :type course_id: str
+
+        :returns: Lista di dizionari con "id" e "name" di ogni topic
+        :rtype: list"""
+
+        with self._lock:
+            topics = self.filter_deleted(self._descriptor_data["courses"][course_id]["topics"])
+            return [{"id": topic_id, "name": topic["name"]} for topic_id, topic in topics.items()]
+
+    def get_elements_summary(self, topic_id, course_id):
+        """Funzione che restituisce in un colpo solo id, nome e tipo degli elementi disponibili di un topic
+
+        :param topic_id: Id del topic di cui si vogliono conoscere gli elementi
+        :type topic_id: str
+        :param course_id: Id del corso contenente il topic
+        :type course_id: str
+
+        :returns: Lista di dizionari con "id", "name" e "type" di ogni elemento
+        :rtype: list"""
+
+        with self._lock:
+            elements = self.filter_deleted(
+                self._descriptor_data["courses"][course_id]["topics"][topic_id]["elements"]
+            )
+            return [
+                {"id": element_id, "name": element["name"], "type": element["type"]}
+                for element_id, element in elements.items()
+            ]
+
+    def get_available_elements(self, course_id=None, topic_id=None, element_id=None):
+        """Funzione che restituisce in un colpo solo tutti gli elementi non cancellati, in topic e corsi non
+        cancellati, insieme ai nomi di topic e corso che li contengono. La ricerca può essere limitata a un corso,
+        a un suo topic o a un singolo elemento
+
+        :param course_id: Se fornito, vengono restituiti soltanto gli elementi di questo corso
+        :type course_id: str
+        :param topic_id: Se fornito insieme al corso, vengono restituiti soltanto gli elementi di questo topic
+        :type topic_id: str
+        :param element_id: Se fornito insieme a corso e topic, viene restituito soltanto questo elemento
+        :type element_id: str
+
+        :returns: Lista di dizionari con "course_id", "course_name", "topic_id", "topic_name", "element_id",
+        "name", "type" e "edit date" di ogni elemento
+        :rtype: list"""
+
+        with self._lock:
+            return [
+                {
+                    "course_id": current_course_id, "course_name": course["name"],
+                    "topic_id": current_topic_id, "topic_name": topic["name"],
+                    "element_id": current_element_id, "name": element["name"], "type": element["type"],
+                    "edit date": element["edit date"]
+                }
+                for current_course_id, course in self._select_available(
+                    self._descriptor_data["courses"], course_id)
+                for current_topic_id, topic in self._select_available(course["topics"], topic_id)
+                for current_element_id, element in self._select_available(topic["elements"], element_id)
+            ]
+
+    def is_element_available(self, element_id, topic_id, course_id):
+        """Funzione che indica se un elemento esiste e né lui, né il suo topic, né il suo corso sono stati cancellati
+
+        :param element_id: Id dell'elemento
+        :type element_id: str
+        :param topic_id: Id del topic che contiene l'elemento
+        :type topic_id: str
+        :param course_id: Id del corso che contiene il topic
+        :type course_id: str
+
+        :returns: True se l'elemento è disponibile
+        :rtype: bool"""
+
+        with self._lock:
+            course = self._descriptor_data["courses"].get(course_id)
+            if course is None or course["delete date"]:
+                return False
+            topic = course["topics"].get(topic_id)
+            if topic is None or topic["delete date"]:
+                return False
+            element = topic["elements"].get(element_id)
+            return element is not None and not element["delete date"]
+
     def get_course_attributes(self, course_id):
-        """Funzione che restituisce gli attributi di un corso
+        """Funzione che restituisce gli attributi di un corso. Il dizionario restituito è una copia, fatta tenendo
+        il lock, quindi può essere letto e serializzato da altri thread mentre il descrittore viene modificato
 
         :param course_id: Id del corso
         :type course_id: str
@@ -174,12 +378,13 @@ class CourseDescriptor():
         :returns: Attributi del corso
         :rtype: dict"""
 
-        descriptor_data = self._read_descriptor_data()
-
-        return descriptor_data["courses"][course_id]
+        with self._lock:
+            # La copia è profonda perché il corso contiene i dizionari dei topic e degli elementi
+            return copy.deepcopy(self._descriptor_data["courses"][course_id])
 
     def get_topic_attributes(self, topic_id, course_id):
-        """Funzione che restituisce gli attributi di un topic di un corso
+        """Funzione che restituisce gli attributi di un topic di un corso. Il dizionario restituito è una copia,
+        fatta tenendo il lock
 
         :param topic_id: Id del topic di cui si vogliono conoscere gli attributi
         :type topic_id: str
@@ -189,12 +394,12 @@ class CourseDescriptor():
         :returns: Attributi del topic
         :rtype: dict"""
 
-        descriptor_data = self._read_descriptor_data()
-
-        return descriptor_data["courses"][course_id]["topics"][topic_id]
+        with self._lock:
+            return copy.deepcopy(self._descriptor_data["courses"][course_id]["topics"][topic_id])
 
     def get_element_attributes(self, element_id, topic_id, course_id):
-        """Funzione che restituisce gli attributi di un elemento di un topic in un corso
+        """Funzione che restituisce gli attributi di un elemento di un topic in un corso. Il dizionario restituito
+        è una copia, fatta tenendo il lock
 
         :param element_id: Id dell'elemento di cui si vogliono conoscere gli attributi
         :type element_id: str
@@ -206,9 +411,8 @@ class CourseDescriptor():
         :returns: Attributi del corso
         :rtype: dict"""
 
-        descriptor_data = self._read_descriptor_data()
-
-        return descriptor_data["courses"][course_id]["topics"][topic_id]["elements"][element_id]
+        with self._lock:
+            return dict(self._descriptor_data["courses"][course_id]["topics"][topic_id]["elements"][element_id])
 
     def add_course(self, course_name, course_id):
         """Funzione che permette l'aggiunta di un corso
@@ -225,18 +429,14 @@ class CourseDescriptor():
         if not isinstance(course_name, str):
             return False
 
-        descriptor_data = self._read_descriptor_data()
-
         # Creo la entry del nuovo corso
         new_course = {
             "name": course_name, "topics": {},
             "creation date": datetime.now().isoformat(),
             "delete date": None
         }
-        descriptor_data["courses"][course_id] = new_course
 
-        # Aggiorno il file descrittore
-        self._write_descriptor_data(descriptor_data)
+        self._set_value(["courses", course_id], new_course)
 
         return True
 
@@ -249,18 +449,14 @@ class CourseDescriptor():
         :returns: True se l'azione è andata a buon fine altrimenti False
         :rtype: bool"""
 
-        # Controllo che il corso esista
-        if not course_id in self.get_courses_list():
-            return False
-
-        descriptor_data = self._read_descriptor_data()
-
-        # Recupero la lista dei corsi dal file descrittore e cancello la entry
-        courses_list = descriptor_data["courses"]
-        courses_list[course_id]["delete date"] = datetime.now().isoformat()
+        with self._lock:
+            # Controllo che il corso esista
+            if not course_id in self.get_courses_list():
+                return False
 
-        # Aggiorno il file descrittore
-        self._write_descriptor_data(descriptor_data)
+            # Cancello la entry del corso
+            self._set_value(["courses", course_id, "delete date"],
+                            datetime.now().isoformat())
 
         return True
 
@@ -281,18 +477,14 @@ class CourseDescriptor():
         if not isinstance(topic_name, str):
             return False
 
-        descriptor_data = self._read_descriptor_data()
-
         # Creo la entry del nuovo topic
         new_topic = {
             "name": topic_name, "elements": {},
             "creation date": datetime.now().isoformat(),
             "delete date": None
         }
-        descriptor_data["courses"][course_id]["topics"][topic_id] = new_topic
 
-        # Aggiorno il file descrittore
-        self._write_descriptor_data(descriptor_data)
+        self._set_value(["courses", course_id, "topics", topic_id], new_topic)
 
         return True
 
@@ -307,18 +499,14 @@ class CourseDescriptor():
         :returns: True se l'azione è andata a buon fine altrimenti False
         :rtype: bool"""
 
-        # Controllo che il corso esista
-        if not topic_id in self.get_topics_list(course_id):
-            return False
+        with self._lock:
+            # Controllo che il corso esista
+            if not topic_id in self.get_topics_list(course_id):
+                return False
 
-        descriptor_data = self._read_descriptor_data()
-
-        # Recupero la lista dei topic dal file descrittore e cancello la entry
-        topics_list = descriptor_data["courses"][course_id]["topics"]
-        topics_list[topic_id]["delete date"] = datetime.now().isoformat()
-
-        # Aggiorno il file descrittore
-        self._write_descriptor_data(descriptor_data)
+            # Cancello la entry del topic
+            self._set_value(["courses", course_id, "topics", topic_id, "delete date"],
+                            datetime.now().isoformat())
 
         return True
 
@@ -347,8 +535,6 @@ class CourseDescriptor():
         if not element_type in CourseDescriptor.AVAILABLE_ELEMENT_TYPES:
             return False
 
-        descriptor_data = self._read_descriptor_data()
-
         # Creo la entry del nuovo elemento
         new_element = {
             "name": element_name, "type": element_type,
@@ -356,24 +542,41 @@ class CourseDescriptor():
             "edit date": datetime.now().isoformat(),
             "delete date": None
         }
-        descriptor_data["courses"][course_id]["topics"][topic_id]["elements"][element_id] = new_element
 
-        # Aggiorno il file descrittore
-        self._write_descriptor_data(descriptor_data)
+        self._set_value(["courses", course_id, "topics", topic_id, "elements", element_id], new_element)
 
         return True
 
     def edit_element(self, element_name, element_id, topic_id, course_id):
+        """Funzione che permette di rinominare un elemento, aggiornandone la data di modifica
+
+        :param element_name: Nuovo nome dell'elemento
+        :type element_name: str
+        :param element_id: Id dell'elemento da modificare
+        :type element_id: str
+        :param topic_id: Id del topic che contiene l'elemento da modificare
+        :type topic_id: str
+        :param course_id: Id del corso che contiene il topic che a sua volta contiene l'elemento da modificare
+        :type course_id: str
+
+        :returns: True se l'azione è andata a buon fine altrimenti False
+        :rtype: bool"""
 
-        # Controllo che l'elemento esista
-        if not element_id in self.get_elements_list(topic_id, course_id):
+        # Controllo che il nome dell'elemento sia valido
+        if not isinstance(element_name, str):
             return False
 
-        descriptor_data = self._read_descriptor_data()
+        with self._lock:
+            # Controllo che l'elemento esista
+            if not element_id in self.get_elements_list(topic_id, course_id):
+                return False
+
+            # Modifico la entry dell'elemento
+            element_path = ["courses", course_id, "topics", topic_id, "elements", element_id]
+            self._set_value(element_path + ["name"], element_name)
+            self._set_value(element_path + ["edit date"], datetime.now().isoformat())
 
-        # Recupero la lista degli elementi dal file descrittore e cancello la entry
-        elements_list = descriptor_data["courses"][course_id]["topics"][topic_id]["elements"]
-        elements_list[element_id]["delete date"] = datetime.now().isoformat()
+        return True
 
     def remove_element(self, element_id, topic_id, course_id):
         """Funzione che permette di cancellare un elemento
@@ -388,24 +591,129 @@ class CourseDescriptor():
         :returns: True se l'azione è andata a buon fine altrimenti False
         :rtype: bool"""
 
-        # Controllo che l'elemento esista
-        if not element_id in self.get_elements_list(topic_id, course_id):
-            return False
-
-        descriptor_data = self._read_descriptor_data()
+        with self._lock:
+            # Controllo che l'elemento esista
+            if not element_id in self.get_elements_list(topic_id, course_id):
+                return False
 
-        # Recupero la lista degli elementi dal file descrittore e cancello la entry
-        elements_list = descriptor_data["courses"][course_id]["topics"][topic_id]["elements"]
-        elements_list[element_id]["delete date"] = datetime.now().isoformat()
-
-        # Aggiorno il file descrittore
-        self._write_descriptor_data(descriptor_data)
+            # Cancello la entry dell'elemento
+            self._set_value(["courses", course_id, "topics", topic_id, "elements", element_id, "delete date"],
+                            datetime.now().isoformat())
 
         return True
 
+    def _set_value(self, path, value):
+        """Funzione attraverso cui passa ogni modifica del descrittore: aggiorna il descrittore in memoria,
+        registra la modifica nel DescriptorJournal (se attivo) e la segnala al WriteBehindFlusher
+
+        :param path: Lista di chiavi che porta al valore da modificare
+        :type path: list
+        :param value: Nuovo valore
+        :type value: any"""
+
+        with self._lock:
+            DescriptorJournal.apply_record(self._descriptor_data, path, value)
+            self._mark_dirty(path)
+            if self._journal is not None:
+                self._journal.append(path, value)
+            self._flusher.notify_mutation()
+
+    def _mark_dirty(self, path):
+        """Funzione che segna quali file andranno riscritti per salvare la modifica di una chiave: l'indice per i
+        contatori e gli attributi dei corsi, il descrittore del corso per i suoi topic ed elementi, entrambi per un
+        corso nuovo
+
+        :param path: Lista di chiavi che porta al valore modificato
+        :type path: list"""
+
+        in_course_topics = len(path) > 2 and path[0] == "courses" and path[2] == "topics"
+        if not in_course_topics:
+            self._index_dirty = True
+        if path[0] == "courses" and len(path) > 1 and (len(path) == 2 or in_course_topics):
+            self._dirty_courses.add(path[1])
+
+    def _select_available(self, unfiltered_dict, key=None):
+        """Funzione che restituisce le coppie (id, valore) non cancellate di un dizionario, oppure soltanto quella
+        dell'id richiesto se fornito"""
+
+        if key is None:
+            return self.filter_deleted(unfiltered_dict).items()
+        value = unfiltered_dict.get(key)
+        return [(key, value)] if value is not None and not value["delete date"] else []
+
+    def _reserve_ids(self, counter_key, block_size):
+        """Funzione invocata dagli IdAllocator per riservare un blocco di id. Il contatore viene portato oltre
+        il blocco e reso subito persistente, prima che qualsiasi id del blocco venga distribuito
+
+        :param counter_key: Chiave del contatore nel file descrittore
+        :type counter_key: str
+        :param block_size: Numero di id da riservare
+        :type block_size: int
+
+        :returns: La coppia (primo id riservato, primo id non riservato)
+        :rtype: tuple"""
+
+        with self._lock:
+            first_id = self._descriptor_data[counter_key]
+            self._set_value([counter_key], first_id + block_size)
+
+        # In modalità "journal" il record è già su disco, altrimenti scrivo subito l'istantanea. Se flush non scrive
+        # nulla è perché una scrittura già conclusa (flush attende quella eventualmente in corso) contiene il contatore
+        if self._journal is None:
+            self._flusher.flush()
+
+        return first_id, first_id + block_size
+
+    def _flush_descriptor_data(self):
+        """Funzione invocata dal WriteBehindFlusher per scrivere su disco il descrittore in memoria. Vengono
+        serializzati, tenendo il lock, soltanto l'indice e i descrittori dei corsi modificati, mentre la scrittura su
+        disco avviene senza bloccare le altre operazioni. In modalità "journal" questa scrittura è la compattazione
+        del registro in una nuova istantanea"""
+
+        with self._write_lock:
+            self._write_dirty_files()
+
+    def _write_dirty_files(self):
+        """Funzione che scrive l'indice e i descrittori dei corsi modificati. Va invocata tenendo _write_lock, così
+        che le scritture non si sovrappongano"""
+
+        with self._lock:
+            index_content = None
+            if self._index_dirty:
+                index_content = json.dumps(
+                    self._get_index_data(self._descriptor_data),
+                    indent=CourseDescriptor.DEFAULT_INDENT_LEVEL
+                )
+            courses = self._descriptor_data["courses"]
+            course_contents = {
+                course_id: json.dumps(
+                    {"topics": courses[course_id]["topics"]},
+                    indent=CourseDescriptor.DEFAULT_INDENT_LEVEL
+                )
+                for course_id in self._dirty_courses if course_id in courses
+            }
+            self._index_dirty = False
+            self._dirty_courses = set()
+            if self._journal is not None:
+                self._journal.rotate()
+
+        try:
+            self._write_descriptor_files(index_content, course_contents)
+        except OSError:
+            # I file non scritti restano da riscrivere alla prossima occasione
+            with self._lock:
+                self._index_dirty = self._index_dirty or index_content is not None
+                self._dirty_courses.update(course_contents)
+            raise
+
+        # L'istantanea contiene ormai tutti i record messi da parte
+        if self._journal is not None:
+            self._journal.discard_rotated()
+
     @staticmethod
     def _read_descriptor_data():
-        """Funzione che restituisce il contenuto del file descrittore
+        """Funzione che restituisce il descrittore completo, leggendo l'indice e i descrittori dei corsi. I corsi
+        di un file nel vecchio formato contengono già i propri topic
 
         :returns: Contenuto del file descrittore
         :rtype: dict"""
@@ -413,14 +721,35 @@ class CourseDescriptor():
         with open(CourseDescriptor.DEFAULT_DESCRIPTOR_PATH, "r") as file_object:
             file_json = json.loads(file_object.read())
 
+        for course_id, course in file_json["courses"].items():
+            if "topics" not in course:
+                course["topics"] = CourseDescriptor._read_course_topics(course_id)
+
         return file_json
 
+    @staticmethod
+    def _read_course_topics(course_id):
+        """Funzione che restituisce i topic salvati nel descrittore di un corso
+
+        :param course_id: Id del corso
+        :type course_id: str
+
+        :returns: Topic del corso, vuoti se il corso non ha ancora un descrittore
+        :rtype: dict"""
+
+        try:
+            with open(CourseDescriptor._get_course_descriptor_path(course_id), "r") as file_object:
+                return json.loads(file_object.read())["topics"]
+        except FileNotFoundError:
+            # Il corso è stato creato ma non ancora scritto: i suoi topic non erano ancora sul disco
+            return {}
+
     @staticmethod
     # Caution while writing descriptor, it will overwrite everything!
     def _write_descriptor_data(new_descriptor, backup=False):
         """Funzione che permette di scrivere sul file descrittore. La scrittura non avviene
         in modalità "append", ecco perchè bisogna stare attenti altrimenti si rischia di
-        perdere tutto il contenuto del file descrittore
+        perdere tutto il contenuto del file descrittore. Vengono riscritti l'indice e i descrittori di tutti i corsi
 
         :param new_descriptor: Nuovo contenuto del file descrittore
         :type new_descriptor: dict
@@ -430,41 +759,124 @@ class CourseDescriptor():
         :returns: True per indicare che l'azione è andata a buon fine
         :rtype: bool"""
 
-        # Converto "new_descriptor" (di tipo "dict") in una stringa così da poterne scrivere il contenuto sul file descrittore
-        new_descriptor = json.dumps(
-            new_descriptor,
+        if backup:
+            CourseDescriptor._create_backup_folder()
+            CourseDescriptor._create_backup_file()
+
+        # Converto "new_descriptor" (di tipo "dict") in stringhe così da poterne scrivere il contenuto sui file
+        index_content = json.dumps(
+            CourseDescriptor._get_index_data(new_descriptor),
             indent=CourseDescriptor.DEFAULT_INDENT_LEVEL
         )
+        course_contents = {
+            course_id: json.dumps({"topics": course["topics"]}, indent=CourseDescriptor.DEFAULT_INDENT_LEVEL)
+            for course_id, course in new_descriptor["courses"].items()
+        }
 
-        # Apro e scrivo il nuovo contenuto sul file descrittore
-        with open(CourseDescriptor.DEFAULT_DESCRIPTOR_PATH, "w") as file_object:
-            file_object.write(new_descriptor)
-            file_object.close()
+        CourseDescriptor._write_descriptor_files(index_content, course_contents)
 
         return True
 
     @staticmethod
-    def _create_backup_file():
-        """Funzione che controlla che esista un file descrittore e ne crea una copia
-        nella cartella di backup. Ogni file di backup conterrà nel suo nome la data di creazione,
-        che permetterà di identificarlo più facilmente
+    def _write_descriptor_files(index_content, course_contents):
+        """Funzione che scrive l'indice e i descrittori dei corsi già serializzati. Ogni file viene scritto su un file
+        temporaneo e poi sostituito, così da non lasciarlo mai a metà; i corsi vengono scritti prima dell'indice,
+        quindi l'indice non fa mai riferimento a un corso non ancora scritto
+
+        :param index_content: Contenuto dell'indice, None se non va riscritto
+        :type index_content: str
+        :param course_contents: Dizionario id del corso -> contenuto del suo descrittore
+        :type course_contents: dict"""
+
+        for course_id, course_content in course_contents.items():
+            course_path = CourseDescriptor._get_course_descriptor_path(course_id)
+            os.makedirs(os.path.dirname(course_path), exist_ok=True)
+            CourseDescriptor._replace_file(course_path, course_content)
+
+        if index_content is not None:
+            CourseDescriptor._replace_file(CourseDescriptor.DEFAULT_DESCRIPTOR_PATH, index_content)
+
+    @staticmethod
+    def _replace_file(path, content):
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as file_object:
+            file_object.write(content)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _split_descriptor_file():
+        """Funzione che divide un file descrittore nel vecchio formato, con i topic di tutti i corsi, nell'indice e
+        nei descrittori dei singoli corsi, dopo averne fatto un backup. Se la divisione si interrompe l'indice resta
+        nel vecchio formato e viene diviso di nuovo al prossimo avvio
+
+        :returns: True se il file è stato diviso altrimenti False
+        :rtype: bool"""
+
+        with open(CourseDescriptor.DEFAULT_DESCRIPTOR_PATH, "r") as file_object:
+            file_json = json.loads(file_object.read())
+
+        if not any("topics" in course for course in file_json["courses"].values()):
+            return False
+
+        # I corsi già divisi in precedenza mantengono il loro descrittore
+        for course_id, course in file_json["courses"].items():
+            if "topics" not in course:
+                course["topics"] = CourseDescriptor._read_course_topics(course_id)
+
+        CourseDescriptor._write_descriptor_data(file_json, backup=True)
+        return True
+
+    @staticmethod
+    def _get_index_data(descriptor_data):
+        """Funzione che restituisce il contenuto dell'indice: il descrittore senza i topic dei corsi
+
+        :param descriptor_data: Descrittore completo
+        :type descriptor_data: dict
+
+        :returns: Contenuto dell'indice
+        :rtype: dict"""
+
+        index_data = dict(descriptor_data)
+        index_data["courses"] = {
+            course_id: {key: value for key, value in course.items() if key != "topics"}
+            for course_id, course in descriptor_data["courses"].items()
+        }
+        return index_data
+
+    @staticmethod
+    def _get_course_descriptor_path(course_id):
+        return os.path.join(
+            CourseDescriptor.DEFAULT_COURSES_FOLDER, course_id, CourseDescriptor.COURSE_DESCRIPTOR_NAME
+        )
+
+    @staticmethod
+    def _create_backup_file(descriptor_data=None):
+        """Funzione che salva una copia completa del descrittore, con i topic di tutti i corsi, nella cartella di
+        backup. Ogni file di backup conterrà nel suo nome la data di creazione, che permetterà di identificarlo più
+        facilmente
+
+        :param descriptor_data: Descrittore da salvare, se None viene letto quello su disco (se esiste)
+        :type descriptor_data: dict
 
         :returns: True se l'operazione è andata a buon fine altrimenti errore
         :rtype: bool o Error"""
 
-        if not os.path.isfile(CourseDescriptor.DEFAULT_DESCRIPTOR_PATH):
-            return Error("backup", "Impossibile fare backup su file non esistente")
+        if descriptor_data is None:
+            if not os.path.isfile(CourseDescriptor.DEFAULT_DESCRIPTOR_PATH):
+                return Error("backup", "Impossibile fare backup su file non esistente")
+            descriptor_data = CourseDescriptor._read_descriptor_data()
 
         current_date = datetime.now().isoformat()
 
-        # Copio il file nella cartella di backup e lo identifico tramite la data corrente
-        copyfile(
-            CourseDescriptor.DEFAULT_DESCRIPTOR_PATH,
-            os.path.join(
+        # Salvo il descrittore nella cartella di backup e lo identifico tramite la data corrente
+        with open(os.path.join(
                 CourseDescriptor.DEFAULT_BACKUP_FOLDER,
                 "descriptor{}.json".format(current_date)
-            )
-        )
+        ), "w") as file_object:
+            file_object.write(json.dumps(
+                descriptor_data,
+                indent=CourseDescriptor.DEFAULT_INDENT_LEVEL
+            ))
 
         return True
 
@@ -1,5 +1,7 @@
 from CourseDescriptor import CourseDescriptor
-from bs4 import BeautifulSoup
+from AttemptStore import AttemptStore
+from QuizLock import QuizLock
+from QuizStats import QuizStats
 from Error import Error
 import shutil
 import os
@@ -20,6 +22,25 @@ class CourseFileSystem:
         # Creo e salvo un'istanza del modulo CourseDescriptor che verrà utilizzata da altre funzioni
         self.descriptor = CourseDescriptor()
 
+        # Cache delle domande dei quiz: percorso -> (firma del file, contenuto)
+        self._quiz_cache = {}
+        # Cartelle dei quiz i cui tentativi sono già stati spostati dal file del quiz all'AttemptStore
+        self._migrated_quiz_dirs = set()
+
+        # Funzioni da avvisare dopo ogni modifica di corsi, topic ed elementi
+        self._change_listeners = []
+
+    def add_change_listener(self, listener):
+        """Funzione che registra una funzione da avvisare dopo ogni modifica di un corso, di un topic o di un
+        elemento. La funzione riceve (course_id, topic_id, element_id), dove topic_id ed element_id sono None se
+        la modifica riguarda tutto il corso o tutto il topic. Viene invocata durante il salvataggio, quindi deve
+        soltanto prendere nota della modifica e lasciare il lavoro vero a un altro thread
+
+        :param listener: Funzione da avvisare
+        :type listener: function"""
+
+        self._change_listeners.append(listener)
+
     def get_courses_list(self):
         """Una funzione che restituisce la lista di corsi disponibili, controllando che siano
         presenti sia sul FileSystem che nel file descrittore
@@ -70,6 +91,56 @@ class CourseFileSystem:
         # Controllo incrociato tra elementi nel FileSystem e nel file descrittore
         return [element for element in fs_elements if element in descriptor_elements]
 
+    def get_courses_with_attributes(self, course_ids):
+        """Funzione che restituisce id e nome di più corsi con una sola lettura del descrittore, controllando che
+        siano presenti anche sul FileSystem
+
+        :param course_ids: Lista degli id dei corsi
+        :type course_ids: list
+
+        :returns: Lista di dizionari con "id" e "name" di ogni corso
+        :rtype: list"""
+
+        fs_courses = set(os.listdir(CourseFileSystem.DEFAULT_COURSES_PATH))
+
+        # Controllo incrociato tra corsi nel FileSystem e nel file descrittore
+        return [course for course in self.descriptor.get_courses_summary(course_ids) if course["id"] in fs_courses]
+
+    def get_topics_with_attributes(self, course_id):
+        """Funzione che restituisce id e nome dei topic disponibili di un corso con una sola lettura del
+        descrittore, controllando che siano presenti anche sul FileSystem
+
+        :param course_id: Id del corso di cui si vogliono conoscere i topic
+        :type course_id: str
+
+        :returns: Lista di dizionari con "id" e "name" di ogni topic
+        :rtype: list"""
+
+        fs_topics = set(os.listdir(os.path.join(
+            CourseFileSystem.DEFAULT_COURSES_PATH, course_id)))
+
+        # Controllo incrociato tra topics nel FileSystem e nel file descrittore
+        return [topic for topic in self.descriptor.get_topics_summary(course_id) if topic["id"] in fs_topics]
+
+    def get_elements_with_attributes(self, topic_id, course_id):
+        """Funzione che restituisce id, nome e tipo degli elementi disponibili di un topic con una sola lettura
+        del descrittore, controllando che siano presenti anche sul FileSystem
+
+        :param topic_id: Id del topic di cui si vogliono conoscere gli elementi
+        :type topic_id: str
+        :param course_id: Id del corso che contiene il topic
+        :type course_id: str
+
+        :returns: Lista di dizionari con "id", "name" e "type" di ogni elemento
+        :rtype: list"""
+
+        fs_elements = set(os.listdir(os.path.join(
+            CourseFileSystem.DEFAULT_COURSES_PATH, course_id, topic_id)))
+
+        # Controllo incrociato tra elementi nel FileSystem e nel file descrittore
+        return [element for element in self.descriptor.get_elements_summary(topic_id, course_id)
+                if element["id"] in fs_elements]
+
     def add_course(self, course_name):
         """Funzione che permette l'aggiunta di un corso
 
@@ -108,6 +179,7 @@ class CourseFileSystem:
         if not self.descriptor.remove_course(course_id):
             return Error("Errore durante la rimozione del corso")
 
+        self._notify_change(course_id)
         return True
 
     def add_topic(self, topic_name, course_id):
@@ -162,6 +234,7 @@ class CourseFileSystem:
         if not self.descriptor.remove_topic(topic_id, course_id):
             return Error("Errore durante la rimozione del topic")
 
+        self._notify_change(course_id, topic_id)
         return True
 
     def add_lesson(self, element_name, topic_id, course_id):
@@ -199,6 +272,7 @@ class CourseFileSystem:
         if not self.descriptor.add_element(element_name, "lesson", new_element_id, topic_id, course_id):
             return Error("Errore durante la creazione dell'elemento")
 
+        self._notify_change(course_id, topic_id, new_element_id)
         return new_element_id
 
     def add_quiz(self, element_name, topic_id, course_id):
@@ -220,12 +294,15 @@ class CourseFileSystem:
         # Creo il file "index.html" dell'elemento sul FileSystem e inserisco i vari tag
         with open(os.path.join(element_dir, "index.json"), "w") as quiz_object:
             quiz_object.write(json.dumps(
-                {"count": 0, "questions": {}, "stats": {}}, indent=4))
+                {"count": 0, "questions": {}}, indent=4))
 
         # Tento di creare l'elemento sul file descrittore
         if not self.descriptor.add_element(element_name, "quiz", new_element_id, topic_id, course_id):
             return Error("Errore durante la creazione dell'elemento")
 
+        self._notify_change(course_id, topic_id, new_element_id)
+        return new_element_id
+
     def edit_lesson(self, element_id, topic_id, course_id, element_html):
 
         # "Assemblo" la path dell'elemento
@@ -233,14 +310,12 @@ class CourseFileSystem:
             CourseFileSystem.DEFAULT_COURSES_PATH, course_id, topic_id, element_id
         )
 
-        # Creo il parser html dell' elemento
-        element_html_parser = BeautifulSoup(element_html, "html.parser")
-
         # Creo il file "index.html" dell'elemento sul FileSystem e inserisco i vari tag
         with open(os.path.join(element_dir, "index.html"), "w", encoding="utf-8") as html_file_object:
             html_file_object.write(
                 element_html)
 
+        self._notify_change(course_id, topic_id, element_id)
         return element_id
 
     def edit_quiz(self, element_id, topic_id, course_id, element_json):
@@ -250,9 +325,11 @@ class CourseFileSystem:
             CourseFileSystem.DEFAULT_COURSES_PATH, course_id, topic_id, element_id
         )
 
-        # Creo il file "index.html" dell'elemento sul FileSystem e inserisco i vari tag
-        with open(os.path.join(element_dir, "index.json"), "w") as quiz_object:
-            quiz_object.write(json.dumps(element_json, indent=4))
+        # Scrivo il file "index.json" dell'elemento tenendo il lock del quiz e aggiorno la cache delle domande
+        quiz_path = os.path.join(element_dir, "index.json")
+        with QuizLock.acquire(element_dir):
+            self._write_atomic(quiz_path, json.dumps(element_json, indent=4))
+            self._quiz_cache[quiz_path] = (self._file_stamp(quiz_path), element_json)
 
         return element_id
 
@@ -278,10 +355,12 @@ class CourseFileSystem:
         if not self.descriptor.remove_element(element_id, topic_id, course_id):
             return Error("Errore durante la cancellazione dell'elemento")
 
+        self._notify_change(course_id, topic_id, element_id)
         return True
 
-    def get_lesson_html(self, element_id, topic_id, course_id):
-        """Funzione che restituisce il contenuto html di un elemento (lezione o quiz)
+    def get_lesson_html(self, element_id, topic_id, course_id, sanitize=False):
+        """Funzione che restituisce il contenuto html di un elemento (lezione o quiz). Di default il contenuto
+        viene restituito così come è salvato; il parser html viene usato soltanto se è richiesta la sanitizzazione
 
         :param element_id: Id dell'elemento da leggere
         :type element_id: str
@@ -289,9 +368,11 @@ class CourseFileSystem:
         :type topic_id: str
         :param course_id: Id del corso che contiene il topic che a sua volta contiene l'elemento
         :type course_id: str
+        :param sanitize: Parametro che decide se far passare il contenuto attraverso il parser html
+        :type sanitize: bool
 
-        :returns: Parser html dell'elemento oppure errore
-        :rtype: bs4.BeautifulSoup o Error"""
+        :returns: Contenuto html dell'elemento oppure errore
+        :rtype: str o Error"""
 
         # "Assemblo" la path dell'elemento
         element_dir = os.path.join(
@@ -300,29 +381,128 @@ class CourseFileSystem:
 
         try:
             # Tento di aprire l'elemento e di leggerne il contenuto
-            with open(os.path.join(element_dir, "index.html")) as element_object:
-                element_html = element_object.read().encode('utf-8').strip()
+            with open(os.path.join(element_dir, "index.html"), encoding="utf-8") as element_object:
+                element_html = element_object.read().strip()
         except:
             return Error("Errore nella lettura dell'elemento")
 
-        # Genero il parser che mi permetterà di accedere ai contenuti html dell'elemento con facilità
-        element_html_parser = BeautifulSoup(element_html, "html.parser")
+        if sanitize:
+            element_html = self.sanitize_html(element_html)
+
+        return element_html
 
-        return element_html_parser
+    def get_lesson_mtime(self, element_id, topic_id, course_id):
+        """Funzione che restituisce la data di modifica del file di una lezione, utile per capire se una sua
+        versione già renderizzata è ancora valida
+
+        :param element_id: Id della lezione
+        :type element_id: str
+        :param topic_id: Id del topic che contiene l'elemento
+        :type topic_id: str
+        :param course_id: Id del corso che contiene il topic che a sua volta contiene l'elemento
+        :type course_id: str
+
+        :returns: Data di modifica in nanosecondi oppure None se il file non esiste
+        :rtype: int"""
+
+        try:
+            return os.stat(os.path.join(
+                CourseFileSystem.DEFAULT_COURSES_PATH, course_id, topic_id, element_id, "index.html"
+            )).st_mtime_ns
+        except OSError:
+            return None
 
     def get_quiz_json(self, element_id, topic_id, course_id):
+        """Funzione che restituisce le domande di un quiz. Il contenuto viene tenuto in cache finché il file non
+        cambia, quindi il dizionario restituito non va modificato se non per salvarlo subito con edit_quiz.
+        I tentativi salvati nel file dalle versioni precedenti vengono spostati nell'AttemptStore del quiz
+
+        :param element_id: Id del quiz
+        :type element_id: str
+        :param topic_id: Id del topic che contiene l'elemento
+        :type topic_id: str
+        :param course_id: Id del corso che contiene il topic che a sua volta contiene l'elemento
+        :type course_id: str
+
+        :returns: Contenuto del quiz oppure errore
+        :rtype: dict o Error"""
 
         quiz_dir = os.path.join(
             CourseFileSystem.DEFAULT_COURSES_PATH, course_id, topic_id, element_id
         )
+        quiz_path = os.path.join(quiz_dir, "index.json")
 
         try:
+            stamp = self._file_stamp(quiz_path)
+            cached_quiz = self._quiz_cache.get(quiz_path)
+            if cached_quiz is not None and cached_quiz[0] == stamp:
+                return cached_quiz[1]
+
             # Tento di aprire il quiz e di leggerne il contenuto
-            with open(os.path.join(quiz_dir, "index.json")) as quiz_object:
-                return json.loads(quiz_object.read())
+            with open(quiz_path) as quiz_object:
+                quiz_json = json.loads(quiz_object.read())
         except:
             return Error("Errore nella lettura dell'elemento")
 
+        if "stats" in quiz_json:
+            with QuizLock.acquire(quiz_dir):
+                # Rileggo il quiz tenendo il lock: un altro thread potrebbe averlo già migrato
+                stamp = self._file_stamp(quiz_path)
+                with open(quiz_path) as quiz_object:
+                    quiz_json = json.loads(quiz_object.read())
+                if "stats" in quiz_json:
+                    self._migrate_quiz_stats(quiz_dir, quiz_json)
+                    self.edit_quiz(element_id, topic_id, course_id, quiz_json)
+                    return quiz_json
+
+        self._quiz_cache[quiz_path] = (stamp, quiz_json)
+        self._migrated_quiz_dirs.add(quiz_dir)
+        return quiz_json
+
+    def get_quiz_version(self, element_id, topic_id, course_id):
+        """Funzione che restituisce la versione del file delle domande di un quiz, usata da QuizManager per
+        riutilizzare la chiave di correzione già compilata
+
+        :param element_id: Id del quiz
+        :type element_id: str
+        :param topic_id: Id del topic che contiene l'elemento
+        :type topic_id: str
+        :param course_id: Id del corso che contiene il topic che a sua volta contiene l'elemento
+        :type course_id: str
+
+        :returns: Coppia (percorso del file, firma del file) oppure None se il quiz non esiste
+        :rtype: tuple"""
+
+        quiz_path = os.path.abspath(os.path.join(
+            CourseFileSystem.DEFAULT_COURSES_PATH, course_id, topic_id, element_id, "index.json"
+        ))
+        try:
+            return quiz_path, self._file_stamp(quiz_path)
+        except OSError:
+            return None
+
+    def get_attempt_store(self, element_id, topic_id, course_id):
+        """Funzione che restituisce l'archivio dei tentativi di un quiz
+
+        :param element_id: Id del quiz
+        :type element_id: str
+        :param topic_id: Id del topic che contiene l'elemento
+        :type topic_id: str
+        :param course_id: Id del corso che contiene il topic che a sua volta contiene l'elemento
+        :type course_id: str
+
+        :returns: Archivio dei tentativi
+        :rtype: AttemptStore"""
+
+        quiz_dir = os.path.join(CourseFileSystem.DEFAULT_COURSES_PATH, course_id, topic_id, element_id)
+
+        # Mi assicuro che gli eventuali tentativi salvati nel file del quiz siano già stati spostati, leggendo il
+        # quiz soltanto la prima volta
+        if quiz_dir not in self._migrated_quiz_dirs:
+            self.get_quiz_json(element_id, topic_id, course_id)
+
+        return AttemptStore.open(quiz_dir)
+
     def get_course_attributes(self, course_id):
         """Funzione che restituisce gli attributi di un corso presenti nel file descrittore
 
@@ -362,6 +542,79 @@ class CourseFileSystem:
 
         return self.descriptor.get_element_attributes(element_id, topic_id, course_id)
 
+    def get_quiz_stats(self, element_id, topic_id, course_id):
+        """Funzione che restituisce le statistiche aggregate di un quiz, ricalcolandole dai tentativi soltanto se
+        non sono allineate con essi (ad esempio la prima volta, dopo la migrazione dei tentativi dal file del quiz o
+        dopo una ricorrezione). Per saperlo basta confrontare la firma del file dei tentativi con quella salvata
+        nelle statistiche, senza leggere i tentativi
+
+        :param element_id: Id del quiz
+        :type element_id: str
+        :param topic_id: Id del topic che contiene l'elemento
+        :type topic_id: str
+        :param course_id: Id del corso che contiene il topic che a sua volta contiene l'elemento
+        :type course_id: str
+
+        :returns: Statistiche del quiz
+        :rtype: QuizStats"""
+
+        attempt_store = self.get_attempt_store(element_id, topic_id, course_id)
+        quiz_stats = QuizStats.open(attempt_store.get_quiz_dir())
+        if quiz_stats.get_log_stamp() != attempt_store.get_log_stamp():
+            with QuizLock.acquire(attempt_store.get_quiz_dir()):
+                log_stamp = attempt_store.get_log_stamp()
+                if quiz_stats.get_log_stamp() != log_stamp:
+                    quiz_stats.rebuild(attempt_store.iter_attempts(), log_stamp)
+        return quiz_stats
+
+    def _notify_change(self, course_id, topic_id=None, element_id=None):
+        for listener in self._change_listeners:
+            listener(course_id, topic_id, element_id)
+
+    @staticmethod
+    def _migrate_quiz_stats(quiz_dir, quiz_json):
+        """Funzione che sposta nell'AttemptStore i tentativi salvati nel file del quiz, rimuovendoli dal dizionario.
+        Se un crash ha interrotto una migrazione precedente dopo la scrittura dei tentativi, questi non vengono
+        aggiunti una seconda volta
+
+        :param quiz_dir: Cartella del quiz
+        :type quiz_dir: str
+        :param quiz_json: Contenuto del quiz
+        :type quiz_json: dict"""
+
+        legacy_attempts = [(user_id, attempt) for user_id, attempts in quiz_json.pop("stats").items()
+                           for attempt in attempts]
+        AttemptStore.open(quiz_dir).import_legacy_attempts(legacy_attempts)
+
+    @staticmethod
+    def _write_atomic(path, content):
+        """Funzione che scrive un file passando da un file temporaneo, così che non venga mai letto a metà"""
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as file_object:
+            file_object.write(content)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _file_stamp(path):
+        file_stat = os.stat(path)
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+    @staticmethod
+    def sanitize_html(element_html):
+        """Funzione che fa passare un contenuto html attraverso il parser di BeautifulSoup, che ne corregge
+        i tag non chiusi o malformati. BeautifulSoup viene importato soltanto quando serve
+
+        :param element_html: Contenuto html da sanitizzare
+        :type element_html: str
+
+        :returns: Contenuto html sanitizzato
+        :rtype: str"""
+
+        from bs4 import BeautifulSoup
+
+        return str(BeautifulSoup(element_html, "html.parser"))
+
     @staticmethod
     def _create_courses_folder():
         """Funzione che controlla che la cartella dei corsi esista e, in caso contrario,
@@ -0,0 +1,127 @@
+import json
+import os
+
+
+class DescriptorJournal:
+    """La classe DescriptorJournal gestisce un registro "append-only" delle modifiche al file descrittore. Ogni
+    modifica viene salvata come un piccolo record JSON su una riga, composto dal percorso della chiave modificata e
+    dal suo nuovo valore. Dato che ogni record sovrascrive un valore, riapplicare più volte lo stesso record non
+    cambia il risultato: questo permette di ricostruire il descrittore anche dopo una compattazione interrotta."""
+
+    DEFAULT_JOURNAL_PATH = os.path.join("data", "descriptor.journal")
+
+    def __init__(self, journal_path=DEFAULT_JOURNAL_PATH, fsync=True):
+        """L'init di questa classe apre il registro in modalità "append", creandolo se non esiste
+
+        :param journal_path: Percorso del file di registro
+        :type journal_path: str
+        :param fsync: Parametro che decide se forzare la scrittura su disco di ogni record
+        :type fsync: bool"""
+
+        self._journal_path = journal_path
+        self._rotated_path = journal_path + ".old"
+        self._fsync = fsync
+        self._records_count = 0
+        self._file_object = open(self._journal_path, "a", encoding="utf-8")
+
+    def get_records_count(self):
+        """Funzione che restituisce il numero di record scritti dall'ultima compattazione
+
+        :returns: Numero di record
+        :rtype: int"""
+
+        return self._records_count
+
+    def append(self, path, value):
+        """Funzione che aggiunge un record al registro
+
+        :param path: Lista di chiavi che porta al valore modificato all'interno del descrittore
+        :type path: list
+        :param value: Nuovo valore
+        :type value: any"""
+
+        self._file_object.write(json.dumps({"path": path, "value": value}) + "\n")
+        self._file_object.flush()
+        if self._fsync:
+            os.fsync(self._file_object.fileno())
+        self._records_count += 1
+
+    def replay(self, descriptor_data):
+        """Funzione che riapplica al descrittore tutti i record presenti nel registro, compresi quelli di una
+        compattazione non ancora conclusa
+
+        :param descriptor_data: Descrittore letto dall'ultima istantanea, che viene modificato sul posto
+        :type descriptor_data: dict
+
+        :returns: Numero di record applicati
+        :rtype: int"""
+
+        applied = 0
+        for journal_path in (self._rotated_path, self._journal_path):
+            if not os.path.isfile(journal_path):
+                continue
+
+            with open(journal_path, "r", encoding="utf-8") as file_object:
+                for line in file_object:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Un record troncato può essere solo l'ultimo, scritto durante un crash
+                        break
+                    self.apply_record(descriptor_data, record["path"], record["value"])
+                    applied += 1
+
+        self._records_count = applied
+        return applied
+
+    def rotate(self):
+        """Funzione che mette da parte il registro corrente prima di una compattazione, così che le nuove modifiche
+        finiscano in un registro vuoto. Va invocata mentre il descrittore in memoria non può essere modificato"""
+
+        self._file_object.close()
+
+        if os.path.isfile(self._rotated_path):
+            # Una compattazione precedente non si è conclusa: unisco i due registri per non perdere record
+            with open(self._journal_path, "r", encoding="utf-8") as current_object:
+                with open(self._rotated_path, "a", encoding="utf-8") as rotated_object:
+                    rotated_object.write(current_object.read())
+            os.remove(self._journal_path)
+        else:
+            os.replace(self._journal_path, self._rotated_path)
+
+        self._file_object = open(self._journal_path, "a", encoding="utf-8")
+        self._records_count = 0
+
+    def discard_rotated(self):
+        """Funzione che elimina il registro messo da parte, da invocare quando l'istantanea che lo contiene è
+        stata scritta su disco"""
+
+        if os.path.isfile(self._rotated_path):
+            os.remove(self._rotated_path)
+
+    def clear(self):
+        """Funzione che svuota completamente il registro"""
+
+        self._file_object.close()
+        self.discard_rotated()
+        self._file_object = open(self._journal_path, "w", encoding="utf-8")
+        self._records_count = 0
+
+    def close(self):
+        self._file_object.close()
+
+    @staticmethod
+    def apply_record(descriptor_data, path, value):
+        """Funzione che applica un singolo record al descrittore
+
+        :param descriptor_data: Descrittore da modificare
+        :type descriptor_data: dict
+        :param path: Lista di chiavi che porta al valore da modificare
+        :type path: list
+        :param value: Nuovo valore
+        :type value: any"""
+
+        parent = descriptor_data
+        for key in path[:-1]:
+            parent = parent[key]
+        parent[path[-1]] = value
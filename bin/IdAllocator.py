@@ -0,0 +1,74 @@
+import threading
+
+
+class IdAllocator:
+    """La classe IdAllocator distribuisce id univoci riservandoli a blocchi. Per ogni blocco viene effettuata una sola
+    scrittura persistente, che porta il contatore salvato oltre l'ultimo id del blocco; gli id vengono poi
+    distribuiti dalla memoria. Dopo un crash gli id non ancora distribuiti vengono semplicemente saltati, quindi
+    un id non può mai essere assegnato due volte."""
+
+    DEFAULT_BLOCK_SIZE = 100
+
+    def __init__(self, prefix, reserve_callback, block_size=DEFAULT_BLOCK_SIZE):
+        """L'init di questa classe salva i parametri dell'allocatore, senza riservare alcun blocco
+
+        :param prefix: Prefisso degli id generati (ad esempio "c-")
+        :type prefix: str
+        :param reserve_callback: Funzione che, dato il numero di id da riservare, li rende persistenti e restituisce
+        la coppia (primo id riservato, primo id non riservato)
+        :type reserve_callback: function
+        :param block_size: Numero di id riservati per ogni scrittura
+        :type block_size: int"""
+
+        if block_size < 1:
+            raise ValueError("La dimensione del blocco deve essere positiva")
+
+        self._prefix = prefix
+        self._reserve_callback = reserve_callback
+        self._block_size = block_size
+
+        # Rientrante, così che chi tiene il lock con hold possa anche invocare release
+        self._lock = threading.RLock()
+        self._next_id = None
+        self._limit = None
+
+    def get_new_id(self):
+        """Funzione che restituisce un nuovo id, riservando un nuovo blocco se quello corrente è esaurito
+
+        :returns: Nuovo id
+        :rtype: str"""
+
+        with self._lock:
+            if self._next_id is None or self._next_id >= self._limit:
+                self._next_id, self._limit = self._reserve_callback(self._block_size)
+
+            new_id = self._prefix + str(self._next_id)
+            self._next_id += 1
+
+        return new_id
+
+    def hold(self):
+        """Funzione che restituisce il lock dell'allocatore, da usare con "with" per impedire che vengano distribuiti
+        o riservati id mentre i contatori vengono sostituiti. Va preso prima di qualsiasi lock usato dalla funzione
+        che riserva i blocchi
+
+        :returns: Il lock dell'allocatore
+        :rtype: threading.RLock"""
+
+        return self._lock
+
+    def release(self):
+        """Funzione che rinuncia agli id riservati e non ancora distribuiti, da invocare alla chiusura
+
+        :returns: La coppia (primo id non distribuito, limite del blocco) oppure None se non c'è un blocco attivo
+        :rtype: tuple"""
+
+        with self._lock:
+            if self._next_id is None:
+                return None
+
+            unused_range = (self._next_id, self._limit)
+            self._next_id = None
+            self._limit = None
+
+        return unused_range
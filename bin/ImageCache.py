@@ -0,0 +1,60 @@
+from PIL import Image, ImageTk
+import threading
+
+
+class ImageCache:
+    """La classe ImageCache condivide le immagini usate dalle finestre di tkinter. Ogni file viene decodificato una
+    sola volta, ogni dimensione richiesta viene ridimensionata una sola volta e il PhotoImage risultante viene
+    riutilizzato da tutte le pagine che lo chiedono. I PhotoImage appartengono alla root di tkinter, quindi la cache
+    va creata dopo la root e non va usata dopo che è stata distrutta."""
+
+    def __init__(self):
+        """L'init di questa classe crea le cache vuote delle immagini decodificate e di quelle pronte per tkinter"""
+
+        self._lock = threading.Lock()
+        self._decoded = {}
+        self._photos = {}
+
+    def get_image(self, path, size=None):
+        """Funzione che restituisce un'immagine di PIL, decodificata e ridimensionata una sola volta
+
+        :param path: Percorso del file immagine
+        :type path: str
+        :param size: Coppia (larghezza, altezza), se None l'immagine viene restituita nella dimensione originale
+        :type size: tuple
+
+        :returns: L'immagine, da non modificare perché condivisa
+        :rtype: PIL.Image.Image"""
+
+        with self._lock:
+            key = (path, size)
+            if key not in self._decoded:
+                original = self._decoded.get((path, None))
+                if original is None:
+                    original = Image.open(path)
+                    original.load()
+                    self._decoded[(path, None)] = original
+                self._decoded[key] = original if size is None else original.resize(size)
+            return self._decoded[key]
+
+    def get_photo(self, path, size=None):
+        """Funzione che restituisce il PhotoImage di un'immagine, da usare nei widget di tkinter
+
+        :param path: Percorso del file immagine
+        :type path: str
+        :param size: Coppia (larghezza, altezza), se None l'immagine viene usata nella dimensione originale
+        :type size: tuple
+
+        :returns: Il PhotoImage condiviso
+        :rtype: ImageTk.PhotoImage"""
+
+        key = (path, size)
+        if key not in self._photos:
+            self._photos[key] = ImageTk.PhotoImage(self.get_image(path, size))
+        return self._photos[key]
+
+    def clear(self):
+        with self._lock:
+            self._decoded.clear()
+            self._photos.clear()
+
@@ -0,0 +1,325 @@
+from CourseFileSystem import CourseFileSystem
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import email.utils
+import http.server
+import socketserver
+import threading
+import io
+import os
+import re
+
+
+class AssetCache:
+    """La classe AssetCache tiene in memoria il contenuto dei file statici serviti dal server locale (js, css, font,
+    pagine dell'applicazione), così che vengano letti dal disco soltanto la prima volta o quando cambiano data di modifica o dimensione. I file
+    più grandi di max_file_size non vengono salvati e, superato max_size, vengono scartati quelli usati meno di
+    recente."""
+
+    DEFAULT_MAX_FILE_SIZE = 2 * 1024 * 1024
+    DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, max_file_size=DEFAULT_MAX_FILE_SIZE, max_size=DEFAULT_MAX_SIZE):
+        self._max_file_size = max_file_size
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, file_stat):
+        """Funzione che restituisce il contenuto di un file, leggendolo dal disco se non è in cache o è cambiato
+
+        :param path: Percorso del file
+        :type path: str
+        :param file_stat: Risultato di os.stat sul file, usato per capire se la copia in cache è ancora valida
+        :type file_stat: os.stat_result
+
+        :returns: Il contenuto del file oppure None se il file è troppo grande per la cache
+        :rtype: bytes"""
+
+        if file_stat.st_size > self._max_file_size:
+            return None
+
+        stamp = (file_stat.st_mtime_ns, file_stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                return entry[1]
+
+        with open(path, "rb") as file_object:
+            content = file_object.read()
+            # Salvo la firma del file effettivamente letto, che potrebbe essere cambiato dopo la chiamata a os.stat
+            read_stat = os.fstat(file_object.fileno())
+            stamp = (read_stat.st_mtime_ns, read_stat.st_size)
+
+        with self._lock:
+            old_entry = self._entries.pop(path, None)
+            if old_entry is not None:
+                self._size -= len(old_entry[1])
+            self._entries[path] = (stamp, content)
+            self._size += len(content)
+            while self._size > self._max_size:
+                _, (_, oldest_content) = self._entries.popitem(last=False)
+                self._size -= len(oldest_content)
+        return content
+
+
+class LocalHTTPServer(socketserver.TCPServer):
+    """Il server locale: le connessioni vengono gestite da un pool con un numero massimo di thread, invece che da un
+    thread nuovo per ogni connessione come in ThreadingTCPServer"""
+
+    DEFAULT_WORKERS = 16
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS):
+        super().__init__(server_address, handler_class)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="LocalHTTPServer")
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False)
+
+
+class LocalRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Il gestore delle richieste del server locale. Serve soltanto i file statici delle cartelle in STATIC_DIRECTORIES
+    (la cartella data, con utenti, permessi e tentativi dei quiz, non è raggiungibile e le cartelle non vengono mai
+    elencate) ed espone le lezioni e i loro media all'indirizzo /lessons/<corso>/<topic>/<elemento>[/media/<file>]. I file statici
+    piccoli vengono serviti dall'AssetCache; le lezioni, che il docente può modificare in qualsiasi momento, e i file
+    grandi vengono letti ogni volta dal disco e inviati con sendfile, quindi passano dal disco al socket senza essere
+    copiati in memoria, e le richieste con l'header Range ricevono soltanto la porzione richiesta. Le connessioni
+    restano aperte tra una richiesta e l'altra (HTTP/1.1) e ogni risposta contiene ETag e Last-Modified, così che il
+    browser possa rivalidare i file ricevendo un 304; i file con un'impronta nel nome (ad esempio
+    "script.3f2a9c1d.js") o con il parametro "v" vengono dichiarati immutabili. Se accanto a un file esiste una sua
+    variante compressa generata da AssetBuilder (.br o .gz) e il browser la accetta, viene inviata quella."""
+
+    LESSONS_PREFIX = "/lessons/"
+    STATIC_DIRECTORIES = frozenset(["css", "js", "font", "html", "dist", "media"])
+    LESSON_PATH_REGEX = re.compile(r'^/lessons/(c-\d+)/(t-\d+)/(e-\d+)(?:/media/([^/]+))?/?$')
+    RANGE_REGEX = re.compile(r'^bytes=(\d*)-(\d*)$')
+    VERSIONED_PATH_REGEX = re.compile(r'(\.[0-9a-f]{8,}\.\w+$)|([?&]v=[^&]+)')
+
+    IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+    REVALIDATE_CACHE_CONTROL = "no-cache"
+    # Varianti precompresse, in ordine di preferenza: (codifica, estensione del file)
+    PRECOMPRESSED_ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+    protocol_version = "HTTP/1.1"
+    # Header e contenuto vengono inviati separatamente: senza TCP_NODELAY la connessione persistente subirebbe il
+    # ritardo dell'algoritmo di Nagle a ogni risposta
+    disable_nagle_algorithm = True
+    # Le connessioni inattive vengono chiuse, così da non occupare a lungo un thread del pool
+    timeout = 15
+
+    asset_cache = AssetCache()
+
+    def translate_path(self, path):
+        """Funzione che traduce l'indirizzo richiesto nel percorso del file sul FileSystem, gestendo gli indirizzi
+        delle lezioni e lasciando tutti gli altri a SimpleHTTPRequestHandler
+
+        :returns: Il percorso del file, None se l'indirizzo è fuori dalle lezioni e dalle cartelle statiche
+        :rtype: str"""
+
+        lesson_match = self.LESSON_PATH_REGEX.match(path.split("?", 1)[0].split("#", 1)[0])
+        if lesson_match is None:
+            # SimpleHTTPRequestHandler scarta già i ".." dell'indirizzo, quindi basta controllare la prima cartella
+            translated_path = super().translate_path(path)
+            relative_path = os.path.relpath(translated_path, self.directory)
+            if relative_path.split(os.sep, 1)[0] not in self.STATIC_DIRECTORIES:
+                return None
+            return translated_path
+
+        course_id, topic_id, element_id, media_name = lesson_match.groups()
+        element_dir = os.path.join(CourseFileSystem.DEFAULT_COURSES_PATH, course_id, topic_id, element_id)
+        if media_name is None:
+            return os.path.join(element_dir, "index.html")
+        return os.path.join(element_dir, "media", media_name)
+
+    def guess_type(self, path):
+        content_type = super().guess_type(path)
+        # Le lezioni vengono salvate in utf-8
+        if content_type == "text/html":
+            return "text/html; charset=utf-8"
+        return content_type
+
+    def send_head(self):
+        """Funzione che invia gli header della risposta e restituisce il file da inviare. Gli indirizzi non permessi
+        e le cartelle ricevono un 404, le richieste condizionali un 304 se il file non è cambiato e quelle con Range
+        una risposta 206"""
+
+        self._byte_range = None
+        path = self.translate_path(self.path)
+        if path is None or os.path.isdir(path):
+            self.send_error(http.HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        content_type = self.guess_type(path)
+        content_encoding, path = self._select_variant(path)
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            self.send_error(http.HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        etag = '"{:x}-{:x}"'.format(file_stat.st_mtime_ns, file_stat.st_size)
+        if self._not_modified(etag, file_stat):
+            self.send_response(http.HTTPStatus.NOT_MODIFIED)
+            self._send_cache_headers(etag, file_stat)
+            self.end_headers()
+            return None
+
+        try:
+            content = None
+            if not self.path.startswith(self.LESSONS_PREFIX):
+                content = self.asset_cache.get(path, file_stat)
+            if content is not None:
+                file_object = io.BytesIO(content)
+                file_size = len(content)
+            else:
+                file_object = open(path, "rb")
+                file_size = os.fstat(file_object.fileno()).st_size
+        except OSError:
+            self.send_error(http.HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        # La dimensione è quella dei byte che verranno inviati: il file potrebbe essere cambiato dopo os.stat
+        range_header = self.headers.get("Range")
+        if range_header is None:
+            # Anche senza Range limito l'invio a file_size byte, nel caso in cui il file cresca nel frattempo
+            self._byte_range = (0, file_size)
+            self.send_response(http.HTTPStatus.OK)
+            self.send_header("Content-Length", str(file_size))
+        else:
+            byte_range = self._parse_range(range_header, file_size)
+            if byte_range is None:
+                file_object.close()
+                self.send_response(http.HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", "bytes */{}".format(file_size))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+
+            start, length = byte_range
+            self._byte_range = byte_range
+            self.send_response(http.HTTPStatus.PARTIAL_CONTENT)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, start + length - 1, file_size))
+            self.send_header("Content-Length", str(length))
+
+        self.send_header("Content-Type", content_type)
+        if content_encoding is not None:
+            self.send_header("Content-Encoding", content_encoding)
+        self._send_cache_headers(etag, file_stat)
+        self.end_headers()
+        return file_object
+
+    def list_directory(self, path):
+        # Il contenuto delle cartelle non viene mai mostrato
+        self.send_error(http.HTTPStatus.NOT_FOUND, "File not found")
+        return None
+
+    def _select_variant(self, path):
+        """Funzione che sceglie la variante precompressa di un file accettata dal browser. Le richieste con Range
+        ricevono sempre il file originale
+
+        :returns: Coppia (codifica oppure None, percorso del file da inviare)
+        :rtype: tuple"""
+
+        accept_encoding = self.headers.get("Accept-Encoding")
+        if accept_encoding is None or self.headers.get("Range") is not None:
+            return None, path
+
+        accepted = set()
+        for token in accept_encoding.split(","):
+            coding, _, parameters = token.strip().partition(";")
+            if parameters.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                accepted.add(coding.strip().lower())
+
+        for encoding, extension in self.PRECOMPRESSED_ENCODINGS:
+            if (encoding in accepted or "*" in accepted) and os.path.isfile(path + extension):
+                return encoding, path + extension
+        return None, path
+
+    def _not_modified(self, etag, file_stat):
+        """Funzione che indica se il browser ha già la versione attuale del file, in base agli header
+        If-None-Match o, in sua assenza, If-Modified-Since"""
+
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return if_none_match.strip() == "*" or etag in [i.strip() for i in if_none_match.split(",")]
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            return since is not None and int(file_stat.st_mtime) <= since.timestamp()
+        return False
+
+    def _send_cache_headers(self, etag, file_stat):
+        # La risposta dipende da Accept-Encoding quando esiste una variante precompressa
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(file_stat.st_mtime))
+        if self.VERSIONED_PATH_REGEX.search(self.path):
+            self.send_header("Cache-Control", self.IMMUTABLE_CACHE_CONTROL)
+        else:
+            self.send_header("Cache-Control", self.REVALIDATE_CACHE_CONTROL)
+
+    def end_headers(self):
+        self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def copyfile(self, source, outputfile):
+        """Funzione che invia il contenuto del file, dalla memoria se è nell'AssetCache e altrimenti con sendfile,
+        limitandosi alla porzione richiesta se presente"""
+
+        offset, count = self._byte_range or (0, None)
+        if isinstance(source, io.BytesIO):
+            content = source.getbuffer()
+            outputfile.write(content[offset:] if count is None else content[offset:offset + count])
+            return
+
+        outputfile.flush()
+        self.connection.sendfile(source, offset, count)
+
+    @classmethod
+    def _parse_range(cls, range_header, file_size):
+        """Funzione che interpreta un header Range con un singolo intervallo
+
+        :param range_header: Valore dell'header Range
+        :type range_header: str
+        :param file_size: Dimensione del file richiesto
+        :type file_size: int
+
+        :returns: Coppia (primo byte, numero di byte) oppure None se l'intervallo non è soddisfacibile
+        :rtype: tuple"""
+
+        range_match = cls.RANGE_REGEX.match(range_header.strip())
+        if range_match is None or range_match.groups() == ("", ""):
+            return None
+
+        first, last = range_match.groups()
+        if first == "":
+            # Intervallo "bytes=-N": gli ultimi N byte del file
+            length = min(int(last), file_size)
+            if length == 0:
+                return None
+            return file_size - length, length
+
+        start = int(first)
+        end = file_size - 1 if last == "" else min(int(last), file_size - 1)
+        if start >= file_size or end < start:
+            return None
+        return start, end - start + 1
@@ -1,8 +1,10 @@
 from tkinter import *
 from tkinter import ttk
-from PIL import Image, ImageTk
+from concurrent.futures import ThreadPoolExecutor
+import logging
 
 from UserManager import UserManager
+from ImageCache import ImageCache
 from Error import Error
 
 
@@ -14,6 +16,8 @@ class LoginApplication(Tk):
     visualizzare qui. I vari frame rappresenterebbero finalmente la View vera e propria."""
 
     LARGE_FONT = ("Verdana", 12)
+    LOGO_PATH = "media/logo.jpg"
+    BACKGROUND_POLL_MS = 20
 
     def __init__(self, *args, **kwargs):
 
@@ -28,6 +32,12 @@ class LoginApplication(Tk):
         Tk.__init__(self, *args, **kwargs)
 
         self.controller = UserManager()
+        # Le immagini vengono decodificate una sola volta e condivise da tutte le pagine
+        self.images = ImageCache()
+
+        # Le operazioni sul database utenti vengono eseguite in questo thread, per non bloccare il main loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LoginApplication")
+        self._running = set()
 
         self.title("Login")
         self.resizable(False, False)
@@ -57,6 +67,52 @@ class LoginApplication(Tk):
         page = self.frames[page]
         page.pack(side="top", fill="both", expand=True)
 
+    def run_in_background(self, key, function, callback, *args):
+        """Questa funzione esegue una funzione lenta (ad esempio un login o una registrazione) in un thread separato,
+        mostrando il cursore di attesa finché non termina, e passa poi il risultato a callback nel main loop di
+        tkinter, tramite after. Se la funzione solleva un'eccezione, callback riceve un Error, così che la pagina
+        possa riabilitare i suoi pulsanti e mostrare il messaggio. Se un'operazione con la stessa chiave è già in corso, ad esempio per un doppio click,
+        la nuova richiesta viene ignorata
+
+        :param key: La chiave che identifica l'operazione
+        :type key: str
+        :param function: La funzione da eseguire in background
+        :type function: function
+        :param callback: La funzione, invocata nel main loop, che riceve il risultato
+        :type callback: function
+        :param args: Parametri da passare alla funzione
+        :type args: list
+
+        :returns: False se l'operazione era già in corso
+        :rtype: bool"""
+
+        if key in self._running:
+            return False
+
+        self._running.add(key)
+        self.config(cursor="watch")
+        future = self._executor.submit(function, *args)
+        self.after(LoginApplication.BACKGROUND_POLL_MS, self._check_background, key, future, callback)
+        return True
+
+    def is_running(self, key):
+        return key in self._running
+
+    def _check_background(self, key, future, callback):
+        if not future.done():
+            self.after(LoginApplication.BACKGROUND_POLL_MS, self._check_background, key, future, callback)
+            return
+
+        self._running.discard(key)
+        if not self._running:
+            self.config(cursor="")
+        try:
+            result = future.result()
+        except Exception:
+            logging.getLogger(__name__).exception("Operazione in background \"%s\" non riuscita", key)
+            result = Error("background", "Something went wrong, please try again")
+        callback(result)
+
     def get_frame(self, page):
         """Una funzione che permette di prendere l'istanza corrente della pagina presa come parametro
         :param page: L'istanza del frame scelto
@@ -118,8 +174,7 @@ class LoginPage(Frame):
 
         image_size = 120
 
-        pil_image = Image.open("media/logo.jpg").resize((image_size, image_size))
-        self.img = ImageTk.PhotoImage(pil_image)
+        self.img = view_controller.images.get_photo(LoginApplication.LOGO_PATH, (image_size, image_size))
         lbimg = ttk.Label(self, image=self.img)
         lbimg.grid(row=2, column=1, rowspan=3)
 
@@ -132,8 +187,8 @@ class LoginPage(Frame):
         self.e2 = FormEntry(self, text="Password", show="*")
         self.e2.grid(row=3, column=2, padx=10, sticky=EW, columnspan=2)
 
-        btn1 = ttk.Button(self, text="Log-in", command=lambda: self.login())
-        btn1.grid(row=4, column=2, padx=10)
+        self.btn1 = ttk.Button(self, text="Log-in", command=lambda: self.login())
+        self.btn1.grid(row=4, column=2, padx=10)
 
         btn2 = ttk.Button(self, text="Register", command=lambda: view_controller.show_frame(RegisterPage))
         btn2.grid(row=4, column=3, padx=10)
@@ -145,7 +200,15 @@ class LoginPage(Frame):
         nell'UserManager servono per capire cos'è andato storto, e dirlo all'utente in modo che possia correggere i suoi
         imput"""
 
-        user_id = self._view_controller.controller.check_login(self.e1.get().lower(), self.e2.get())
+        # La verifica della password è lenta di proposito, quindi viene eseguita in background
+        if self._view_controller.run_in_background("login", self._view_controller.controller.check_login,
+                                                   self._login_done, self.e1.get().lower(), self.e2.get()):
+            self.btn1.config(state="disabled")
+            self.lb3['text'] = "Logging in..."
+
+    def _login_done(self, user_id):
+        self.btn1.config(state=NORMAL)
+        self.lb3['text'] = ""
         if isinstance(user_id, str):
             self._view_controller.add_frame(LoginSuccessPage, self._view_controller, user_id)
             self._view_controller.show_frame(LoginSuccessPage)
@@ -174,8 +237,7 @@ class RegisterPage(Frame):
 
         self._view_controller = view_controller
 
-        pil_image = Image.open("media/logo.jpg").resize((image_width, image_height))
-        self.img = ImageTk.PhotoImage(pil_image)
+        self.img = view_controller.images.get_photo(LoginApplication.LOGO_PATH, (image_width, image_height))
         lbimg = ttk.Label(self, image=self.img, anchor="c")
         lbimg.grid(row=1, column=1, columnspan=2, sticky=EW)
 
@@ -218,8 +280,8 @@ class RegisterPage(Frame):
         self.e5 = FormEntry(self, "Birthdate", self.lb5)
         self.e5.grid(row=11, column=1, columnspan=2, sticky=EW, padx=5, pady=7)
 
-        btn1 = ttk.Button(self, text="Registrati!", command= self.register_user)
-        btn1.grid(row=13, column=1, padx=10, pady=10)
+        self.btn1 = ttk.Button(self, text="Registrati!", command= self.register_user)
+        self.btn1.grid(row=13, column=1, padx=10, pady=10)
 
         btn2 = ttk.Button(self, text="Torna alla Home", command=lambda: view_controller.show_frame(LoginPage))
         btn2.grid(row=13, column=2, padx=10, pady=10)
@@ -235,10 +297,24 @@ class RegisterPage(Frame):
         i campi in caso l'utente voglia registrare un'altro account. Altrimenti, grazie alle stringhe fornite dalla
         funzione add_user, si comunica all'utente che cosa ha sbagliato."""
 
-        status = self._view_controller.controller.add_user(self.cb1.get(), self.e1.get(), self.e2.get(), self.e3.get(),
-                                                           self.e4.get().lower(), self.e5.get())
-        if not status:
+        if self._view_controller.run_in_background("register", self._add_user, self._register_done, self.cb1.get(),
+                                                   self.e1.get(), self.e2.get(), self.e3.get(), self.e4.get().lower(),
+                                                   self.e5.get()):
+            self.btn1.config(state="disabled")
+            self.lb6['text'] = "Registering..."
+
+    def _add_user(self, *args):
+        # Eseguita in background: l'hash della password e la scrittura del database sono le parti lente
+        status = self._view_controller.controller.add_user(*args)
+        if status is None:
             self._view_controller.controller.update_file()
+        return status
+
+    def _register_done(self, status):
+        self.btn1.config(state=NORMAL)
+        self.lb6['text'] = ""
+        # Anche un Error è falso, quindi la registrazione è riuscita soltanto se add_user non ha restituito nulla
+        if status is None:
             self._view_controller.show_frame(LoginPage)
             self._view_controller.get_frame(LoginPage).lb3['text'] = "Registration Successful! You can now log-in"
 
@@ -280,8 +356,7 @@ class LoginSuccessPage(Frame):
         self._user = view_controller.controller.get_userdata(id, name=True, surname=True)
         image_size = 120
 
-        pil_image = Image.open("media/logo.jpg").resize((image_size, image_size))
-        self.img = ImageTk.PhotoImage(pil_image)
+        self.img = view_controller.images.get_photo(LoginApplication.LOGO_PATH, (image_size, image_size))
 
         lbimg = ttk.Label(self, image=self.img)
         lbimg.grid(row=1, column=1, rowspan=3)
@@ -329,8 +404,7 @@ class EditSettingsPage(Toplevel):
 
         image_size = 120
 
-        pil_image = Image.open("media/logo.jpg").resize((image_size, image_size))
-        self.img = ImageTk.PhotoImage(pil_image)
+        self.img = view_controller.images.get_photo(LoginApplication.LOGO_PATH, (image_size, image_size))
         lbimg = ttk.Label(self, image=self.img, anchor="c")
         lbimg.grid(row=1, column=1, columnspan=3, sticky=EW)
 
@@ -398,10 +472,26 @@ class EditSettingsPage(Toplevel):
         :param kwargs: Gli attributi dell'utente da modificare, a cui viene associato un valore
         :type kwargs: dict"""
 
+        if self._view_controller.run_in_background("modify_user", self._modify_user, self._modify_done, id, kwargs):
+            self.lb4['text'] = "Applying changes..."
+
+    def _modify_user(self, id, kwargs):
+        # Eseguita in background: restituisce l'esito della modifica e i dati aggiornati dell'utente
         status = self._view_controller.controller.modify_user(id, **kwargs)
-        if not status:
+        return status, self._view_controller.controller.get_userdata(id, email=True, type=True)
+
+    def _modify_done(self, result):
+        if not self.winfo_exists():
+            return
+        if isinstance(result, Error):
+            self.lb4['text'] = result.get_message()
+            return
+
+        status, self.user = result
+        if status is None:
             self.lb4['text'] = "Changes have been successfully applied"
-            self.refresh_userdata(id)
+            self.lb1['text'] = "Type: {}".format(self.user["type"])
+            self.lb2['text'] = "Email: {}".format(self.user["email"])
         elif isinstance(status, Error):
             self.lb4['text'] = status.get_message()
 
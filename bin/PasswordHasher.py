@@ -0,0 +1,174 @@
+import hashlib
+import base64
+import hmac
+import time
+import sys
+import os
+
+
+class PasswordHasher:
+    """La classe PasswordHasher calcola e verifica gli hash delle password con una funzione di derivazione lenta
+    (scrypt, oppure PBKDF2-SHA256 se la versione di OpenSSL non offre scrypt). Ogni hash contiene algoritmo,
+    parametri di costo e sale, nel formato "scrypt$n$r$p$sale$hash" oppure "pbkdf2_sha256$iterazioni$sale$hash":
+    in questo modo i parametri possono essere cambiati in qualsiasi momento e gli hash vecchi restano verificabili,
+    venendo ricalcolati con i parametri nuovi al primo login riuscito (si veda needs_rehash). Le password salvate in
+    chiaro dalle versioni precedenti vengono riconosciute e trattate allo stesso modo."""
+
+    SCRYPT = "scrypt"
+    PBKDF2 = "pbkdf2_sha256"
+
+    DEFAULT_SCRYPT_N = 2 ** 14
+    DEFAULT_SCRYPT_R = 8
+    DEFAULT_SCRYPT_P = 1
+    DEFAULT_PBKDF2_ITERATIONS = 260000
+    SALT_SIZE = 16
+    HASH_SIZE = 32
+
+    def __init__(self, algorithm=None, scrypt_n=DEFAULT_SCRYPT_N, scrypt_r=DEFAULT_SCRYPT_R,
+                 scrypt_p=DEFAULT_SCRYPT_P, pbkdf2_iterations=DEFAULT_PBKDF2_ITERATIONS):
+        """L'init di questa classe salva i parametri con cui vengono calcolati i nuovi hash
+
+        :param algorithm: PasswordHasher.SCRYPT o PasswordHasher.PBKDF2, di default scrypt se disponibile
+        :type algorithm: str
+        :param scrypt_n: Fattore di costo di scrypt, una potenza di 2
+        :type scrypt_n: int
+        :param scrypt_r: Dimensione del blocco di scrypt
+        :type scrypt_r: int
+        :param scrypt_p: Fattore di parallelismo di scrypt
+        :type scrypt_p: int
+        :param pbkdf2_iterations: Numero di iterazioni di PBKDF2
+        :type pbkdf2_iterations: int"""
+
+        if algorithm is None:
+            algorithm = PasswordHasher.SCRYPT if hasattr(hashlib, "scrypt") else PasswordHasher.PBKDF2
+        self.algorithm = algorithm
+
+        if algorithm == PasswordHasher.SCRYPT:
+            self._parameters = (scrypt_n, scrypt_r, scrypt_p)
+        else:
+            self._parameters = (pbkdf2_iterations,)
+
+    def hash(self, password):
+        """Funzione che calcola l'hash di una password con un sale casuale e i parametri attuali
+
+        :param password: La password in chiaro
+        :type password: str
+
+        :returns: L'hash, con algoritmo, parametri e sale
+        :rtype: str"""
+
+        salt = os.urandom(PasswordHasher.SALT_SIZE)
+        derived = self._derive(self.algorithm, self._parameters, password, salt)
+        return "$".join([self.algorithm] + [str(i) for i in self._parameters] + [self._encode(salt),
+                                                                                 self._encode(derived)])
+
+    def verify(self, password, stored):
+        """Funzione che verifica una password, confrontandola con l'hash salvato oppure, per gli utenti registrati
+        prima dell'introduzione degli hash, con la password salvata in chiaro
+
+        :param password: La password in chiaro inserita dall'utente
+        :type password: str
+        :param stored: Il valore salvato per l'utente
+        :type stored: str
+
+        :returns: True se la password è corretta
+        :rtype: bool"""
+
+        parsed = self._parse(stored)
+        if parsed is None:
+            return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+
+        algorithm, parameters, salt, expected = parsed
+        return hmac.compare_digest(self._derive(algorithm, parameters, password, salt, len(expected)), expected)
+
+    def needs_rehash(self, stored):
+        """Funzione che indica se il valore salvato va ricalcolato, perché in chiaro oppure calcolato con algoritmo o
+        parametri diversi da quelli attuali
+
+        :param stored: Il valore salvato per l'utente
+        :type stored: str
+
+        :returns: True se l'hash va ricalcolato
+        :rtype: bool"""
+
+        parsed = self._parse(stored)
+        return parsed is None or parsed[0] != self.algorithm or parsed[1] != self._parameters
+
+    def is_hashed(self, stored):
+        return self._parse(stored) is not None
+
+    @staticmethod
+    def _derive(algorithm, parameters, password, salt, size=HASH_SIZE):
+        if algorithm == PasswordHasher.SCRYPT:
+            n, r, p = parameters
+            # La memoria usata da scrypt è 128 * n * r * p byte: il limite di default di OpenSSL è più basso
+            return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                                  maxmem=256 * n * r * p, dklen=size)
+        return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, parameters[0], size)
+
+    @staticmethod
+    def _parse(stored):
+        """Funzione che scompone un hash salvato, restituendo None se il valore non è un hash (password in chiaro)"""
+
+        if stored is None:
+            return None
+
+        fields = stored.split("$")
+        try:
+            if fields[0] == PasswordHasher.SCRYPT and len(fields) == 6:
+                parameters = tuple(int(i) for i in fields[1:4])
+            elif fields[0] == PasswordHasher.PBKDF2 and len(fields) == 4:
+                parameters = (int(fields[1]),)
+            else:
+                return None
+            return fields[0], parameters, PasswordHasher._decode(fields[-2]), PasswordHasher._decode(fields[-1])
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _encode(data):
+        return base64.b64encode(data).decode("ascii")
+
+    @staticmethod
+    def _decode(text):
+        return base64.b64decode(text.encode("ascii"), validate=True)
+
+
+def main():
+    """Uso: python PasswordHasher.py [tempo obiettivo in ms], di default 250. Misura su questa macchina il tempo di
+    scrypt e di PBKDF2 al variare del costo e suggerisce i parametri più alti che restano entro l'obiettivo"""
+
+    target_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 250
+    password, salt = "Password1@", os.urandom(PasswordHasher.SALT_SIZE)
+
+    def measure(algorithm, parameters):
+        start = time.perf_counter()
+        PasswordHasher._derive(algorithm, parameters, password, salt)
+        return (time.perf_counter() - start) * 1000
+
+    if hasattr(hashlib, "scrypt"):
+        print("scrypt (r={}, p={})".format(PasswordHasher.DEFAULT_SCRYPT_R, PasswordHasher.DEFAULT_SCRYPT_P))
+        best = None
+        for exponent in range(12, 21):
+            n = 2 ** exponent
+            elapsed = measure(PasswordHasher.SCRYPT, (n, PasswordHasher.DEFAULT_SCRYPT_R,
+                                                      PasswordHasher.DEFAULT_SCRYPT_P))
+            print("  n=2^{:<3} {:>9.1f} ms {:>6} MB".format(
+                exponent, elapsed, 128 * n * PasswordHasher.DEFAULT_SCRYPT_R // 2 ** 20))
+            if elapsed > target_ms:
+                break
+            best = n
+        print("  consigliato: scrypt_n={}".format(best))
+
+    print("pbkdf2_sha256")
+    iterations = 50000
+    elapsed = measure(PasswordHasher.PBKDF2, (iterations,))
+    print("  {:>8} iterazioni {:>9.1f} ms".format(iterations, elapsed))
+    # Il tempo di PBKDF2 è lineare nel numero di iterazioni
+    suggested = int(iterations * target_ms / elapsed) // 10000 * 10000
+    print("  consigliato: pbkdf2_iterations={} (verifica: {:.1f} ms)".format(
+        suggested, measure(PasswordHasher.PBKDF2, (max(suggested, 1),))))
+
+
+if __name__ == "__main__":
+    main()
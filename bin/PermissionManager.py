@@ -16,8 +16,20 @@ class PermissionManager:
     FULL_PATH = os.path.join(DEFAULT_DATA_DIRECTORY, DEFAULT_FILE_NAME)
 
     def __init__(self):
+        """L'init di questa classe controlla che il file acl esista e lo carica in memoria. Le letture vengono poi
+        servite dalla copia in memoria, che viene ricaricata soltanto se la data di modifica o la dimensione del file
+        cambiano, così da accorgersi anche delle modifiche fatte dall'esterno"""
+
         self.check_files()
 
+        self._acl_dict = None
+        self._acl_stamp = None
+        self._version = 0
+
+        # Indice inverso utente -> {corso: permesso} e corsi accessibili a tutti, corso -> permesso
+        self._user_courses = {}
+        self._everyone_courses = {}
+
     @staticmethod
     def check_files(overwrite=False):
         if os.path.isdir(PermissionManager.DEFAULT_DATA_DIRECTORY):
@@ -34,6 +46,61 @@ class PermissionManager:
                 file.write(json.dumps(
                     PermissionManager.DEFAULT_ACL_JSON, indent=4))
 
+    def get_version(self):
+        """Funzione che restituisce un contatore incrementato ad ogni modifica o ricaricamento dell'acl
+
+        :returns: Versione dell'acl in memoria
+        :rtype: int"""
+
+        self._get_acl_data()
+        return self._version
+
+    def _get_acl_data(self):
+        """Funzione che restituisce l'acl in memoria, ricaricandola dal file se questo è stato modificato
+
+        :returns: Contenuto del file acl
+        :rtype: dict"""
+
+        stamp = self._file_stamp()
+        if self._acl_dict is None or stamp != self._acl_stamp:
+            self._acl_dict = self._read_acl_data()
+            self._acl_stamp = stamp
+            self._version += 1
+            self._build_index()
+        return self._acl_dict
+
+    def _build_index(self):
+        """Funzione che ricostruisce da zero l'indice inverso dei permessi a partire dall'acl in memoria"""
+
+        self._user_courses = {}
+        self._everyone_courses = {}
+        for course_id, course_acl in self._acl_dict["courses"].items():
+            for key, mode in course_acl.items():
+                if key == "everyone":
+                    if mode:
+                        self._everyone_courses[course_id] = mode
+                else:
+                    self._user_courses.setdefault(key, {})[course_id] = mode
+
+    def _unindex_user_course(self, user_id, course_id):
+        user_courses = self._user_courses.get(user_id)
+        if user_courses is not None:
+            user_courses.pop(course_id, None)
+            if not user_courses:
+                del self._user_courses[user_id]
+
+    def _save_acl_data(self):
+        """Funzione che scrive su file l'acl in memoria e ne aggiorna la firma, così da non ricaricarla inutilmente"""
+
+        self._write_acl_data(self._acl_dict)
+        self._acl_stamp = self._file_stamp()
+        self._version += 1
+
+    @staticmethod
+    def _file_stamp():
+        file_stat = os.stat(PermissionManager.FULL_PATH)
+        return file_stat.st_mtime_ns, file_stat.st_size
+
     @staticmethod
     def _read_acl_data():
 
@@ -54,29 +121,33 @@ class PermissionManager:
         if not re.match(r'^c-\d+$', course_id):
             return False
 
-        acl_dict = self._read_acl_data()
+        acl_dict = self._get_acl_data()
         if course_id not in acl_dict["courses"]:
             acl_dict["courses"][course_id] = {"everyone": False}
-            self._write_acl_data(acl_dict)
+            self._save_acl_data()
 
     def remove_course(self, course_id):
 
         if not re.match(r'^c-\d+$', course_id):
             return False
 
-        acl_dict = self._read_acl_data()
+        acl_dict = self._get_acl_data()
         if course_id in acl_dict["courses"]:
+            for key in acl_dict["courses"][course_id]:
+                self._unindex_user_course(key, course_id)
+            self._everyone_courses.pop(course_id, None)
             del acl_dict["courses"][course_id]
-            self._write_acl_data(acl_dict)
+            self._save_acl_data()
 
     def add_permission(self, user_id, course_id, mode):
 
         if not (re.match(r'^u-\d+$', user_id) and re.match(r'^c-\d+$', course_id) and re.match(r'^(r|rw)$', mode)):
             return False
 
-        acl_dict = self._read_acl_data()
+        acl_dict = self._get_acl_data()
         acl_dict["courses"][course_id][user_id] = mode
-        self._write_acl_data(acl_dict)
+        self._user_courses.setdefault(user_id, {})[course_id] = mode
+        self._save_acl_data()
         return True
 
     def remove_permission(self, user_id, course_id):
@@ -84,26 +155,31 @@ class PermissionManager:
         if not (re.match(r'^u-\d+$', user_id) and re.match(r'^c-\d+$', course_id)):
             return False
 
-        acl_dict = self._read_acl_data()
+        acl_dict = self._get_acl_data()
         if user_id in acl_dict["courses"][course_id]:
             del acl_dict["courses"][course_id][user_id]
+            self._unindex_user_course(user_id, course_id)
         else:
             return False
 
-        self._write_acl_data(acl_dict)
+        self._save_acl_data()
         return True
 
     def set_everyone(self, course_id, mode):
 
         if not re.match(r'^c-\d+$', course_id) and re.match(r'^(r|rw)$', mode) or mode == False:
             return False
-        acl_dict = self._read_acl_data()
+        acl_dict = self._get_acl_data()
         acl_dict["courses"][course_id]["everyone"] = mode
-        self._write_acl_data(acl_dict)
+        if mode:
+            self._everyone_courses[course_id] = mode
+        else:
+            self._everyone_courses.pop(course_id, None)
+        self._save_acl_data()
 
     def get_user_permission(self, user_id, course_id):
 
-        acl_dict = self._read_acl_data()
+        acl_dict = self._get_acl_data()
         if course_id in acl_dict["courses"] and user_id in acl_dict["courses"][course_id]:
             return acl_dict["courses"][course_id][user_id]
         elif acl_dict["courses"][course_id]["everyone"]:
@@ -113,11 +189,13 @@ class PermissionManager:
 
     def get_user_permissions(self, user_id):
 
-        acl_dict = self._read_acl_data()
+        # Grazie all'indice inverso il costo dipende solo dal numero di corsi restituiti
+        self._get_acl_data()
         permissions = {"r": [], "rw": []}
-        for key, value in acl_dict["courses"].items():
-            if value["everyone"]:
-                permissions[value["everyone"]].append(key)
-            elif user_id in value:
-                permissions[value[user_id]].append(key)
+        for course_id, mode in self._everyone_courses.items():
+            permissions[mode].append(course_id)
+        for course_id, mode in self._user_courses.get(user_id, {}).items():
+            # Il permesso "everyone" ha la precedenza su quello del singolo utente
+            if course_id not in self._everyone_courses:
+                permissions[mode].append(course_id)
         return permissions
@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+import threading
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # Su Windows fcntl non esiste: in quel caso i quiz vengono protetti soltanto all'interno del processo
+    fcntl = None
+
+
+class _QuizLockState:
+    """Lo stato del lock di un singolo quiz: il lock dei thread del processo e il file bloccato per gli altri
+    processi, aperto soltanto mentre il lock è tenuto"""
+
+    def __init__(self):
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file_object = None
+
+
+class QuizLock:
+    """La classe QuizLock serializza le scritture sui file di un quiz. Ogni quiz ha un RLock condiviso dai thread
+    del processo (il bridge di pywebview e il server locale ne usano più di uno) e, dove fcntl è disponibile, un lock
+    consultivo sul file ".lock" nella cartella del quiz, che protegge il quiz anche da altri processi. Il lock è
+    rientrante: lo stesso thread può acquisirlo più volte senza bloccarsi."""
+
+    DEFAULT_LOCK_FILENAME = ".lock"
+
+    _states = {}
+    _states_lock = threading.Lock()
+
+    @classmethod
+    @contextmanager
+    def acquire(cls, quiz_dir):
+        """Funzione che acquisisce il lock di un quiz per la durata del blocco with
+
+        :param quiz_dir: Cartella dell'elemento quiz
+        :type quiz_dir: str"""
+
+        state = cls._get_state(quiz_dir)
+        with state.thread_lock:
+            if state.depth == 0 and fcntl is not None:
+                state.file_object = open(os.path.join(quiz_dir, QuizLock.DEFAULT_LOCK_FILENAME), "a")
+                fcntl.flock(state.file_object.fileno(), fcntl.LOCK_EX)
+            state.depth += 1
+            try:
+                yield
+            finally:
+                state.depth -= 1
+                if state.depth == 0 and state.file_object is not None:
+                    fcntl.flock(state.file_object.fileno(), fcntl.LOCK_UN)
+                    state.file_object.close()
+                    state.file_object = None
+
+    @classmethod
+    def _get_state(cls, quiz_dir):
+        key = os.path.abspath(quiz_dir)
+        with cls._states_lock:
+            if key not in cls._states:
+                cls._states[key] = _QuizLockState()
+            return cls._states[key]
@@ -1,5 +1,7 @@
 from datetime import datetime
+from QuizLock import QuizLock
 from Error import Error
+import threading
 import json
 import os
 import re
@@ -7,13 +9,26 @@ import re
 
 class QuizManager:
 
-    def __init__(self, quiz_dict):
+    # Chiavi di correzione già compilate: percorso del quiz -> (firma del file, chiave)
+    _answer_keys = {}
+    _answer_keys_lock = threading.Lock()
+
+    def __init__(self, quiz_dict, attempt_store=None, quiz_version=None, quiz_stats=None):
         self.quiz_dict = quiz_dict
+        # I tentativi vengono salvati nell'AttemptStore del quiz, oppure nel dizionario se non viene fornito
+        self.attempt_store = attempt_store
+        # Coppia (percorso, firma del file) restituita da CourseFileSystem.get_quiz_version: se presente, la chiave
+        # di correzione viene condivisa tra tutte le istanze che correggono la stessa versione del quiz
+        self.quiz_version = quiz_version
+        # Le statistiche aggregate del quiz, aggiornate a ogni tentativo salvato nell'AttemptStore
+        self.quiz_stats = quiz_stats
+        self._answer_key = None
 
     def get_quiz_dict(self):
         return self.quiz_dict
 
     def get_new_question_id(self):
+        self._questions_changed()
         new_id = self.quiz_dict["count"]
         self.quiz_dict["count"] += 1
 
@@ -50,46 +65,99 @@ class QuizManager:
             return Error("Question ID not found")
 
         del self.quiz_dict["questions"][question_id]
+        self._questions_changed()
         return True
 
     def evaluate_answers(self, user_id, answers):
+        answer_key = self.get_answer_key()
         scores = {}
         for key, value in answers.items():
-            question_type = self.quiz_dict["questions"][key]["type"]
+            question_type, correct, wrong, correct_count = answer_key[key]
 
             if question_type == "checkbox":
-                wrong_answers = [
-                    i for i in value if i in self.quiz_dict["questions"][key]["wrong_answers"]]
-                correct_answers = [
-                    i for i in value if i in self.quiz_dict["questions"][key]["correct_answers"]]
-                points = len(correct_answers) - len(wrong_answers)
-                if points >= 0:
-                    scores[key] = points / \
-                        len(self.quiz_dict["questions"]
-                            [key]["correct_answers"])
-                else:
+                points = sum(1 for i in value if i in correct) - sum(1 for i in value if i in wrong)
+                if points < 0:
                     scores[key] = 0
-            elif question_type == "radio":
-                if value == self.quiz_dict["questions"][key]["correct_answer"]:
+                elif not correct_count:
+                    # Senza opzioni corrette la risposta giusta è non sceglierne nessuna errata
                     scores[key] = 1
                 else:
-                    scores[key] = 0
+                    scores[key] = points / correct_count
+            elif question_type == "radio":
+                scores[key] = 1 if value == correct else 0
             elif question_type == "open":
-                if value in self.quiz_dict["questions"][key]["correct_answers"]:
-                    scores[key] = 1
-                else:
-                    scores[key] = 0
+                scores[key] = 1 if self.normalize_open_answer(value) in correct else 0
         return scores
 
+    def get_answer_key(self):
+        """Funzione che restituisce la chiave di correzione del quiz, compilandola soltanto se la versione del quiz
+        non è già stata compilata. Per ogni domanda la chiave contiene la tupla (tipo, risposte corrette, risposte
+        errate, numero di risposte corrette): per le checkbox le risposte sono insiemi, per le domande aperte un
+        insieme di risposte normalizzate e per le radio la sola risposta corretta"""
+
+        if self._answer_key is not None:
+            return self._answer_key
+
+        if self.quiz_version is None:
+            self._answer_key = self.compile_answer_key(self.quiz_dict)
+            return self._answer_key
+
+        quiz_path, stamp = self.quiz_version
+        with QuizManager._answer_keys_lock:
+            cached_key = QuizManager._answer_keys.get(quiz_path)
+        if cached_key is not None and cached_key[0] == stamp:
+            self._answer_key = cached_key[1]
+        else:
+            self._answer_key = self.compile_answer_key(self.quiz_dict)
+            with QuizManager._answer_keys_lock:
+                QuizManager._answer_keys[quiz_path] = (stamp, self._answer_key)
+        return self._answer_key
+
+    @staticmethod
+    def compile_answer_key(quiz_dict):
+        answer_key = {}
+        for question_id, question in quiz_dict["questions"].items():
+            question_type = question["type"]
+            if question_type == "checkbox":
+                answer_key[question_id] = (question_type, frozenset(question["correct_answers"]),
+                                           frozenset(question["wrong_answers"]), len(question["correct_answers"]))
+            elif question_type == "radio":
+                answer_key[question_id] = (question_type, question["correct_answer"], None, 1)
+            elif question_type == "open":
+                correct = frozenset(QuizManager.normalize_open_answer(i) for i in question["correct_answers"])
+                answer_key[question_id] = (question_type, correct, None, len(correct))
+        return answer_key
+
+    @staticmethod
+    def normalize_open_answer(answer):
+        # Le risposte aperte vengono confrontate senza spazi iniziali e finali e senza distinguere le maiuscole
+        if isinstance(answer, str):
+            return answer.strip().casefold()
+        return answer
+
+    def _questions_changed(self):
+        # Il quiz è stato modificato: la chiave compilata e la versione su disco non sono più valide
+        self._answer_key = None
+        self.quiz_version = None
+
     def add_attempt(self, user_id, answers, scores):
-        if user_id not in self.quiz_dict["stats"]:
-            self.quiz_dict["stats"][user_id] = []
         mark = sum(scores.values())/len(scores) * 10
-        self.quiz_dict["stats"][user_id].append({"date": datetime.now(
-        ).isoformat(), "mark": mark, "answers": answers, "scores": scores})
+        attempt = {"date": datetime.now().isoformat(), "mark": mark, "answers": answers, "scores": scores}
+        if self.attempt_store is not None:
+            # Tentativo e statistiche vengono salvati insieme, così che le statistiche non restino indietro
+            with QuizLock.acquire(self.attempt_store.get_quiz_dir()):
+                self.attempt_store.append(user_id, attempt)
+                if self.quiz_stats is not None:
+                    self.quiz_stats.add_attempt(attempt, self.attempt_store.get_log_stamp())
+            return
+        if user_id not in self.quiz_dict.setdefault("stats", {}):
+            self.quiz_dict["stats"][user_id] = []
+        self.quiz_dict["stats"][user_id].append(attempt)
 
     def get_user_attempts(self, user_id):
-        if user_id in self.quiz_dict["stats"]:
+        if self.attempt_store is not None:
+            return self.attempt_store.get_user_attempts(user_id)
+        if user_id in self.quiz_dict.get("stats", {}):
             return self.quiz_dict["stats"][user_id]
         else:
             return None
@@ -0,0 +1,179 @@
+from QuizLock import QuizLock
+import threading
+import math
+import json
+import os
+
+
+class QuizStats:
+    """La classe QuizStats mantiene le statistiche aggregate di un quiz nel file "stats.json", accanto all'archivio
+    dei tentativi. Per il quiz e per ogni domanda vengono salvati numero di tentativi, somma e somma dei quadrati dei
+    punteggi, oltre a un istogramma dei voti: ogni nuovo tentativo aggiorna questi valori, quindi media, deviazione
+    standard e difficoltà si calcolano senza rileggere i tentativi. Insieme ai valori viene salvata la firma del
+    file dei tentativi a cui corrispondono (AttemptStore.get_log_stamp), così che per capire se le statistiche sono
+    aggiornate basti confrontarla con quella attuale. Le istanze vanno ottenute con QuizStats.open."""
+
+    DEFAULT_STATS_FILENAME = "stats.json"
+    HISTOGRAM_BUCKETS = 11
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, quiz_dir):
+        """L'init di questa classe prepara statistiche vuote, che vengono lette dal file alla prima richiesta
+
+        :param quiz_dir: Cartella dell'elemento quiz
+        :type quiz_dir: str"""
+
+        self._quiz_dir = quiz_dir
+        self._path = os.path.join(quiz_dir, QuizStats.DEFAULT_STATS_FILENAME)
+        self._lock = threading.RLock()
+        self._stats = self._empty_stats()
+        self._stamp = None
+
+    @classmethod
+    def open(cls, quiz_dir):
+        """Funzione che restituisce l'istanza condivisa delle statistiche di un quiz
+
+        :param quiz_dir: Cartella dell'elemento quiz
+        :type quiz_dir: str
+
+        :returns: Le statistiche del quiz
+        :rtype: QuizStats"""
+
+        key = os.path.abspath(quiz_dir)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(quiz_dir)
+            return cls._instances[key]
+
+    def add_attempt(self, attempt, log_stamp):
+        """Funzione che aggiunge un tentativo alle statistiche e le salva
+
+        :param attempt: Il tentativo, con voto e punteggi per domanda
+        :type attempt: dict
+        :param log_stamp: Firma del file dei tentativi dopo l'aggiunta del tentativo
+        :type log_stamp: list"""
+
+        with QuizLock.acquire(self._quiz_dir), self._lock:
+            self._reload()
+            self._add(self._stats, attempt)
+            self._stats["log_stamp"] = log_stamp
+            self._save()
+
+    def rebuild(self, attempts, log_stamp):
+        """Funzione che ricalcola da zero le statistiche, ad esempio dopo una ricorrezione dei tentativi
+
+        :param attempts: Coppie (id utente, tentativo), come quelle restituite da AttemptStore.iter_attempts
+        :type attempts: iterable
+        :param log_stamp: Firma del file da cui vengono letti i tentativi, presa tenendo il lock del quiz
+        :type log_stamp: list"""
+
+        stats = self._empty_stats()
+        for _, attempt in attempts:
+            self._add(stats, attempt)
+        stats["log_stamp"] = log_stamp
+
+        with QuizLock.acquire(self._quiz_dir), self._lock:
+            self._stats = stats
+            self._save()
+
+    def get_attempts_count(self):
+        with self._lock:
+            self._reload()
+            return self._stats["attempts"]
+
+    def get_log_stamp(self):
+        """Funzione che restituisce la firma del file dei tentativi a cui corrispondono le statistiche
+
+        :returns: La firma salvata, None se le statistiche sono vuote o sono state salvate da una versione precedente
+        :rtype: list"""
+
+        with self._lock:
+            self._reload()
+            return self._stats.get("log_stamp")
+
+    def get_stats(self):
+        """Funzione che restituisce le statistiche del quiz
+
+        :returns: Dizionario con numero di tentativi, voto medio, deviazione standard e istogramma dei voti, e per
+        ogni domanda numero di risposte, punteggio medio, deviazione standard e difficoltà (1 - punteggio medio)
+        :rtype: dict"""
+
+        with self._lock:
+            self._reload()
+            stats = self._stats
+            mean, deviation = self._moments(stats["attempts"], stats["mark_sum"], stats["mark_sum_squares"])
+            questions = {}
+            for question_id, question in stats["questions"].items():
+                score_mean, score_deviation = self._moments(
+                    question["count"], question["sum"], question["sum_squares"])
+                questions[question_id] = {
+                    "count": question["count"],
+                    "average_score": score_mean,
+                    "score_deviation": score_deviation,
+                    "difficulty": None if score_mean is None else 1 - score_mean
+                }
+
+            return {
+                "attempts": stats["attempts"],
+                "average_mark": mean,
+                "mark_deviation": deviation,
+                "histogram": list(stats["histogram"]),
+                "questions": questions
+            }
+
+    def _reload(self):
+        """Funzione che rilegge il file delle statistiche se è stato modificato, anche da altri processi"""
+
+        try:
+            file_stat = os.stat(self._path)
+        except OSError:
+            return
+
+        stamp = (file_stat.st_mtime_ns, file_stat.st_size)
+        if stamp != self._stamp:
+            with open(self._path, "r") as file_object:
+                self._stats = json.loads(file_object.read())
+            self._stamp = stamp
+
+    def _save(self):
+        temp_path = self._path + ".tmp"
+        with open(temp_path, "w") as file_object:
+            file_object.write(json.dumps(self._stats))
+        os.replace(temp_path, self._path)
+
+        file_stat = os.stat(self._path)
+        self._stamp = (file_stat.st_mtime_ns, file_stat.st_size)
+
+    @staticmethod
+    def _add(stats, attempt):
+        mark = attempt["mark"]
+        stats["attempts"] += 1
+        stats["mark_sum"] += mark
+        stats["mark_sum_squares"] += mark * mark
+        stats["histogram"][min(max(int(mark), 0), QuizStats.HISTOGRAM_BUCKETS - 1)] += 1
+
+        for question_id, score in attempt["scores"].items():
+            question = stats["questions"].setdefault(question_id, {"count": 0, "sum": 0, "sum_squares": 0})
+            question["count"] += 1
+            question["sum"] += score
+            question["sum_squares"] += score * score
+
+    @staticmethod
+    def _moments(count, total, total_squares):
+        if count == 0:
+            return None, None
+        mean = total / count
+        return mean, math.sqrt(max(total_squares / count - mean * mean, 0))
+
+    @staticmethod
+    def _empty_stats():
+        return {
+            "attempts": 0,
+            "mark_sum": 0,
+            "mark_sum_squares": 0,
+            "histogram": [0] * QuizStats.HISTOGRAM_BUCKETS,
+            "questions": {},
+            "log_stamp": None
+        }
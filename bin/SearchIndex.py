@@ -0,0 +1,540 @@
+from WriteBehindFlusher import WriteBehindFlusher
+from html.parser import HTMLParser
+import unicodedata
+import threading
+import heapq
+import math
+import json
+import os
+import re
+
+
+class _TextExtractor(HTMLParser):
+    """Estrae il testo visibile da una lezione, ignorando script e stili (le immagini base64 sono attributi e
+    quindi vengono ignorate automaticamente)"""
+
+    SKIPPED_TAGS = {"script", "style"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts = []
+        self._skipped_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skipped_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS and self._skipped_depth:
+            self._skipped_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skipped_depth:
+            self._parts.append(data)
+
+    def get_text(self):
+        return " ".join(self._parts)
+
+
+class SearchIndex:
+    """La classe SearchIndex è un indice invertito delle lezioni: per ogni parola salva gli elementi che la contengono
+    e quante volte, così che una ricerca legga soltanto le liste delle parole cercate. Vengono indicizzati il testo
+    delle lezioni e i nomi di elemento, topic e corso (con un peso maggiore); le parole vengono rese minuscole e
+    private degli accenti, così che "perché" e "perche" coincidano. I risultati sono ordinati con BM25 e gli elementi
+    cancellati (anche tramite il loro topic o corso) non vengono mai restituiti. L'indice viene salvato su disco
+    insieme alla versione di ogni documento, quindi refresh reindicizza soltanto i documenti cambiati.
+
+    Il salvataggio è incrementale: il file dell'indice è un'istantanea dei documenti (l'indice invertito viene
+    ricostruito al caricamento) e ogni salvataggio aggiunge al journal soltanto i documenti cambiati da quello
+    precedente. Quando il journal diventa troppo lungo rispetto all'indice, l'istantanea viene riscritta con una
+    nuova generazione e il journal svuotato; il journal viene applicato soltanto se ha la stessa generazione
+    dell'istantanea, così che un'interruzione a metà della riscrittura non lasci record già compresi in essa.
+
+    Dopo start un thread di indicizzazione tiene l'indice aggiornato: notify_change (registrata come listener del
+    CourseFileSystem) mette soltanto in coda il corso, il topic o l'elemento modificato, e il thread ne reindicizza i
+    documenti senza mai rallentare il salvataggio. Il file dell'indice viene riscritto al massimo ogni
+    SAVE_INTERVAL_MS millisecondi. Anche il caricamento dell'indice salvato avviene nel thread (o con load), così da
+    non rallentare l'avvio dell'applicazione: fino ad allora le ricerche non restituiscono risultati."""
+
+    DEFAULT_INDEX_PATH = os.path.join("data", "search_index.json")
+    FORMAT_VERSION = 2
+
+    NAME_BOOST = 3
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    DEFAULT_LIMIT = 20
+    SAVE_INTERVAL_MS = 5000
+    # L'istantanea viene riscritta quando il journal supera questo numero di record e questa frazione dei documenti
+    COMPACT_MIN_RECORDS = 1000
+    COMPACT_RATIO = 0.5
+
+    TOKEN_REGEX = re.compile(r"\w+")
+    STOPWORDS = frozenset(
+        "il lo la i gli le un uno una di a da in con su per tra fra e ed o ma che non si del dello della dei degli "
+        "delle al allo alla ai agli alle dal dallo dalla dai dagli dalle nel nello nella nei negli nelle sul sullo "
+        "sulla sui sugli sulle come anche piu se ne ci vi questo questa quello quella sono essere ha hanno".split()
+    )
+
+    def __init__(self, course_fs, index_path=DEFAULT_INDEX_PATH):
+        """L'init di questa classe prepara un indice vuoto, senza leggere nulla dal disco: l'indice salvato viene
+        caricato da load
+
+        :param course_fs: Il CourseFileSystem da cui leggere lezioni e descrittore
+        :type course_fs: CourseFileSystem
+        :param index_path: Percorso del file in cui viene salvato l'indice
+        :type index_path: str"""
+
+        self._course_fs = course_fs
+        self._index_path = index_path
+        self._journal_path = os.path.splitext(index_path)[0] + ".journal"
+        self._lock = threading.RLock()
+        # Un solo salvataggio alla volta, così che i record vengano aggiunti al journal nell'ordine giusto
+        self._save_lock = threading.Lock()
+        # Documenti: chiave "corso/topic/elemento" -> [versione, lunghezza, {parola: frequenza}]. Un documento non
+        # viene mai modificato dopo l'inserimento, ma soltanto sostituito
+        self._docs = {}
+        # Indice invertito: parola -> {chiave del documento: frequenza}
+        self._postings = {}
+        self._total_length = 0
+        # Documenti cambiati dall'ultimo salvataggio: chiave -> documento, None se rimosso
+        self._unsaved = {}
+        # Generazione dell'istantanea e numero di record nel journal, None se il journal va riscritto
+        self._generation = 0
+        self._journal_count = None
+        self._loaded = False
+
+        # Modifiche in coda per il thread di indicizzazione: (course_id, topic_id, element_id), con None per
+        # indicare tutto il topic, tutto il corso o tutti i corsi
+        self._changes = threading.Condition()
+        self._pending_changes = set()
+        self._indexing = False
+        self._closed = False
+        self._thread = None
+        self._flusher = None
+
+    @staticmethod
+    def tokenize(text):
+        """Funzione che divide un testo in parole minuscole e senza accenti, scartando le parole più comuni
+
+        :param text: Il testo da dividere
+        :type text: str
+
+        :returns: Lista delle parole
+        :rtype: list"""
+
+        folded = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+        return [token for token in SearchIndex.TOKEN_REGEX.findall(folded.casefold())
+                if token not in SearchIndex.STOPWORDS and (len(token) > 1 or token.isdigit())]
+
+    @staticmethod
+    def get_document_key(element_id, topic_id, course_id):
+        return "{}/{}/{}".format(course_id, topic_id, element_id)
+
+    def refresh(self):
+        """Funzione che allinea l'indice al descrittore: indicizza gli elementi nuovi o modificati (in base alla data
+        del file della lezione e ai nomi) e rimuove quelli cancellati, salvando l'indice se è cambiato
+
+        :returns: Numero di documenti indicizzati o rimossi
+        :rtype: int"""
+
+        self.load()
+        changes = self._refresh_scope(None, None, None)
+        if changes:
+            self.save()
+        return changes
+
+    def start(self):
+        """Funzione che avvia il thread di indicizzazione, che per prima cosa carica l'indice salvato e lo allinea al
+        descrittore come refresh, poi reindicizza i documenti segnalati da notify_change"""
+
+        with self._changes:
+            if self._thread is not None:
+                return
+            self._pending_changes.add((None, None, None))
+            self._flusher = WriteBehindFlusher(self.save, SearchIndex.SAVE_INTERVAL_MS)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def notify_change(self, course_id, topic_id=None, element_id=None):
+        """Funzione che mette in coda la reindicizzazione dei documenti di un elemento, di un topic o di un corso.
+        Non legge nulla dal disco, quindi può essere invocata durante il salvataggio
+
+        :param course_id: Id del corso modificato
+        :type course_id: str
+        :param topic_id: Id del topic modificato, None se è cambiato tutto il corso
+        :type topic_id: str
+        :param element_id: Id dell'elemento modificato, None se è cambiato tutto il topic
+        :type element_id: str"""
+
+        with self._changes:
+            self._pending_changes.add((course_id, topic_id, element_id))
+            self._changes.notify_all()
+
+    def wait_until_fresh(self, timeout=None):
+        """Funzione che attende che il thread di indicizzazione abbia elaborato tutte le modifiche segnalate
+
+        :param timeout: Secondi massimi di attesa, se None attende senza limiti
+        :type timeout: float
+
+        :returns: True se l'indice è aggiornato, False se il tempo è scaduto
+        :rtype: bool"""
+
+        with self._changes:
+            return self._changes.wait_for(lambda: not self._pending_changes and not self._indexing, timeout)
+
+    def close(self):
+        """Funzione che ferma il thread di indicizzazione e salva l'indice"""
+
+        with self._changes:
+            self._closed = True
+            self._changes.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+        if self._flusher is not None:
+            self._flusher.close()
+        self.save()
+
+    def index_element(self, element):
+        """Funzione che (re)indicizza un elemento, leggendo il testo della lezione dal disco
+
+        :param element: Dizionario dell'elemento, come quelli restituiti da CourseDescriptor.get_available_elements
+        :type element: dict"""
+
+        # La versione va letta prima del testo, così che non possa mai essere più recente di esso
+        stamp = self._get_stamp(element)
+        text = ""
+        if element["type"] == "lesson":
+            html = self._course_fs.get_lesson_html(element["element_id"], element["topic_id"], element["course_id"])
+            if isinstance(html, str):
+                extractor = _TextExtractor()
+                extractor.feed(html)
+                text = extractor.get_text()
+        self.add_document(element, text, stamp)
+
+    def add_document(self, element, text, stamp=None):
+        """Funzione che aggiunge all'indice un elemento con il suo testo, sostituendo la versione precedente
+
+        :param element: Dizionario dell'elemento, come quelli restituiti da CourseDescriptor.get_available_elements
+        :type element: dict
+        :param text: Testo del contenuto dell'elemento
+        :type text: str
+        :param stamp: Versione del documento, se None viene letta ora
+        :type stamp: list"""
+
+        if stamp is None:
+            stamp = self._get_stamp(element)
+
+        frequencies = {}
+        for token in self.tokenize(text):
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token in self.tokenize(" ".join([element["name"], element["topic_name"], element["course_name"]])):
+            frequencies[token] = frequencies.get(token, 0) + SearchIndex.NAME_BOOST
+
+        key = self.get_document_key(element["element_id"], element["topic_id"], element["course_id"])
+        length = sum(frequencies.values())
+        document = [stamp, length, frequencies]
+        with self._lock:
+            self.remove_document(key)
+            for token, frequency in frequencies.items():
+                self._postings.setdefault(token, {})[key] = frequency
+            self._docs[key] = document
+            self._total_length += length
+            self._unsaved[key] = document
+
+    def remove_document(self, key):
+        """Funzione che rimuove un documento dall'indice
+
+        :param key: Chiave del documento, restituita da get_document_key
+        :type key: str"""
+
+        with self._lock:
+            document = self._docs.pop(key, None)
+            if document is None:
+                return
+            for token in document[2]:
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(key, None)
+                    if not postings:
+                        del self._postings[token]
+            self._total_length -= document[1]
+            self._unsaved[key] = None
+
+    def search(self, query, course_ids=None, limit=DEFAULT_LIMIT):
+        """Funzione che cerca gli elementi che contengono le parole della ricerca, ordinati per rilevanza
+
+        :param query: Il testo della ricerca
+        :type query: str
+        :param course_ids: Se fornito, vengono restituiti soltanto elementi di questi corsi
+        :type course_ids: set
+        :param limit: Numero massimo di risultati
+        :type limit: int
+
+        :returns: Lista di dizionari con "course_id", "topic_id", "element_id" e "score", vuota se l'indice non è
+        ancora stato caricato
+        :rtype: list"""
+
+        tokens = set(self.tokenize(query))
+        scores = {}
+        with self._lock:
+            documents_count = len(self._docs)
+            if not self._loaded or not tokens or not documents_count:
+                return []
+            average_length = self._total_length / documents_count
+
+            for token in tokens:
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (documents_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    normalization = SearchIndex.BM25_K1 * (
+                        1 - SearchIndex.BM25_B + SearchIndex.BM25_B * self._docs[key][1] / average_length)
+                    scores[key] = scores.get(key, 0) + idf * frequency * (SearchIndex.BM25_K1 + 1) / (
+                        frequency + normalization)
+
+        # Controllo la disponibilità soltanto dei documenti migliori, e di tutti solo se non bastano
+        candidates = heapq.nlargest(limit * 4, scores, key=scores.get)
+        results = self._filter_results(candidates, scores, course_ids, limit)
+        if len(results) < limit and len(candidates) < len(scores):
+            results = self._filter_results(sorted(scores, key=scores.get, reverse=True), scores, course_ids, limit)
+        return results
+
+    def save(self):
+        """Funzione che salva su disco i documenti cambiati dall'ultimo salvataggio, aggiungendoli al journal o
+        riscrivendo l'istantanea se il journal è diventato troppo lungo. Il lock viene tenuto soltanto per prendere
+        i documenti da salvare, mentre la serializzazione e la scrittura avvengono senza bloccare ricerche e
+        indicizzazione. Prima di load non salva nulla, per non sovrascrivere l'indice salvato con uno incompleto"""
+
+        with self._save_lock:
+            with self._lock:
+                if not self._loaded or not self._unsaved:
+                    return
+                records = self._unsaved
+                self._unsaved = {}
+                compact = self._journal_count is None or self._journal_count + len(records) > max(
+                    SearchIndex.COMPACT_MIN_RECORDS, len(self._docs) * SearchIndex.COMPACT_RATIO)
+                # I documenti non vengono mai modificati, quindi basta una copia del dizionario
+                snapshot = dict(self._docs) if compact else None
+
+            try:
+                if compact:
+                    self._write_snapshot(snapshot, self._generation + 1)
+                    self._generation += 1
+                    self._journal_count = 0
+                else:
+                    self._append_journal(records)
+                    self._journal_count += len(records)
+            except OSError:
+                # I record tornano da salvare, a meno che il documento sia cambiato di nuovo nel frattempo, e il
+                # journal, forse scritto a metà, verrà riscritto
+                with self._lock:
+                    for key, document in records.items():
+                        self._unsaved.setdefault(key, document)
+                self._journal_count = None
+                raise
+
+    def load(self):
+        """Funzione che carica l'indice salvato su disco, se presente e non ancora caricato. Il file viene letto
+        senza tenere il lock, quindi le ricerche non vengono bloccate durante il caricamento"""
+
+        with self._lock:
+            if self._loaded:
+                return
+
+        data = self._read_index_file()
+        docs = data["docs"] if data is not None else {}
+        generation = data["generation"] if data is not None else 0
+
+        records, intact = self._read_journal(generation)
+        for key, document in records or []:
+            if document is None:
+                docs.pop(key, None)
+            else:
+                docs[key] = document
+
+        postings = {}
+        for key, document in docs.items():
+            for token, frequency in document[2].items():
+                postings.setdefault(token, {})[key] = frequency
+
+        with self._lock:
+            if self._loaded:
+                return
+            self._docs = docs
+            self._postings = postings
+            self._total_length = sum(document[1] for document in docs.values())
+            self._generation = generation
+            # Un journal con un record scritto a metà va riscritto, altrimenti il record successivo verrebbe unito
+            # ad esso
+            self._journal_count = len(records) if records is not None and intact else None
+            self._loaded = True
+
+    def get_documents_count(self):
+        with self._lock:
+            return len(self._docs)
+
+    def _run(self):
+        """Ciclo del thread di indicizzazione: prende tutte le modifiche in coda e ne reindicizza i documenti"""
+
+        while True:
+            with self._changes:
+                while not self._closed and not self._pending_changes:
+                    self._changes.wait()
+                if self._closed:
+                    return
+                changes = self._pending_changes
+                self._pending_changes = set()
+                self._indexing = True
+
+            try:
+                self.load()
+                # Un refresh completo comprende già tutte le altre modifiche
+                if (None, None, None) in changes:
+                    changes = [(None, None, None)]
+                for course_id, topic_id, element_id in changes:
+                    if self._refresh_scope(course_id, topic_id, element_id):
+                        self._flusher.notify_mutation()
+            finally:
+                with self._changes:
+                    self._indexing = False
+                    self._changes.notify_all()
+
+    def _refresh_scope(self, course_id, topic_id, element_id):
+        """Funzione che allinea al descrittore soltanto i documenti di un elemento, di un topic o di un corso (tutti
+        se course_id è None), senza salvare l'indice
+
+        :returns: Numero di documenti indicizzati o rimossi
+        :rtype: int"""
+
+        changes = 0
+        available_keys = set()
+        for element in self._course_fs.descriptor.get_available_elements(course_id, topic_id, element_id):
+            key = self.get_document_key(element["element_id"], element["topic_id"], element["course_id"])
+            available_keys.add(key)
+            with self._lock:
+                document = self._docs.get(key)
+            if document is None or document[0] != self._get_stamp(element):
+                self.index_element(element)
+                changes += 1
+
+        with self._lock:
+            if element_id is not None:
+                scope_keys = [self.get_document_key(element_id, topic_id, course_id)]
+            elif course_id is not None:
+                prefix = course_id + "/" if topic_id is None else "{}/{}/".format(course_id, topic_id)
+                scope_keys = [key for key in self._docs if key.startswith(prefix)]
+            else:
+                scope_keys = list(self._docs)
+
+            for key in scope_keys:
+                if key in self._docs and key not in available_keys:
+                    self.remove_document(key)
+                    changes += 1
+        return changes
+
+    def _filter_results(self, keys, scores, course_ids, limit):
+        """Funzione che scorre i documenti in ordine di punteggio, tenendo soltanto quelli dei corsi richiesti e non
+        cancellati, fino a raggiungere il numero massimo di risultati"""
+
+        results = []
+        for key in keys:
+            course_id, topic_id, element_id = key.split("/")
+            if course_ids is not None and course_id not in course_ids:
+                continue
+            if not self._course_fs.descriptor.is_element_available(element_id, topic_id, course_id):
+                continue
+            results.append({"course_id": course_id, "topic_id": topic_id, "element_id": element_id,
+                            "score": scores[key]})
+            if len(results) == limit:
+                break
+        return results
+
+    def _get_stamp(self, element):
+        """Funzione che restituisce la versione di un documento: cambia quando cambiano il file della lezione o i
+        nomi di elemento, topic o corso"""
+
+        lesson_mtime = None
+        if element["type"] == "lesson":
+            lesson_mtime = self._course_fs.get_lesson_mtime(
+                element["element_id"], element["topic_id"], element["course_id"])
+        return [lesson_mtime, element["edit date"], element["name"], element["topic_name"], element["course_name"]]
+
+    def _read_index_file(self):
+        """Funzione che legge il file dell'indice
+
+        :returns: Il contenuto del file, None se manca, è illeggibile o ha un formato diverso
+        :rtype: dict"""
+
+        if not os.path.isfile(self._index_path):
+            return None
+
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as file_object:
+                data = json.loads(file_object.read())
+        except ValueError:
+            # Un indice illeggibile viene ricostruito dal prossimo refresh
+            return None
+
+        if data.get("version") != SearchIndex.FORMAT_VERSION:
+            return None
+        return data
+
+    def _read_journal(self, generation):
+        """Funzione che legge i record del journal
+
+        :param generation: Generazione dell'istantanea caricata
+        :type generation: int
+
+        :returns: Coppia (lista di coppie (chiave, documento oppure None se rimosso), True se nessun record è
+        illeggibile). La lista è None se il journal manca o appartiene a un'altra generazione
+        :rtype: tuple"""
+
+        try:
+            with open(self._journal_path, "r", encoding="utf-8") as file_object:
+                lines = file_object.read().split("\n")
+        except FileNotFoundError:
+            return None, False
+
+        try:
+            if json.loads(lines[0]).get("generation") != generation:
+                return None, False
+        except (ValueError, AttributeError):
+            return None, False
+
+        records = []
+        intact = True
+        for line in lines[1:]:
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Un record scritto a metà da un salvataggio interrotto, che verrà ripetuto
+                intact = False
+                continue
+            records.append((record["key"], record["doc"]))
+        return records, intact
+
+    def _write_snapshot(self, docs, generation):
+        """Funzione che riscrive l'istantanea con una nuova generazione e poi svuota il journal. Se il programma si
+        interrompe tra le due operazioni, il journal rimasto ha la generazione precedente e viene ignorato"""
+
+        content = json.dumps({"version": SearchIndex.FORMAT_VERSION, "generation": generation, "docs": docs},
+                             separators=(",", ":"))
+        self._replace_file(self._index_path, content)
+        self._replace_file(self._journal_path, json.dumps({"generation": generation}) + "\n")
+
+    def _append_journal(self, records):
+        content = "".join(json.dumps({"key": key, "doc": document}, separators=(",", ":")) + "\n"
+                          for key, document in records.items())
+        with open(self._journal_path, "a", encoding="utf-8") as file_object:
+            file_object.write(content)
+
+    @staticmethod
+    def _replace_file(path, content):
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file_object:
+            file_object.write(content)
+        os.replace(temp_path, path)
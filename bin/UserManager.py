@@ -1,8 +1,10 @@
+import threading
 import os
 import re
 from dateutil.parser import parse
 from Error import Error
-import xml.etree.ElementTree as ET
+from UserStorage import XmlUserStorage, SqliteUserStorage
+from PasswordHasher import PasswordHasher
 
 
 class UserManager:
@@ -12,13 +14,27 @@ class UserManager:
     DEFAULT_LOGIN_FILENAME = "user_data.xml"
     DEFAULT_DATA_DIRECTORY = "data"
     FULL_PATH = os.path.join(DEFAULT_DATA_DIRECTORY, DEFAULT_LOGIN_FILENAME)
+    DEFAULT_SQLITE_FILENAME = "user_data.db"
+    SQLITE_PATH = os.path.join(DEFAULT_DATA_DIRECTORY, DEFAULT_SQLITE_FILENAME)
 
-    def __init__(self):
-        """Lo scopo dell'init è parsare il file xml e creare un albero xml ad oggetti in memoria, facilmente editabile
-        grazie alla libreria ElementTree"""
-        self.check_files()
-        self._tree = ET.parse(UserManager.FULL_PATH)
-        self._users = self._tree.getroot()
+    def __init__(self, storage=None, hasher=None):
+        """Lo scopo dell'init è aprire il backend che contiene gli utenti. Se non ne viene fornito uno, viene usato il
+        database SQLite se è già stato creato (ad esempio con la migrazione di UserStorage.py), altrimenti il file xml
+
+        :param storage: Il backend in cui sono salvati gli utenti
+        :type storage: UserStorage
+        :param hasher: L'oggetto che calcola e verifica gli hash delle password
+        :type hasher: PasswordHasher"""
+
+        if storage is None:
+            if os.path.exists(UserManager.SQLITE_PATH):
+                storage = SqliteUserStorage(UserManager.SQLITE_PATH)
+            else:
+                storage = XmlUserStorage(UserManager.FULL_PATH)
+        self._storage = storage
+        self._hasher = hasher if hasher is not None else PasswordHasher()
+        # Il LoginApplication usa l'UserManager anche da un thread in background
+        self._lock = threading.RLock()
 
     def get_userdata(self, id, name=False, surname=False, email=False, type=False):
         """Questa funzione fornisce, in base ai parametri selezionati, le informazioni di un utente dato il suo id.
@@ -37,17 +53,18 @@ class UserManager:
 
         :returns: False, se l'utente specificato non esiste
         :rtype: bool"""
-        child = self._users.find(".user[@id='{}']".format(id))
+        with self._lock:
+            user = self._storage.get_user(id)
         ret = {}
-        if child:
+        if user is not None:
             if name:
-                ret["name"] = child.find("name").text
+                ret["name"] = user["name"]
             if surname:
-                ret["surname"] = child.find("surname").text
+                ret["surname"] = user["surname"]
             if email:
-                ret["email"] = child.find("email").text
+                ret["email"] = user["email"]
             if type:
-                ret["type"] = child.find("type").text
+                ret["type"] = user["type"]
             return ret
         return False
 
@@ -62,8 +79,9 @@ class UserManager:
         :return: False, se l'id inserito è errato
         :rtype: bool
         """
-        child = self._users.find(".user[@id='{}']".format(id))
-        if child:
+        with self._lock:
+            user = self._storage.get_user(id)
+        if user is not None:
             return True
         return False
 
@@ -79,11 +97,19 @@ class UserManager:
         :return inexistent: Un Error, che può esprimere uno di tre messaggi:
         :rtype: str"""
 
-        child = self._users.find(".user[email='{}']".format(email))
-        if child:
-            if child.find("password").text == password:
-                if child.attrib["active"] == "true":
-                    return child.attrib['id']
+        with self._lock:
+            user = self._storage.get_user_by_email(email)
+        if user is not None:
+            # La verifica avviene senza tenere il lock, perché è l'operazione più lenta
+            if self._hasher.verify(password, user["password"]):
+                # Le password in chiaro o con parametri vecchi vengono ricalcolate ora che la password è nota
+                if self._hasher.needs_rehash(user["password"]):
+                    password_hash = self._hasher.hash(password)
+                    with self._lock:
+                        self._storage.update_user(user["id"], password=password_hash)
+                        self.update_file()
+                if user["active"]:
+                    return user["id"]
                 return Error("inactive", "User has been deactivated, contact support for details")
             return Error("password", "Incorrect Password")
         return Error("inexistent", "Incorrect Email")
@@ -120,31 +146,21 @@ class UserManager:
         elif not self._email_valid(email):
             return Error("email", "Please type a valid email address")
 
-        elif not self._email_unique(email):
-            return Error("uniqueemail", "Your email is already in use")
+        # L'hash viene calcolato senza tenere il lock, perché è l'operazione più lenta
+        password_hash = self._hasher.hash(password)
 
-        elif not self._birthdate_valid(birthdate):
-            return Error("birthdate", "Please type a valid birthdate")
+        with self._lock:
+            if not self._email_unique(email):
+                return Error("uniqueemail", "Your email is already in use")
 
-        # Creo un nuovo utente in nel tree di questa sessione
-        new_id = self.get_new_id()
-        new_user = ET.SubElement(self._users, "user", attrib={"active": "true", "id": new_id})
+            elif not self._birthdate_valid(birthdate):
+                return Error("birthdate", "Please type a valid birthdate")
 
-        new_user_type = ET.SubElement(new_user, "type")
-        new_user_name = ET.SubElement(new_user, "name")
-        new_user_surname = ET.SubElement(new_user, "surname")
-        new_user_password = ET.SubElement(new_user, "password")
-        new_user_email = ET.SubElement(new_user, "email")
-        new_user_birthdate = ET.SubElement(new_user, "birthdate")
-
-        new_user_type.text = type
-        new_user_name.text = name
-        new_user_surname.text = surname
-        new_user_password.text = password
-        new_user_email.text = email
-        new_user_birthdate.text = birthdate
-
-        self._indent_tree(self._users)
+            # Creo un nuovo utente nel backend di questa sessione
+            self._storage.add_user({
+                "id": self.get_new_id(), "active": True, "type": type, "name": name, "surname": surname,
+                "password": password_hash, "email": email, "birthdate": birthdate
+            })
 
     def modify_user(self, id, **kwargs):
 
@@ -160,28 +176,32 @@ class UserManager:
         :returns: Un oggetto Error, che comunica il tipo di errore ed un eventuale messaggio da recapitare all'utente
         :rtype: Error"""
 
-        child = self._users.find(".user[@id='{}']".format(id))
-        for key, value in kwargs.items():
-            child_tag = child.find(key)
-            if key == "email":
-                if self._email_valid(value):
-                    if self._email_unique(value):
-                        child_tag.text = value
+        # L'hash della nuova password viene calcolato senza tenere il lock, perché è l'operazione più lenta
+        password_hash = None
+        if "password" in kwargs and self._password_valid(kwargs["password"]):
+            password_hash = self._hasher.hash(kwargs["password"])
+
+        with self._lock:
+            for key, value in kwargs.items():
+                if key == "email":
+                    if self._email_valid(value):
+                        if self._email_unique(value):
+                            self._storage.update_user(id, email=value)
+                        else:
+                            return Error("uniqueemail", "This email is already in use")
+                    else:
+                        return Error("email", "Please type a valid email address")
+                elif key == "type":
+                    if self._type_valid(value):
+                        self._storage.update_user(id, type=value)
                     else:
-                        return Error("uniqueemail", "This email is already in use")
-                else:
-                    return Error("email", "Please type a valid email address")
-            elif key == "type":
-                if self._type_valid(value):
-                    child_tag.text = value
-                else:
-                    return Error("type", "Please select an user type")
-            elif key == "password":
-                if self._password_valid(value):
-                    child_tag.text = value
-                else:
-                    return Error("password", "Please type a valid password")
-            self.update_file()
+                        return Error("type", "Please select an user type")
+                elif key == "password":
+                    if password_hash is not None:
+                        self._storage.update_user(id, password=password_hash)
+                    else:
+                        return Error("password", "Please type a valid password")
+                self.update_file()
 
     def remove_user(self, id):
         """FUNZIONE PER TESTING Una funzione che permette di rimuovere completamente un utente dal database utenti.
@@ -191,8 +211,8 @@ class UserManager:
         :param id: L'ID dell'utente da rimuovere
         :type id: str"""
 
-        child = self._users.find(".user[@id='{}']".format(id))
-        self._users.remove(child)
+        with self._lock:
+            self._storage.remove_user(id)
 
     def activate_user(self, id):
         """Una funzione che permette di riattivare un utente, dato il suo id.
@@ -200,8 +220,8 @@ class UserManager:
         :param id: L'ID dell'utente da abilitare
         :type id: str"""
 
-        child = self._users.find(".user[@id='{}']".format(id))
-        child.attrib["active"] = "true"
+        with self._lock:
+            self._storage.update_user(id, active=True)
 
     def deactivate_user(self, id):
         """Una funzione che permette di disabilitare un utente, dato il suo id.
@@ -209,8 +229,8 @@ class UserManager:
         :param id: L'ID dell'utente da disabilitare
         :type id: str"""
 
-        child = self._users.find(".user[@id='{}']".format(id))
-        child.attrib["active"] = "false"
+        with self._lock:
+            self._storage.update_user(id, active=False)
 
     def get_new_id(self):
         """Una funzione che fornisce un nuovo id, aggiornando il contatore di utenti nel database xml
@@ -218,8 +238,8 @@ class UserManager:
         :returns: Un nuovo ID, che non appartiene a nessun utente
         :rtype: str"""
 
-        self._users.attrib["usercounter"] = str(int(self._users.attrib["usercounter"])+1)
-        return "u-"+self._users.attrib["usercounter"]
+        with self._lock:
+            return self._storage.get_new_id()
 
     def get_last_id(self):
         """Una funzione che fornisce l'ultimo id aggiunto, corrispondente a quello dell'ultimo utente nel file xml
@@ -227,46 +247,30 @@ class UserManager:
         :returns: L'ID dell'ultimo utente aggiunto
         :rtype: str"""
 
-        return "u-" + self._users.attrib["usercounter"]
+        with self._lock:
+            return self._storage.get_last_id()
+
+    def get_index_stats(self):
+        """Una funzione che fornisce le statistiche degli indici degli utenti, utile per verificarne l'efficacia
+
+        :returns: Un dizionario con il numero di utenti indicizzati per id e per email, il numero di ricerche
+        effettuate e quante di queste hanno trovato un utente
+        :rtype: dict"""
+
+        return self._storage.get_index_stats()
 
     def update_file(self):
-        """La funzione responsabile di scrivere sul file xml l'albero presente in memoria"""
-        self._tree.write(UserManager.FULL_PATH, "UTF-8")
-
-    def _indent_tree(self, elem, indent=0):
-        """La funzione responsabile di effettuare l'indentazione dell'albero presente in memoria, in modo che appaia
-        indentato nel file xml. Ringrazio https://norwied.wordpress.com/ per il codice di questa funzione, che ho solo
-        modificato in parte."""
-
-        i = "\n" + ("\t" * indent)
-        if len(elem):
-            if not elem.text or not elem.text.strip():
-                elem.text = i + "\t"
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-            for elem in elem:
-                self._indent_tree(elem, indent + 1)
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-        else:
-            if indent and (not elem.tail or not elem.tail.strip()):
-                elem.tail = i
+        """La funzione responsabile di rendere persistenti le modifiche, ad esempio scrivendo sul file xml l'albero
+        presente in memoria"""
+        with self._lock:
+            self._storage.flush()
 
     @staticmethod
     def check_files():
         """Questa funzione verifica se la cartella data e il file xml esistono. Se esse mancano, vengono create, e viene
         scritta la root nel file xml."""
 
-        if os.path.isdir(UserManager.DEFAULT_DATA_DIRECTORY):
-            if os.path.exists(UserManager.FULL_PATH):
-                return True
-            else:
-                with open(UserManager.FULL_PATH, "w+") as f:
-                    f.write("<users usercounter=\"0\">\n</users>")
-        else:
-            os.mkdir(UserManager.DEFAULT_DATA_DIRECTORY)
-            with open(UserManager.FULL_PATH, "w+") as f:
-                f.write("<users usercounter=\"0\">\n</users>")
+        return XmlUserStorage.check_files(UserManager.FULL_PATH)
 
     @staticmethod
     def _type_valid(type):
@@ -293,8 +297,9 @@ class UserManager:
         return True
 
     def _email_unique(self, email):
-        if self._users.find(".user[email='{}']".format(email)):
-            return False
+        with self._lock:
+            if self._storage.get_user_by_email(email) is not None:
+                return False
         return True
 
     @staticmethod
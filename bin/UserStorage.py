@@ -0,0 +1,461 @@
+from abc import ABC, abstractmethod
+import os
+import sys
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET
+
+
+class UserStorage(ABC):
+    """La classe UserStorage descrive l'interfaccia comune a tutti i backend che salvano gli utenti per conto
+    dell'UserManager. Un utente viene scambiato come dizionario con le chiavi di USER_FIELDS, dove "active" è un bool
+    e tutti gli altri valori sono stringhe."""
+
+    USER_FIELDS = ("id", "active", "type", "name", "surname", "password", "email", "birthdate")
+    # CAMPI SALVATI COME TAG FIGLI NEL FILE XML
+    DATA_FIELDS = ("type", "name", "surname", "password", "email", "birthdate")
+
+    @abstractmethod
+    def get_user(self, id):
+        """Funzione che restituisce un utente dato il suo id
+
+        :param id: L'id dell'utente
+        :type id: str
+
+        :returns: L'utente, oppure None se non esiste
+        :rtype: dict"""
+
+    @abstractmethod
+    def get_user_by_email(self, email):
+        """Funzione che restituisce un utente data la sua email, senza distinguere maiuscole e minuscole
+
+        :param email: L'email dell'utente
+        :type email: str
+
+        :returns: L'utente, oppure None se non esiste
+        :rtype: dict"""
+
+    @abstractmethod
+    def add_user(self, user):
+        """Funzione che aggiunge un utente, il cui id deve essere stato ottenuto con get_new_id
+
+        :param user: L'utente da aggiungere
+        :type user: dict"""
+
+    @abstractmethod
+    def update_user(self, id, **fields):
+        """Funzione che modifica alcuni campi di un utente esistente
+
+        :param id: L'id dell'utente da modificare
+        :type id: str
+        :param fields: I campi da modificare con il loro nuovo valore
+        :type fields: dict"""
+
+    @abstractmethod
+    def remove_user(self, id):
+        """Funzione che rimuove un utente
+
+        :param id: L'id dell'utente da rimuovere
+        :type id: str"""
+
+    @abstractmethod
+    def get_new_id(self):
+        """Funzione che aggiorna il contatore degli utenti e restituisce un nuovo id
+
+        :returns: Il nuovo id
+        :rtype: str"""
+
+    @abstractmethod
+    def get_last_id(self):
+        """Funzione che restituisce l'ultimo id generato
+
+        :returns: L'ultimo id
+        :rtype: str"""
+
+    @abstractmethod
+    def iter_users(self):
+        """Funzione che scorre tutti gli utenti salvati
+
+        :returns: Un iteratore di utenti
+        :rtype: iterator"""
+
+    @abstractmethod
+    def get_index_stats(self):
+        """Funzione che fornisce le statistiche degli indici usati dal backend
+
+        :returns: Le statistiche
+        :rtype: dict"""
+
+    @abstractmethod
+    def flush(self):
+        """Funzione che rende persistenti le modifiche non ancora salvate"""
+
+
+class XmlUserStorage(UserStorage):
+    """Il backend che salva gli utenti in un file xml, letto interamente in memoria con ElementTree e riscritto
+    interamente ad ogni flush. Per evitare di scorrere l'albero ad ogni ricerca, vengono mantenuti due indici:
+    id -> elemento ed email (in minuscolo) -> elemento."""
+
+    def __init__(self, path):
+        """L'init di questa classe verifica che il file esista, lo parsa e costruisce gli indici
+
+        :param path: Il percorso del file xml
+        :type path: str"""
+
+        self._path = path
+        self.check_files(path)
+        self._tree = ET.parse(path)
+        self._users = self._tree.getroot()
+
+        self._users_by_id = {}
+        self._users_by_email = {}
+        self._index_stats = {"lookups": 0, "hits": 0, "misses": 0}
+        self._build_indexes()
+
+    def get_user(self, id):
+        return self._to_dict(self._count_lookup(self._users_by_id.get(id)))
+
+    def get_user_by_email(self, email):
+        return self._to_dict(self._count_lookup(self._users_by_email.get(email.lower())))
+
+    def add_user(self, user):
+        active = "true" if user.get("active", True) else "false"
+        previous_user = self._users[-1] if len(self._users) else None
+        new_user = ET.SubElement(self._users, "user", attrib={"active": active, "id": user["id"]})
+        for field in UserStorage.DATA_FIELDS:
+            ET.SubElement(new_user, field).text = user[field]
+
+        self._add_to_indexes(new_user)
+        self._indent_new_user(new_user, previous_user)
+
+    def update_user(self, id, **fields):
+        child = self._users_by_id[id]
+        self._remove_from_indexes(child)
+        for key, value in fields.items():
+            if key == "active":
+                child.attrib["active"] = "true" if value else "false"
+            else:
+                child.find(key).text = value
+        self._add_to_indexes(child)
+
+    def remove_user(self, id):
+        child = self._users_by_id[id]
+        self._users.remove(child)
+        self._remove_from_indexes(child)
+
+    def get_new_id(self):
+        self._users.attrib["usercounter"] = str(int(self._users.attrib["usercounter"])+1)
+        return "u-"+self._users.attrib["usercounter"]
+
+    def get_last_id(self):
+        return "u-" + self._users.attrib["usercounter"]
+
+    def get_user_counter(self):
+        return int(self._users.attrib["usercounter"])
+
+    def iter_users(self):
+        for child in self._users.iter("user"):
+            yield self._to_dict(child)
+
+    def get_index_stats(self):
+        stats = dict(self._index_stats)
+        stats["ids"] = len(self._users_by_id)
+        stats["emails"] = len(self._users_by_email)
+        return stats
+
+    def flush(self):
+        """La funzione responsabile di scrivere sul file xml l'albero presente in memoria"""
+        self._tree.write(self._path, "UTF-8")
+
+    def _build_indexes(self):
+        """La funzione che costruisce da zero gli indici degli utenti, scorrendo una sola volta l'albero xml"""
+
+        self._users_by_id.clear()
+        self._users_by_email.clear()
+        for child in self._users.iter("user"):
+            self._add_to_indexes(child)
+
+    def _add_to_indexes(self, child):
+        self._users_by_id[child.attrib["id"]] = child
+        email = child.find("email")
+        if email is not None and email.text:
+            self._users_by_email[email.text.lower()] = child
+
+    def _remove_from_indexes(self, child):
+        self._users_by_id.pop(child.attrib["id"], None)
+        email = child.find("email")
+        if email is not None and email.text:
+            self._users_by_email.pop(email.text.lower(), None)
+
+    def _count_lookup(self, child):
+        self._index_stats["lookups"] += 1
+        if child is None:
+            self._index_stats["misses"] += 1
+        else:
+            self._index_stats["hits"] += 1
+        return child
+
+    @staticmethod
+    def _to_dict(child):
+        if child is None:
+            return None
+
+        user = {"id": child.attrib["id"], "active": child.attrib["active"] == "true"}
+        for field in UserStorage.DATA_FIELDS:
+            user[field] = child.find(field).text
+        return user
+
+    def _indent_new_user(self, new_user, previous_user):
+        """La funzione che indenta soltanto l'utente appena aggiunto, come se fosse stato indentato l'intero albero:
+        cambia il testo dei suoi campi e la coda sua e dell'utente precedente, così che l'aggiunta non debba
+        scorrere tutto il file
+
+        :param new_user: L'elemento dell'utente appena aggiunto, l'ultimo figlio della root
+        :type new_user: xml.etree.ElementTree.Element
+        :param previous_user: L'ultimo figlio della root prima dell'aggiunta, None se non c'erano utenti
+        :type previous_user: xml.etree.ElementTree.Element"""
+
+        self._users.tail = "\n"
+        if previous_user is None:
+            self._users.text = "\n\t"
+        else:
+            previous_user.tail = "\n\t"
+        new_user.text = "\n\t\t"
+        new_user.tail = "\n"
+        for field in new_user:
+            field.tail = "\n\t\t"
+        field.tail = "\n\t"
+
+    @staticmethod
+    def check_files(path):
+        """Questa funzione verifica se la cartella e il file xml esistono. Se essi mancano, vengono creati, e viene
+        scritta la root nel file xml."""
+
+        if os.path.exists(path):
+            return True
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.mkdir(directory)
+        with open(path, "w+") as f:
+            f.write("<users usercounter=\"0\">\n</users>")
+
+
+class SqliteUserStorage(UserStorage):
+    """Il backend che salva gli utenti in un database SQLite. Le colonne id ed email sono indicizzate e ogni modifica
+    aggiorna soltanto la riga interessata, quindi né l'avvio né le scritture dipendono dal numero di utenti."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            active INTEGER NOT NULL DEFAULT 1,
+            type TEXT,
+            name TEXT,
+            surname TEXT,
+            password TEXT,
+            email TEXT,
+            email_key TEXT,
+            birthdate TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS users_email_key ON users (email_key);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('usercounter', 0);
+    """
+
+    def __init__(self, path):
+        """L'init di questa classe apre (o crea) il database e ne prepara lo schema
+
+        :param path: Il percorso del file del database
+        :type path: str"""
+
+        self._path = path
+        self._lock = threading.RLock()
+        self._index_stats = {"lookups": 0, "hits": 0, "misses": 0}
+
+        # La connessione viene condivisa tra i thread, ma ogni accesso è protetto dal lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.executescript(SqliteUserStorage.SCHEMA)
+
+    def get_user(self, id):
+        return self._fetch_one("SELECT * FROM users WHERE id = ?", (id,))
+
+    def get_user_by_email(self, email):
+        return self._fetch_one("SELECT * FROM users WHERE email_key = ?", (self._email_key(email),))
+
+    def add_user(self, user):
+        self.import_users([user])
+
+    def import_users(self, users, user_counter=None):
+        """Funzione che aggiunge più utenti, ed eventualmente imposta il contatore degli id, in un'unica
+        transazione: se un inserimento fallisce non viene aggiunto nessun utente
+
+        :param users: Gli utenti da aggiungere
+        :type users: iterable
+        :param user_counter: Il nuovo valore del contatore degli id, None per non modificarlo
+        :type user_counter: int"""
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO users (id, active, type, name, surname, password, email, email_key, birthdate) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((user["id"], int(user.get("active", True)), user["type"], user["name"], user["surname"],
+                  user["password"], user["email"], self._email_key(user["email"]), user["birthdate"])
+                 for user in users)
+            )
+            if user_counter is not None:
+                self._connection.execute("UPDATE meta SET value = ? WHERE key = 'usercounter'", (user_counter,))
+
+    def update_user(self, id, **fields):
+        assignments = []
+        values = []
+        for key, value in fields.items():
+            if key not in UserStorage.USER_FIELDS or key == "id":
+                raise KeyError(key)
+            if key == "active":
+                value = int(value)
+            assignments.append("{} = ?".format(key))
+            values.append(value)
+            if key == "email":
+                assignments.append("email_key = ?")
+                values.append(self._email_key(value))
+
+        if not assignments:
+            return
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE users SET {} WHERE id = ?".format(", ".join(assignments)), values + [id])
+
+    def remove_user(self, id):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM users WHERE id = ?", (id,))
+
+    def get_new_id(self):
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'usercounter'")
+            return "u-" + str(self.get_user_counter())
+
+    def get_last_id(self):
+        return "u-" + str(self.get_user_counter())
+
+    def get_user_counter(self):
+        with self._lock:
+            return self._connection.execute("SELECT value FROM meta WHERE key = 'usercounter'").fetchone()[0]
+
+    def set_user_counter(self, value):
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE meta SET value = ? WHERE key = 'usercounter'", (value,))
+
+    def iter_users(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT * FROM users ORDER BY rowid").fetchall()
+        for row in rows:
+            yield self._to_dict(row)
+
+    def get_index_stats(self):
+        stats = dict(self._index_stats)
+        with self._lock:
+            stats["ids"] = self._connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        stats["emails"] = stats["ids"]
+        return stats
+
+    def flush(self):
+        """Ogni modifica viene già confermata nel database, quindi non c'è nulla da scrivere"""
+        with self._lock:
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _fetch_one(self, query, params):
+        with self._lock:
+            row = self._connection.execute(query, params).fetchone()
+
+        self._index_stats["lookups"] += 1
+        if row is None:
+            self._index_stats["misses"] += 1
+        else:
+            self._index_stats["hits"] += 1
+        return self._to_dict(row)
+
+    @staticmethod
+    def _email_key(email):
+        """Funzione che restituisce la chiave con cui viene indicizzata un'email. Un'email vuota non ha chiave,
+        così che più utenti senza email non violino l'unicità dell'indice"""
+
+        return email.lower() if email else None
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+
+        user = {field: row[field] for field in UserStorage.USER_FIELDS}
+        user["active"] = bool(user["active"])
+        return user
+
+
+def migrate_xml_to_sqlite(xml_path, sqlite_path):
+    """Funzione che copia tutti gli utenti e il contatore degli id da un file xml ad un database SQLite. Il database
+    di destinazione non deve contenere utenti, così che la migrazione non possa sovrascrivere dati esistenti.
+    Il database viene costruito in un file temporaneo, con un'unica transazione, e sostituito a quello di destinazione
+    solo se la migrazione riesce: l'UserManager non può quindi mai trovare un database con una parte degli utenti.
+
+    Gli utenti senza email vengono migrati senza chiave email. Le email che nel file xml compaiono in più utenti,
+    anche con maiuscole diverse, non possono essere rese univoche automaticamente: in quel caso la migrazione viene
+    annullata con un ValueError che le elenca, senza creare il database
+
+    :param xml_path: Il percorso del file xml da migrare
+    :type xml_path: str
+    :param sqlite_path: Il percorso del database SQLite da creare
+    :type sqlite_path: str
+
+    :returns: Il numero di utenti migrati
+    :rtype: int"""
+
+    if os.path.exists(sqlite_path):
+        destination = SqliteUserStorage(sqlite_path)
+        users_count = destination.get_index_stats()["ids"]
+        destination.close()
+        if users_count:
+            raise ValueError("Il database {} contiene già degli utenti".format(sqlite_path))
+
+    source = XmlUserStorage(xml_path)
+    users = list(source.iter_users())
+
+    users_by_email = {}
+    for user in users:
+        if user["email"]:
+            users_by_email.setdefault(user["email"].lower(), []).append(user["id"])
+    duplicates = {email: ids for email, ids in users_by_email.items() if len(ids) > 1}
+    if duplicates:
+        raise ValueError("Email usate da più utenti, da correggere nel file {} prima della migrazione: {}".format(
+            xml_path, "; ".join("{} ({})".format(email, ", ".join(ids)) for email, ids in sorted(duplicates.items()))))
+
+    temp_path = sqlite_path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    destination = SqliteUserStorage(temp_path)
+    try:
+        destination.import_users(users, source.get_user_counter())
+    finally:
+        destination.close()
+    os.replace(temp_path, sqlite_path)
+
+    return len(users)
+
+
+if __name__ == "__main__":
+    # Uso: python UserStorage.py [file xml] [database sqlite]
+    from UserManager import UserManager
+
+    xml_path = sys.argv[1] if len(sys.argv) > 1 else UserManager.FULL_PATH
+    sqlite_path = sys.argv[2] if len(sys.argv) > 2 else UserManager.SQLITE_PATH
+    print("Migrati {} utenti da {} a {}".format(migrate_xml_to_sqlite(xml_path, sqlite_path), xml_path, sqlite_path))
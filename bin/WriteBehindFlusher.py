@@ -0,0 +1,142 @@
+import threading
+import logging
+import atexit
+import time
+
+
+class WriteBehindFlusher:
+    """La classe WriteBehindFlusher si occupa di rimandare e raggruppare le scritture su disco di un modello tenuto
+    in memoria. Chi possiede il modello segnala ogni modifica con notify_mutation e il flusher decide quando invocare
+    la funzione di scrittura, secondo la politica scelta: ogni N millisecondi, ogni N modifiche oppure soltanto alla
+    chiusura del programma.
+
+    Le modifiche vengono considerate scritte soltanto quando la funzione di scrittura termina senza errori: dopo
+    un errore restano in attesa e il thread riprova dopo RETRY_DELAY_S secondi."""
+
+    RETRY_DELAY_S = 1
+
+    def __init__(self, flush_callback, interval_ms=None, max_mutations=None):
+        """L'init di questa classe salva la politica di scrittura e, se necessario, avvia il thread che si occupa
+        delle scritture periodiche. In ogni caso viene registrata una scrittura finale alla chiusura del programma
+
+        :param flush_callback: Funzione senza parametri che scrive il modello su disco
+        :type flush_callback: function
+        :param interval_ms: Millisecondi massimi che una modifica può attendere prima di essere scritta (None per disattivare)
+        :type interval_ms: int
+        :param max_mutations: Numero di modifiche dopo il quale la scrittura avviene subito (None per disattivare)
+        :type max_mutations: int"""
+
+        self._flush_callback = flush_callback
+        self._interval_ms = interval_ms
+        self._max_mutations = max_mutations
+
+        self._condition = threading.Condition()
+        # Una sola scrittura alla volta, così che flush restituisca il controllo solo a scrittura conclusa
+        self._flush_lock = threading.Lock()
+        self._pending_mutations = 0
+        self._first_mutation_time = None
+        self._closed = False
+
+        self._thread = None
+        if interval_ms is not None or max_mutations is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        atexit.register(self.close)
+
+    def notify_mutation(self):
+        """Funzione da invocare dopo ogni modifica del modello in memoria"""
+
+        with self._condition:
+            if self._pending_mutations == 0:
+                self._first_mutation_time = time.monotonic()
+            self._pending_mutations += 1
+            self._condition.notify()
+
+    def get_pending_mutations(self):
+        """Funzione che restituisce il numero di modifiche non ancora scritte su disco
+
+        :returns: Numero di modifiche in attesa
+        :rtype: int"""
+
+        with self._condition:
+            return self._pending_mutations
+
+    def flush(self):
+        """Funzione che scrive subito su disco tutte le modifiche in attesa. Se è già in corso una scrittura ne
+        attende la fine, quindi quando restituisce il controllo tutte le modifiche segnalate prima sono su disco
+
+        :returns: True se è stata effettuata una scrittura altrimenti False
+        :rtype: bool"""
+
+        with self._flush_lock:
+            with self._condition:
+                flushed_mutations = self._pending_mutations
+            if not flushed_mutations:
+                return False
+
+            try:
+                self._flush_callback()
+            except Exception:
+                logging.getLogger(__name__).exception("Scrittura di %d modifiche non riuscita", flushed_mutations)
+                raise
+
+            # Le modifiche arrivate durante la scrittura restano in attesa della prossima
+            with self._condition:
+                self._pending_mutations -= flushed_mutations
+                if not self._pending_mutations:
+                    self._first_mutation_time = None
+        return True
+
+    def close(self):
+        """Funzione che ferma il thread di scrittura ed effettua l'ultima scrittura. Viene invocata automaticamente
+        alla chiusura del programma"""
+
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+        self.flush()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        """Ciclo del thread di scrittura: attende finché una delle condizioni della politica non è soddisfatta"""
+
+        while True:
+            with self._condition:
+                while not self._closed and not self._should_flush():
+                    self._condition.wait(self._time_to_deadline())
+                if self._closed:
+                    return
+
+            try:
+                self.flush()
+            except Exception:
+                # L'errore è già stato registrato: riprovo più tardi senza fermare il thread
+                with self._condition:
+                    self._condition.wait(WriteBehindFlusher.RETRY_DELAY_S)
+
+    def _should_flush(self):
+        if not self._pending_mutations:
+            return False
+        if self._max_mutations is not None and self._pending_mutations >= self._max_mutations:
+            return True
+        if self._interval_ms is not None:
+            return self._time_to_deadline() <= 0
+        return False
+
+    def _time_to_deadline(self):
+        """Funzione che calcola quanti secondi mancano alla prossima scrittura periodica
+
+        :returns: Secondi mancanti oppure None se non bisogna svegliarsi a tempo
+        :rtype: float"""
+
+        if self._interval_ms is None or self._first_mutation_time is None:
+            return None
+        elapsed = time.monotonic() - self._first_mutation_time
+        return max(self._interval_ms / 1000 - elapsed, 0)
@@ -0,0 +1,104 @@
+"""Prova di carico del server locale: scarica i file di js e css con più client in parallelo, dal vecchio server
+(SimpleHTTPRequestHandler su ThreadingTCPServer, una connessione per richiesta) e dal LocalHTTPServer (connessioni
+HTTP/1.1 persistenti, pool di thread e AssetCache), e riporta richieste al secondo e latenze. Per il LocalHTTPServer
+viene misurata anche la rivalidazione con If-None-Match. Uso, dalla cartella bin:
+python benchmarks/bench_asset_server.py [client] [richieste per client]"""
+
+import os
+import sys
+import time
+import threading
+import http.client
+import http.server
+import socketserver
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LocalServer import LocalHTTPServer, LocalRequestHandler
+
+ASSET_DIRS = ["js", "css"]
+
+
+class QuietSimpleHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class QuietLocalHandler(LocalRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+def run_client(port, paths, requests_count, revalidate, latencies, errors):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    etags = {}
+    for index in range(requests_count):
+        path = paths[index % len(paths)]
+        headers = {"If-None-Match": etags[path]} if revalidate and path in etags else {}
+        start = time.perf_counter()
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(path)
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+        if response.status not in (200, 304):
+            errors.append(path)
+        etags[path] = response.getheader("ETag")
+        # Il vecchio server risponde in HTTP/1.0 e chiude la connessione dopo ogni richiesta
+        if response.will_close:
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    connection.close()
+
+
+def load_test(name, port, paths, clients, requests_count, revalidate=False):
+    latencies, errors = [], []
+    threads = [threading.Thread(target=run_client, args=(port, paths, requests_count, revalidate, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print("{:<28} {:>9.0f} req/s   p50 {:>7.2f} ms   p99 {:>7.2f} ms   errori {}".format(
+        name, len(latencies) / elapsed, p50, p99, len(errors)))
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    requests_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    paths = ["/{}/{}".format(directory, name) for directory in ASSET_DIRS for name in sorted(os.listdir(directory))]
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    simple_server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), QuietSimpleHandler)
+    simple_server.daemon_threads = True
+    local_server = LocalHTTPServer(("127.0.0.1", 0), QuietLocalHandler)
+
+    print("{} client x {} richieste su {} file".format(clients, requests_count, len(paths)))
+    load_test("SimpleHTTPRequestHandler", start_server(simple_server), paths, clients, requests_count)
+    local_port = start_server(local_server)
+    load_test("LocalHTTPServer", local_port, paths, clients, requests_count)
+    load_test("LocalHTTPServer (304)", local_port, paths, clients, requests_count, revalidate=True)
+
+    simple_server.shutdown()
+    local_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
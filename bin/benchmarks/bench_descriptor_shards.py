@@ -0,0 +1,66 @@
+"""Costo di una scrittura del descrittore dopo la modifica di un solo corso, su un catalogo sintetico: riscrittura
+dell'intero descrittore (come avveniva con il file unico) contro riscrittura del solo indice e del corso modificato.
+Uso, dalla cartella bin: python benchmarks/bench_descriptor_shards.py [corsi] [topic per corso] [elementi per topic]"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CourseDescriptor import CourseDescriptor
+
+ROUNDS = 20
+
+
+def main():
+    courses = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    topics_per_course = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    elements_per_topic = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as working_dir:
+        os.chdir(working_dir)
+        os.makedirs(CourseDescriptor.DEFAULT_COURSES_FOLDER)
+        descriptor = CourseDescriptor(flush_interval_ms=None, flush_mutations=None)
+
+        for _ in range(courses):
+            course_id = descriptor.get_new_course_id()
+            descriptor.add_course("Corso", course_id)
+            for _ in range(topics_per_course):
+                topic_id = descriptor.get_new_topic_id()
+                descriptor.add_topic("Topic", topic_id, course_id)
+                for _ in range(elements_per_topic):
+                    descriptor.add_element("Lezione", "lesson", descriptor.get_new_element_id(), topic_id, course_id)
+        descriptor.flush()
+        print("{} corsi, {} elementi, {:.1f} MB".format(
+            courses, courses * topics_per_course * elements_per_topic,
+            sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk("data") for name in names
+                if name == CourseDescriptor.COURSE_DESCRIPTOR_NAME) / 2 ** 20))
+
+        course_id = descriptor.get_courses_list()[0]
+        topic_id = descriptor.get_topics_list(course_id)[0]
+        element_id = descriptor.get_elements_list(topic_id, course_id)[0]
+
+        start = time.perf_counter()
+        for round_number in range(ROUNDS):
+            descriptor.edit_element("Lezione {}".format(round_number), element_id, topic_id, course_id)
+            CourseDescriptor._write_descriptor_data(descriptor._descriptor_data)
+        full_ms = (time.perf_counter() - start) * 1000 / ROUNDS
+
+        start = time.perf_counter()
+        for round_number in range(ROUNDS):
+            descriptor.edit_element("Lezione {}".format(round_number), element_id, topic_id, course_id)
+            descriptor.flush()
+        sharded_ms = (time.perf_counter() - start) * 1000 / ROUNDS
+
+        print("descrittore intero          {:>8.2f} ms per scrittura".format(full_ms))
+        print("solo il corso modificato    {:>8.2f} ms per scrittura".format(sharded_ms))
+
+        descriptor.close()
+        os.chdir(original_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Confronto tra la lettura diretta di una lezione e la lettura con il parser di BeautifulSoup, su lezioni da 10 KB
+a 5 MB. Uso: python benchmarks/bench_lesson_html.py [ripetizioni]"""
+
+import os
+import sys
+import time
+import base64
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CourseFileSystem import CourseFileSystem
+
+LESSON_SIZES = [10 * 1024, 100 * 1024, 1024 * 1024, 5 * 1024 * 1024]
+
+
+def make_lesson(size):
+    """Genera una lezione di circa "size" byte, composta da paragrafi e da un'immagine base64 incorporata"""
+
+    paragraph = "<p>Lorem ipsum <strong>dolor</strong> sit amet, <em>consectetur</em> adipiscing elit.</p>\n"
+    image = '<p><img src="data:image/png;base64,{}"></p>\n'.format(
+        base64.b64encode(os.urandom(size // 3)).decode("ascii"))
+    text = paragraph * max(1, (size - len(image)) // len(paragraph))
+    return text + image
+
+
+def measure(function, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        function()
+    return (time.perf_counter() - start) / repetitions * 1000
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    try:
+        import bs4
+    except ImportError:
+        bs4 = None
+        print("bs4 non installato: viene misurata soltanto la lettura diretta")
+
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as working_dir:
+        os.chdir(working_dir)
+        os.mkdir("data")
+        course_fs = CourseFileSystem()
+        course_id = course_fs.add_course("Benchmark")
+        topic_id = course_fs.add_topic("Benchmark", course_id)
+
+        print("{:>10} {:>12} {:>12} {:>8}".format("dimensione", "diretta ms", "parser ms", "x"))
+        for size in LESSON_SIZES:
+            element_id = course_fs.add_lesson("Lezione", topic_id, course_id)
+            course_fs.edit_lesson(element_id, topic_id, course_id, make_lesson(size))
+
+            raw_ms = measure(lambda: course_fs.get_lesson_html(element_id, topic_id, course_id), repetitions)
+            if bs4 is None:
+                print("{:>8}KB {:>12.2f} {:>12} {:>8}".format(size // 1024, raw_ms, "-", "-"))
+                continue
+
+            parsed_ms = measure(
+                lambda: course_fs.get_lesson_html(element_id, topic_id, course_id, sanitize=True), repetitions)
+            print("{:>8}KB {:>12.2f} {:>12.2f} {:>8.1f}".format(
+                size // 1024, raw_ms, parsed_ms, parsed_ms / raw_ms))
+
+        course_fs.descriptor.close()
+        os.chdir(original_dir)
+
+
+if __name__ == "__main__":
+    main()
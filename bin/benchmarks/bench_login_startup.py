@@ -0,0 +1,70 @@
+"""Tempo di preparazione del logo delle quattro pagine del LoginApplication, decodificandolo per ogni pagina come
+in passato oppure usando l'ImageCache condivisa. Se è disponibile un display viene misurato anche il tempo di avvio
+dell'intero LoginApplication. Uso, dalla cartella bin: python benchmarks/bench_login_startup.py [ripetizioni]"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageTk
+from ImageCache import ImageCache
+
+LOGO_PATH = "media/logo.jpg"
+LOGO_SIZE = (120, 120)
+PAGES = 4
+
+
+def load_per_page(photo):
+    images = []
+    for _ in range(PAGES):
+        image = Image.open(LOGO_PATH).resize(LOGO_SIZE)
+        images.append(ImageTk.PhotoImage(image) if photo else image)
+    return images
+
+
+def load_cached(photo):
+    image_cache = ImageCache()
+    if photo:
+        return [image_cache.get_photo(LOGO_PATH, LOGO_SIZE) for _ in range(PAGES)]
+    return [image_cache.get_image(LOGO_PATH, LOGO_SIZE) for _ in range(PAGES)]
+
+
+def measure(function, repetitions, *args):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        function(*args)
+    return (time.perf_counter() - start) / repetitions * 1000
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    try:
+        import tkinter
+        root = tkinter.Tk()
+        root.withdraw()
+    except Exception:
+        root = None
+        print("display non disponibile: vengono misurate soltanto decodifica e ridimensionamento")
+
+    photo = root is not None
+    print("logo per {} pagine, decodificato per pagina: {:.2f} ms".format(
+        PAGES, measure(load_per_page, repetitions, photo)))
+    print("logo per {} pagine, con ImageCache:          {:.2f} ms".format(
+        PAGES, measure(load_cached, repetitions, photo)))
+
+    if root is not None:
+        root.destroy()
+
+        from LoginApplication import LoginApplication
+        start = time.perf_counter()
+        app = LoginApplication()
+        app.update_idletasks()
+        print("avvio del LoginApplication: {:.2f} ms".format((time.perf_counter() - start) * 1000))
+        app.destroy()
+
+
+if __name__ == "__main__":
+    main()
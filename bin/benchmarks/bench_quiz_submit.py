@@ -0,0 +1,105 @@
+"""Prova di carico dell'invio dei quiz: invia in parallelo molti tentativi allo stesso quiz, da più thread e da più
+processi, e verifica che nessuno venga perso. Uso: python benchmarks/bench_quiz_submit.py [tentativi] [thread]"""
+
+import os
+import sys
+import time
+import json
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CourseFileSystem import CourseFileSystem
+from QuizManager import QuizManager
+from QuizLock import fcntl
+
+PROCESSES = 4
+
+
+def submit(course_fs, element_key, user_id, submission_number):
+    """Invia un tentativo come fa Api.submit_quiz, segnando nelle risposte il numero dell'invio"""
+
+    quiz_version = course_fs.get_quiz_version(*element_key)
+    quiz_mgr = QuizManager(course_fs.get_quiz_json(*element_key), course_fs.get_attempt_store(*element_key),
+                           quiz_version, course_fs.get_quiz_stats(*element_key))
+    answers = {"q-0": "b" if submission_number % 2 else "a", "q-1": str(submission_number)}
+    scores = quiz_mgr.evaluate_answers(user_id, answers)
+    quiz_mgr.add_attempt(user_id, answers, scores)
+
+
+def submit_many(working_dir, element_key, first_number, count, threads):
+    """Invia "count" tentativi usando "threads" thread. Viene eseguita anche nei processi figli"""
+
+    os.chdir(working_dir)
+    course_fs = CourseFileSystem()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(submit, course_fs, element_key, "u-{}".format(number % 50), number)
+                   for number in range(first_number, first_number + count)]
+        for future in futures:
+            future.result()
+    course_fs.descriptor.close()
+
+
+def check_attempts(course_fs, element_key, expected):
+    """Controlla che il file dei tentativi contenga esattamente gli invii attesi, ognuno su una riga completa"""
+
+    with open(course_fs.get_attempt_store(*element_key).get_path(), "rb") as file_object:
+        numbers = [int(json.loads(line.decode("utf-8"))["answers"]["q-1"]) for line in file_object]
+    missing = set(expected) - set(numbers)
+    duplicated = len(numbers) - len(set(numbers))
+    return len(numbers), len(missing), duplicated
+
+
+def main():
+    submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as working_dir:
+        os.chdir(working_dir)
+        os.mkdir("data")
+        course_fs = CourseFileSystem()
+        course_id = course_fs.add_course("Benchmark")
+        topic_id = course_fs.add_topic("Benchmark", course_id)
+        element_id = course_fs.add_quiz("Quiz", topic_id, course_id)
+        element_key = (element_id, topic_id, course_id)
+
+        quiz_mgr = QuizManager(course_fs.get_quiz_json(*element_key))
+        quiz_mgr.add_radio("Domanda", ["a"], "b")
+        quiz_mgr.add_open("Numero dell'invio", [])
+        course_fs.edit_quiz(*element_key, quiz_mgr.get_quiz_dict())
+        course_fs.descriptor.close()
+
+        start = time.perf_counter()
+        submit_many(working_dir, element_key, 0, submissions, threads)
+        elapsed = time.perf_counter() - start
+        total, missing, duplicated = check_attempts(course_fs, element_key, range(submissions))
+        print("thread:   {} invii in {:.2f} s ({:.0f}/s), salvati {}, persi {}, duplicati {}".format(
+            submissions, elapsed, submissions / elapsed, total, missing, duplicated))
+
+        if fcntl is None:
+            print("fcntl non disponibile: la prova con più processi viene saltata")
+        else:
+            per_process = submissions // PROCESSES
+            start = time.perf_counter()
+            processes = [multiprocessing.Process(
+                target=submit_many,
+                args=(working_dir, element_key, submissions + index * per_process, per_process, threads)
+            ) for index in range(PROCESSES)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+            sent = per_process * PROCESSES
+            total, missing, duplicated = check_attempts(course_fs, element_key, range(submissions + sent))
+            print("processi: {} invii in {:.2f} s ({:.0f}/s), salvati {}, persi {}, duplicati {}".format(
+                sent, elapsed, sent / elapsed, total, missing, duplicated))
+
+        os.chdir(original_dir)
+
+
+if __name__ == "__main__":
+    main()
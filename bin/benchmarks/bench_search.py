@@ -0,0 +1,102 @@
+"""Tempi del SearchIndex su un catalogo sintetico: costruzione, salvataggio completo e incrementale, caricamento e
+ricerche su N lezioni (di default 100000). Uso: python benchmarks/bench_search.py [lezioni] [parole per lezione]"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import itertools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CourseFileSystem import CourseFileSystem
+from SearchIndex import SearchIndex
+
+COURSES = 50
+TOPICS_PER_COURSE = 20
+QUERIES = ["perché la fotosintesi", "equazioni di secondo grado", "rivoluzione francese", "citta", "xyzzy"]
+VOCABULARY_SIZE = 20000
+SAVED_EDITS = 100
+
+
+def make_vocabulary():
+    random.seed(1)
+    syllables = ["ca", "la", "to", "ri", "ne", "mo", "se", "pu", "gi", "vo", "te", "di", "zio", "ne", "sta"]
+    words = {"".join(random.choice(syllables) for _ in range(random.randint(2, 4))) for _ in range(VOCABULARY_SIZE)}
+    words.update(["fotosintesi", "equazioni", "secondo", "grado", "rivoluzione", "francese", "città", "perché"])
+    return sorted(words)
+
+
+def main():
+    lessons = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    words_per_lesson = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    vocabulary = make_vocabulary()
+    # Distribuzione di Zipf approssimata: poche parole molto frequenti e molte rare
+    cumulative_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as working_dir:
+        os.chdir(working_dir)
+        os.mkdir("data")
+        course_fs = CourseFileSystem()
+        descriptor = course_fs.descriptor
+        search_index = SearchIndex(course_fs)
+        search_index.load()
+
+        elements = []
+        for course_number in range(COURSES):
+            course_id = descriptor.get_new_course_id()
+            descriptor.add_course("Corso {}".format(course_number), course_id)
+            for topic_number in range(TOPICS_PER_COURSE):
+                topic_id = descriptor.get_new_topic_id()
+                descriptor.add_topic("Topic {}".format(topic_number), topic_id, course_id)
+                elements.append((course_id, topic_id))
+
+        start = time.perf_counter()
+        for lesson_number in range(lessons):
+            course_id, topic_id = elements[lesson_number % len(elements)]
+            element_id = descriptor.get_new_element_id()
+            descriptor.add_element("Lezione {}".format(lesson_number), "lesson", element_id, topic_id, course_id)
+            element = {"course_id": course_id, "course_name": "Corso", "topic_id": topic_id,
+                       "topic_name": "Topic", "element_id": element_id, "name": "Lezione {}".format(lesson_number),
+                       "type": "lesson", "edit date": None}
+            text = " ".join(random.choices(vocabulary, cum_weights=cumulative_weights, k=words_per_lesson))
+            search_index.add_document(element, text, stamp=[None])
+        print("indicizzazione di {} lezioni: {:.1f} s".format(lessons, time.perf_counter() - start))
+
+        start = time.perf_counter()
+        search_index.save()
+        print("salvataggio: {:.1f} s ({:.0f} MB)".format(
+            time.perf_counter() - start, os.path.getsize(SearchIndex.DEFAULT_INDEX_PATH) / 2 ** 20))
+
+        # Dopo la prima istantanea, ogni salvataggio aggiunge al journal soltanto i documenti cambiati
+        start = time.perf_counter()
+        for lesson_number in range(SAVED_EDITS):
+            course_id, topic_id = elements[lesson_number % len(elements)]
+            element = {"course_id": course_id, "course_name": "Corso", "topic_id": topic_id, "topic_name": "Topic",
+                       "element_id": descriptor.get_elements_list(topic_id, course_id)[0],
+                       "name": "Lezione modificata", "type": "lesson", "edit date": None}
+            search_index.add_document(element, "rivoluzione francese", stamp=[lesson_number])
+            search_index.save()
+        print("salvataggio di una modifica: {:.2f} ms".format((time.perf_counter() - start) * 1000 / SAVED_EDITS))
+
+        start = time.perf_counter()
+        search_index = SearchIndex(course_fs)
+        search_index.load()
+        print("caricamento: {:.1f} s".format(time.perf_counter() - start))
+
+        allowed_courses = set(descriptor.get_courses_list()[:COURSES // 2])
+        for query in QUERIES:
+            start = time.perf_counter()
+            results = search_index.search(query, allowed_courses)
+            print("{:<30} {:>8.2f} ms   {} risultati".format(
+                repr(query), (time.perf_counter() - start) * 1000, len(results)))
+
+        descriptor.close()
+        os.chdir(original_dir)
+
+
+if __name__ == "__main__":
+    main()
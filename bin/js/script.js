@@ -15,26 +15,27 @@ async function refreshCourses() {
   $("#courses").empty();
   $("#topics").empty();
   $("#elements").empty();
-  coursesdict = await pywebview.api.list_courses();
+  // Ids and names of every course come back in a single call
+  let courses = await pywebview.api.list_courses_with_attributes();
+  coursesdict = {
+    message: {
+      rw: courses.message["rw"].map(course => course.id),
+      r: courses.message["r"].map(course => course.id)
+    }
+  };
 
   // List the courses that the user owns first
-  for (const course_id of coursesdict.message["rw"]) {
-    course_name = await pywebview.api.get_course_attributes({
-      course_id: course_id
-    });
-    let button = createButtonRW(course_id, course_name.message.name, function () {
-      refreshTopics(course_id, "rw");
+  for (const course of courses.message["rw"]) {
+    let button = createButtonRW(course.id, course.name, function () {
+      refreshTopics(course.id, "rw");
     });
     $("#courses").append(button);
   }
 
   // Then, list all the courses the user is subscribed to
-  for (const course_id of coursesdict.message["r"]) {
-    course_name = await pywebview.api.get_course_attributes({
-      course_id: course_id
-    });
-    let button = createButtonR(course_id, course_name.message.name, function () {
-      refreshTopics(course_id, "r");
+  for (const course of courses.message["r"]) {
+    let button = createButtonR(course.id, course.name, function () {
+      refreshTopics(course.id, "r");
     });
     $("#courses").append(button);
   }
@@ -61,31 +62,23 @@ async function refreshTopics(course_id, mode) {
     hide("#addtopic");
   }
 
-  topicsdict = await pywebview.api.list_topics({
+  topicsdict = await pywebview.api.list_topics_with_attributes({
     course_id: course_id
   });
 
   if (mode == "r") {
     // If the course is not owned by the user, create read-only buttons
-    for (const topic_id of topicsdict.message) {
-      topic_name = await pywebview.api.get_topic_attributes({
-        topic_id: topic_id,
-        course_id: course_id
-      });
-      let button = createButtonR(topic_id, topic_name.message.name, function () {
-        refreshElements(topic_id, course_id, mode);
+    for (const topic of topicsdict.message) {
+      let button = createButtonR(topic.id, topic.name, function () {
+        refreshElements(topic.id, course_id, mode);
       })
       $("#topics").append(button);
     }
   } else {
     // If the course is owned by the user, then create read-write buttons
-    for (const topic_id of topicsdict.message) {
-      topic_name = await pywebview.api.get_topic_attributes({
-        topic_id: topic_id,
-        course_id: course_id
-      });
-      let button = createButtonRW(topic_id, topic_name.message.name, function () {
-        refreshElements(topic_id, course_id, mode);
+    for (const topic of topicsdict.message) {
+      let button = createButtonRW(topic.id, topic.name, function () {
+        refreshElements(topic.id, course_id, mode);
       })
       $("#topics").append(button);
     }
@@ -111,7 +104,7 @@ async function refreshElements(topic_id, course_id, mode) {
     hide("#addelement");
   }
 
-  elementsdict = await pywebview.api.list_elements({
+  elementsdict = await pywebview.api.list_elements_with_attributes({
     topic_id: topic_id,
     course_id: course_id
   });
@@ -119,37 +112,27 @@ async function refreshElements(topic_id, course_id, mode) {
   let button;
 
   if (mode == "r") {
-    for (const element_id of elementsdict.message) {
-      element_properties = await pywebview.api.get_element_attributes({
-        element_id: element_id,
-        topic_id: topic_id,
-        course_id: course_id
-      });
-      if (element_properties.message.type == "lesson") {
-        button = createButtonR(element_id, element_properties.message.name, function () {
-          loadLesson(element_id, topic_id, course_id);
+    for (const element of elementsdict.message) {
+      if (element.type == "lesson") {
+        button = createButtonR(element.id, element.name, function () {
+          loadLesson(element.id, topic_id, course_id);
         })
       } else {
-        button = createButtonR(element_id, element_properties.message.name, function () {
-          loadQuizMenu(element_id, topic_id, course_id, element_properties.message.name);
+        button = createButtonR(element.id, element.name, function () {
+          loadQuizMenu(element.id, topic_id, course_id, element.name);
         })
       }
       $("#elements").append(button);
     }
   } else {
-    for (const element_id of elementsdict.message) {
-      element_properties = await pywebview.api.get_element_attributes({
-        element_id: element_id,
-        topic_id: topic_id,
-        course_id: course_id
-      });
-      if (element_properties.message.type == "lesson") {
-        button = createButtonRW(element_id, element_properties.message.name, function () {
-          loadLesson(element_id, topic_id, course_id);
+    for (const element of elementsdict.message) {
+      if (element.type == "lesson") {
+        button = createButtonRW(element.id, element.name, function () {
+          loadLesson(element.id, topic_id, course_id);
         })
       } else {
-        button = createButtonRW(element_id, element_properties.message.name, function () {
-          loadQuizMenu(element_id, topic_id, course_id, element_properties.message.name);
+        button = createButtonRW(element.id, element.name, function () {
+          loadQuizMenu(element.id, topic_id, course_id, element.name);
         })
       }
       $("#elements").append(button);
@@ -176,14 +159,34 @@ function createButtonR(id, name, onclick) {
   return button;
 }
 
-async function loadLesson(element_id, topic_id, course_id) {
-  show("#loader");
-  selected_element_html = await pywebview.api.load_lesson_html({
+async function fetchLesson(element_id, topic_id, course_id) {
+  // The lesson body is streamed by the local server instead of going through the bridge. An error page is never
+  // returned as a lesson: null means that the lesson could not be loaded
+  let lesson_url = await pywebview.api.get_lesson_url({
     element_id: element_id,
     topic_id: topic_id,
     course_id: course_id
   });
-  $(".ql-editor").html(selected_element_html.message);
+  try {
+    let lesson_response = await fetch(lesson_url.message);
+    if (!lesson_response.ok) {
+      return null;
+    }
+    return await lesson_response.text();
+  } catch (error) {
+    return null;
+  }
+}
+
+async function loadLesson(element_id, topic_id, course_id) {
+  show("#loader");
+  let lesson_html = await fetchLesson(element_id, topic_id, course_id);
+  if (lesson_html === null) {
+    hide("#loader");
+    alert("Si è verificato un errore durante il caricamento della lezione");
+    return;
+  }
+  $(".ql-editor").html(lesson_html);
   quill.disable();
   $(".ql-toolbar").hide();
   $("#edit-lesson-btn").hide();
@@ -418,12 +421,13 @@ function addMenuListeners() {
   $("#mod-element").click(async function () {
     $(".menu").removeClass("menu-on");
     show("#loader");
-    selected_element_html = await pywebview.api.load_lesson_html({
-      element_id: selected,
-      topic_id: selected_topic,
-      course_id: selected_course
-    });
-    $(".ql-editor").html(selected_element_html.message);
+    let lesson_html = await fetchLesson(selected, selected_topic, selected_course);
+    if (lesson_html === null) {
+      hide("#loader");
+      alert("Si è verificato un errore durante il caricamento della lezione");
+      return;
+    }
+    $(".ql-editor").html(lesson_html);
     quill.enable();
     $(".ql-toolbar").show();
     $("#edit-lesson-btn").show();
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Cartella di lavoro temporanea con una cartella data vuota, come quella da cui viene avviata l'applicazione"""
+
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("data")
+    return tmp_path
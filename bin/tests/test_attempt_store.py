@@ -0,0 +1,25 @@
+from AttemptStore import AttemptStore
+
+
+def make_attempt(mark):
+    return {"date": "2019-06-01T10:00:00", "mark": mark, "answers": {"q-0": "a"}, "scores": {"q-0": mark / 10}}
+
+
+def test_rewrite_from_another_process_is_seen_by_the_index(data_dir):
+    quiz_dir = str(data_dir)
+    store = AttemptStore(quiz_dir)
+    for user_number in range(5):
+        store.append("u-{}".format(user_number), make_attempt(10.0))
+    store.append("u-1", make_attempt(10.0))
+    assert len(store.get_user_attempts("u-1")) == 2
+
+    # Un'altra istanza simula BulkGrader.py eseguito in un altro processo: le righe si accorciano
+    other_store = AttemptStore(quiz_dir)
+    other_store.rewrite([(user_id, make_attempt(0)) for user_id, _ in other_store.iter_attempts()])
+
+    assert store.get_user_attempts("u-1") == [make_attempt(0), make_attempt(0)]
+    assert store.get_attempts_count() == 6
+
+    store.append("u-9", make_attempt(5.0))
+    assert other_store.get_user_attempts("u-9") == [make_attempt(5.0)]
+    assert other_store.get_attempts_count() == 7
@@ -0,0 +1,26 @@
+from BulkGrader import BulkGrader
+from QuizManager import QuizManager
+
+QUIZ = {"count": 3, "questions": {
+    "q-0": {"type": "checkbox", "correct_answers": ["a", "b"], "wrong_answers": ["c"]},
+    "q-1": {"type": "checkbox", "correct_answers": [], "wrong_answers": ["a", "b"]},
+    "q-2": {"type": "open", "correct_answers": ["Roma"]},
+}}
+
+ANSWERS = [
+    {"q-0": ["a", "b"], "q-1": [], "q-2": " roma "},
+    {"q-0": ["a", "c"], "q-1": ["a"], "q-2": "Milano"},
+    {"q-0": ["c"], "q-1": ["d"]},
+    {"q-1": ["a", "b"]},
+]
+
+
+def test_bulk_and_live_grading_agree_on_checkboxes_without_correct_options():
+    quiz_manager = QuizManager(QUIZ)
+    live_scores = [quiz_manager.evaluate_answers("u-1", answers) for answers in ANSWERS]
+    assert [scores["q-1"] for scores in live_scores] == [1, 0, 1, 0]
+
+    marks, bulk_scores = BulkGrader.grade_attempts(QuizManager.compile_answer_key(QUIZ),
+                                                   [{"answers": answers} for answers in ANSWERS])
+    assert bulk_scores == live_scores
+    assert marks.tolist() == [sum(scores.values()) / len(scores) * 10 for scores in live_scores]
@@ -0,0 +1,88 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from CourseFileSystem import CourseFileSystem
+from QuizManager import QuizManager
+from QuizLock import fcntl
+
+SUBMISSIONS = 200
+THREADS = 16
+PROCESSES = 4
+
+
+def submit(course_fs, element_key, user_id, submission_number):
+    """Invia un tentativo come fa Api.submit_quiz, segnando nelle risposte il numero dell'invio"""
+
+    quiz_version = course_fs.get_quiz_version(*element_key)
+    quiz_mgr = QuizManager(course_fs.get_quiz_json(*element_key), course_fs.get_attempt_store(*element_key),
+                           quiz_version, course_fs.get_quiz_stats(*element_key))
+    answers = {"q-0": "b" if submission_number % 2 else "a", "q-1": str(submission_number)}
+    quiz_mgr.add_attempt(user_id, answers, quiz_mgr.evaluate_answers(user_id, answers))
+
+
+def submit_many(working_dir, element_key, first_number, count):
+    os.chdir(working_dir)
+    course_fs = CourseFileSystem()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        futures = [executor.submit(submit, course_fs, element_key, "u-{}".format(number % 10), number)
+                   for number in range(first_number, first_number + count)]
+        for future in futures:
+            future.result()
+    course_fs.descriptor.close()
+
+
+def saved_numbers(course_fs, element_key):
+    with open(course_fs.get_attempt_store(*element_key).get_path(), "rb") as file_object:
+        return [int(json.loads(line.decode("utf-8"))["answers"]["q-1"]) for line in file_object]
+
+
+@pytest.fixture
+def quiz(data_dir):
+    course_fs = CourseFileSystem()
+    course_id = course_fs.add_course("Corso")
+    topic_id = course_fs.add_topic("Topic", course_id)
+    element_id = course_fs.add_quiz("Quiz", topic_id, course_id)
+    element_key = (element_id, topic_id, course_id)
+
+    quiz_mgr = QuizManager(course_fs.get_quiz_json(*element_key))
+    quiz_mgr.add_radio("Domanda", ["a"], "b")
+    quiz_mgr.add_open("Numero dell'invio", [])
+    course_fs.edit_quiz(*element_key, quiz_mgr.get_quiz_dict())
+    course_fs.descriptor.close()
+    return str(data_dir), element_key
+
+
+def test_concurrent_thread_submissions_are_all_saved_once(quiz):
+    working_dir, element_key = quiz
+
+    submit_many(working_dir, element_key, 0, SUBMISSIONS)
+
+    course_fs = CourseFileSystem()
+    assert sorted(saved_numbers(course_fs, element_key)) == list(range(SUBMISSIONS))
+    assert course_fs.get_quiz_stats(*element_key).get_stats()["attempts"] == SUBMISSIONS
+    course_fs.descriptor.close()
+
+
+@pytest.mark.skipif(fcntl is None or not hasattr(os, "fork"), reason="serve il lock dei file tra processi")
+def test_concurrent_process_submissions_are_all_saved_once(quiz):
+    working_dir, element_key = quiz
+    per_process = SUBMISSIONS // PROCESSES
+
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=submit_many,
+                                 args=(working_dir, element_key, index * per_process, per_process))
+                 for index in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0] * PROCESSES
+
+    course_fs = CourseFileSystem()
+    assert sorted(saved_numbers(course_fs, element_key)) == list(range(per_process * PROCESSES))
+    assert course_fs.get_quiz_stats(*element_key).get_stats()["attempts"] == per_process * PROCESSES
+    course_fs.descriptor.close()
@@ -0,0 +1,66 @@
+import os
+
+from CourseFileSystem import CourseFileSystem
+from SearchIndex import SearchIndex
+
+TIMEOUT = 10
+
+
+def found_elements(search_index, query):
+    return [result["element_id"] for result in search_index.search(query)]
+
+
+def test_search_sees_changes_after_wait_until_fresh(data_dir):
+    course_fs = CourseFileSystem()
+    search_index = SearchIndex(course_fs)
+    course_fs.add_change_listener(search_index.notify_change)
+    search_index.start()
+
+    course_id = course_fs.add_course("Storia")
+    topic_id = course_fs.add_topic("Ottocento", course_id)
+    element_id = course_fs.add_lesson("Risorgimento", topic_id, course_id)
+    course_fs.edit_lesson(element_id, topic_id, course_id, "<p>La spedizione dei Mille</p>")
+    assert search_index.wait_until_fresh(TIMEOUT)
+    assert found_elements(search_index, "spedizione") == [element_id]
+
+    course_fs.edit_lesson(element_id, topic_id, course_id, "<p>L'unità d'Italia</p>")
+    assert search_index.wait_until_fresh(TIMEOUT)
+    assert found_elements(search_index, "spedizione") == []
+    assert found_elements(search_index, "unita") == [element_id]
+
+    course_fs.remove_topic(topic_id, course_id)
+    assert search_index.wait_until_fresh(TIMEOUT)
+    assert found_elements(search_index, "unita") == []
+
+    search_index.close()
+    course_fs.descriptor.close()
+
+
+def test_saves_append_to_the_journal_and_are_reloaded(data_dir):
+    course_fs = CourseFileSystem()
+    search_index = SearchIndex(course_fs)
+    search_index.load()
+    course_id = course_fs.add_course("Scienze")
+    topic_id = course_fs.add_topic("Botanica", course_id)
+    element_ids = []
+    for text in ["<p>La fotosintesi clorofilliana</p>", "<p>Le radici delle piante</p>"]:
+        element_id = course_fs.add_lesson("Lezione", topic_id, course_id)
+        course_fs.edit_lesson(element_id, topic_id, course_id, text)
+        element_ids.append(element_id)
+    search_index.refresh()
+    snapshot_stamp = os.stat(SearchIndex.DEFAULT_INDEX_PATH).st_mtime_ns
+
+    # Una modifica viene aggiunta al journal, senza riscrivere l'istantanea
+    course_fs.edit_lesson(element_ids[1], topic_id, course_id, "<p>Le foglie e la fotosintesi</p>")
+    course_fs.remove_element(element_ids[0], topic_id, course_id)
+    search_index.refresh()
+    assert os.stat(SearchIndex.DEFAULT_INDEX_PATH).st_mtime_ns == snapshot_stamp
+
+    reloaded_index = SearchIndex(course_fs)
+    assert found_elements(reloaded_index, "fotosintesi") == []
+    reloaded_index.load()
+    assert found_elements(reloaded_index, "fotosintesi") == [element_ids[1]]
+    assert found_elements(reloaded_index, "radici") == []
+    assert reloaded_index.get_documents_count() == 1
+
+    course_fs.descriptor.close()